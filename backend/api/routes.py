@@ -1,23 +1,49 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from pathlib import Path
-from services import downloader
+from services import downloader, async_downloader
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import json
+import shutil
+import time
+import uuid
+from contextlib import nullcontext
 
 from models.song import Song
-from services.spotify_client import get_playlist_tracks
-from services.youtube_client import search_youtube
-from utils.zipper import zip_files
-from utils.progress_manager import progress_manager
+from services.playlist_cache import playlist_cache
+from services.youtube_client import find_youtube_url, search_songs, search_metrics, video_id_from_url
+from services.search_cache import search_cache
+from services.audio_store import audio_store
+from services.ydl_pool import ydl_pool
+from utils.zipper import IncrementalZip, stream_zip, iter_session_files, audio_files
+from utils.progress_manager import progress_manager, SessionLimitReached
+from utils.job_journal import job_journal
+from utils.job_scheduler import job_scheduler, JobCancelled
+from utils.strategy_selector import strategy_selector
+from utils.rate_limiter import search_limiter, download_limiter, youtube_breaker
+from utils.disk_metrics import disk_writes
+from utils.disk_janitor import disk_janitor
+from config import (
+    SONGS_IN_FLIGHT_PER_SESSION,
+    SEARCH_LOOKAHEAD,
+    DOWNLOAD_ENGINE,
+    PIPE_TRANSCODE,
+    OUTPUT_FORMATS,
+    DEFAULT_OUTPUT_FORMAT,
+    PROGRESS_STREAM_COALESCE,
+    PROGRESS_STREAM_KEEPALIVE,
+    STATE_FLUSH_INTERVAL,
+    SESSION_LEASE_SECONDS,
+    DOWNLOADS_DIR,
+    ydl_options,
+)
 
 router = APIRouter()
 
-downloads_dir = Path(__file__).resolve().parent.parent.parent / "downloads"
-downloads_dir.mkdir(exist_ok=True)
-
-executor = ThreadPoolExecutor(max_workers=3)
+downloads_dir = DOWNLOADS_DIR
+downloads_dir.mkdir(parents=True, exist_ok=True)
 
 class PlaylistRequest(BaseModel):
     playlist_url: str
@@ -26,19 +52,87 @@ class DownloadRequest(BaseModel):
     playlist_url: str
     selected_songs: list[Song]
     session_id: str
+    # "mp3" (recodifica) o "m4a"/"opus" (remux del stream original sin recodificar)
+    output_format: str = DEFAULT_OUTPUT_FORMAT
+
+
+def session_filename(song: Song, output_format: str) -> str:
+    """Nombre del archivo de una canción dentro del directorio de la sesión"""
+    name = downloader.sanitize_filename(f"{song.title} - {song.artist}")
+    return f"{name}.{OUTPUT_FORMATS[output_format]['ext']}"
+
+
+def session_filenames(songs: list[Song], output_format: str) -> list[str]:
+    """
+    Nombres de archivo de todas las canciones de una sesión, sin repetidos.
+    
+    Dos pistas con el mismo título y artista (otra versión del álbum, o
+    nombres que coinciden al sanear) se distinguen con " (2)", " (3)"...
+    según su posición en la sesión, así que los nombres son los mismos al
+    reanudarla.
+    """
+    names = []
+    used: set[str] = set()
+    for song in songs:
+        name = session_filename(song, output_format)
+        stem, ext = name.rsplit(".", 1)
+        counter = 1
+        while name.lower() in used:
+            counter += 1
+            name = f"{stem} ({counter}).{ext}"
+        used.add(name.lower())
+        names.append(name)
+    return names
 
 
 @router.post("/convert", response_model=list[Song])
 async def convert_playlist(req: PlaylistRequest):
     try:
-        songs = get_playlist_tracks(req.playlist_url)
+        songs = playlist_cache.get_tracks(req.playlist_url)
         return songs
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def download_song_async(song: Song, temp_dir: Path, session_id: str):
+@router.post("/search")
+async def search_batch(songs: list[Song]):
+    """
+    Busca en YouTube varias canciones a la vez.
+    
+    Devuelve una línea JSON por canción (con youtube_url) a medida que se
+    resuelven, no en el orden recibido.
+    """
+    async def lines():
+        async for song in search_songs(songs, session_id=f"search-{uuid.uuid4().hex}"):
+            yield song.model_dump_json() + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def download_song_async(
+    song: Song,
+    temp_dir: Path,
+    session_id: str,
+    download_slots: asyncio.Semaphore | None = None,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    filename: str | None = None
+):
+    """
+    Lleva una canción por las tres etapas: búsqueda, descarga y conversión.
+    
+    Cada etapa se ejecuta en su propio pool del planificador. download_slots
+    limita cuántas canciones de la sesión descargan a la vez; las canciones ya
+    buscadas esperan turno sin ocupar un hilo. Si el vídeo ya está en el
+    almacén de audio en el mismo formato, la descarga y la conversión se
+    omiten. Los formatos m4a y opus se remuxan sin recodificar cuando el
+    stream de YouTube ya viene en ese códec. filename es el nombre del
+    archivo en la sesión (por defecto session_filename).
+    
+    Returns:
+        Ruta del archivo en el directorio de la sesión, o None si no se completó
+    """
     song_id = song.id or song.query
+    fmt = OUTPUT_FORMATS[output_format]
     
     try:
         progress_manager.update_song_progress(
@@ -49,32 +143,92 @@ async def download_song_async(song: Song, temp_dir: Path, session_id: str):
             session_id, song_id, "searching", 10, "Buscando en YouTube..."
         )
         
-        youtube_url = await asyncio.get_event_loop().run_in_executor(
-            executor, search_youtube, song.query
-        )
+        # Los aciertos de la caché no pasan por el limitador de búsquedas
+        youtube_url = await find_youtube_url(song, session_id)
         
         if not youtube_url:
             raise Exception("No se encontró la canción en YouTube")
         
+        # La sesión pudo cancelarse mientras se buscaba
+        if progress_manager.is_cancelled(session_id):
+            return None
+        
         progress_manager.update_song_progress(
-            session_id, song_id, "downloading", 30, "Descargando audio..."
+            session_id, song_id, "queued", 20, "En cola para descargar..."
         )
         
-        await asyncio.get_event_loop().run_in_executor(
-            executor, downloader.download_songs, youtube_url, temp_dir, song.title, song.artist
-        )
+        async def produce(stored_path: Path):
+            async with download_slots or nullcontext():
+                if progress_manager.is_cancelled(session_id):
+                    raise JobCancelled(f"Sesión {session_id} cancelada")
+                
+                progress_manager.update_song_progress(
+                    session_id, song_id, "downloading", 30, "Descargando audio..."
+                )
+                # Progreso real (bytes, velocidad, tiempo restante) entre 30% y 90%
+                reporter = progress_manager.song_reporter(session_id, song_id, 30, 90)
+                
+                if DOWNLOAD_ENGINE == "async" or PIPE_TRANSCODE:
+                    # yt-dlp solo resuelve la URL; los bytes van directos a FFmpeg
+                    # sin guardar el audio original en disco
+                    stream = await job_scheduler.submit(
+                        "download", session_id, downloader.resolve_audio_stream,
+                        youtube_url, song.title, defer_retries=True, output_format=output_format
+                    )
+                    
+                    if progress_manager.is_cancelled(session_id):
+                        raise JobCancelled(f"Sesión {session_id} cancelada")
+                    
+                    if DOWNLOAD_ENGINE != "async" and downloader.can_pipe(stream):
+                        # La descarga de bytes va por la etapa de red (límite,
+                        # ritmo y circuit breaker); FFmpeg corre en su proceso
+                        await job_scheduler.submit(
+                            "download", session_id, downloader.pipe_transcode,
+                            stream, stored_path, output_format, on_progress=reporter
+                        )
+                        return
+                    
+                    if DOWNLOAD_ENGINE == "async" and async_downloader.supports_stream(stream):
+                        await async_downloader.stream_to_audio(
+                            stream, stored_path, output_format, on_progress=reporter
+                        )
+                        return
+                
+                source = await job_scheduler.submit(
+                    "download", session_id, downloader.fetch_audio,
+                    youtube_url, temp_dir / ".work", song.title, song.artist,
+                    progress_callback=reporter.hook, song_id=song_id,
+                    defer_retries=True, output_format=output_format
+                )
+            
+            if progress_manager.is_cancelled(session_id):
+                raise JobCancelled(f"Sesión {session_id} cancelada")
+            
+            progress_manager.update_song_progress(
+                session_id, song_id, "converting", 90, f"Convirtiendo a {output_format.upper()}..."
+            )
+            
+            await job_scheduler.submit(
+                "transcode", session_id, downloader.transcode_audio, source, stored_path, output_format
+            )
         
-        progress_manager.update_song_progress(
-            session_id, song_id, "converting", 90, "Finalizando..."
+        # El mismo vídeo ya convertido (por esta u otra sesión) se reutiliza
+        target = await audio_store.link_or_produce(
+            video_id_from_url(youtube_url) or youtube_url, fmt["ext"], fmt["quality"], produce,
+            temp_dir / (filename or session_filename(song, output_format))
         )
         
         progress_manager.update_song_progress(
             session_id, song_id, "completed", 100, "Completado"
         )
         
-        return True
+        return target
         
     except Exception as e:
+        # Los trabajos descartados por cancelación no cuentan como error
+        if progress_manager.is_cancelled(session_id):
+            return None
+        
         error_msg = str(e)
         
         # Mensaje específico para errores de bot detection
@@ -90,38 +244,128 @@ async def download_song_async(song: Song, temp_dir: Path, session_id: str):
                 session_id, song_id, "error", 0, f"Error: {str(e)}"
             )
         
-        return False  # Continuar con siguiente canción
+        return None  # Continuar con siguiente canción
 
 
-async def process_downloads(songs: list[Song], temp_dir: Path, session_id: str):
-    completed = 0
-    successful_downloads = 0
-    
-    for index, song in enumerate(songs):
-        # Verificar si la sesión ha sido cancelada
-        if progress_manager.is_cancelled(session_id):
-            print(f"🛑 Sesión {session_id} cancelada. Deteniendo descargas.")
-            return
-
-        progress_manager.update_session_progress(
-            session_id, completed, f"{song.title} - {song.artist}"
+async def process_downloads(
+    songs: list[Song],
+    temp_dir: Path,
+    session_id: str,
+    max_in_flight: int = SONGS_IN_FLIGHT_PER_SESSION,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    finished: list[Path] | None = None,
+    filenames: list[str] | None = None
+):
+    """
+    Procesa una sesión con sus archivos protegidos del conserje de disco,
+    también frente a los de otros workers.
+    """
+    if finished is None:
+        finished = []
+    if filenames is None:
+        filenames = session_filenames(songs, output_format)
+    await disk_janitor.hold_async(session_id)
+    try:
+        await _process_downloads(
+            songs, temp_dir, session_id, max_in_flight, output_format, finished, filenames
         )
+    finally:
+        disk_janitor.release(session_id)
+
+
+async def _process_downloads(
+    songs: list[Song],
+    temp_dir: Path,
+    session_id: str,
+    max_in_flight: int,
+    output_format: str,
+    finished: list[Path],
+    filenames: list[str]
+):
+    """
+    Procesa las canciones de una sesión como un pipeline por etapas.
+    
+    Hasta max_in_flight canciones descargan a la vez y otras SEARCH_LOOKAHEAD
+    pueden estar buscándose o esperando turno, de modo que las búsquedas de
+    las siguientes canciones se solapan con la descarga y conversión de las
+    actuales. El número fijo de workers actúa como cola acotada entre etapas.
+    Las canciones pueden terminar en cualquier orden; completed_songs cuenta
+    las que ya terminaron (con éxito o error). Cada canción se añade al ZIP de
+    la sesión en cuanto termina.
+    
+    Al reanudar una sesión, finished son los archivos que ya se descargaron
+    antes del reinicio: cuentan como completados y van primero en el ZIP.
+    """
+    completed = len(finished)
+    successful_downloads = len(finished)
+    in_flight: dict[int, str] = {}
+    pending = iter(enumerate(songs))
+    download_slots = asyncio.Semaphore(max(1, max_in_flight))
+    archive = IncrementalZip(temp_dir.parent / f"{session_id}.zip")
+    for path in finished:
+        await asyncio.to_thread(archive.add, path)
+    
+    async def worker():
+        nonlocal completed, successful_downloads
         
-        success = await download_song_async(song, temp_dir, session_id)
-        
-        if success:
-            successful_downloads += 1
-        
-        completed += 1
-        progress_manager.update_session_progress(session_id, completed, "")
+        # Todos los workers consumen del mismo iterador: cada canción se procesa una sola vez
+        for index, song in pending:
+            # Verificar si la sesión ha sido cancelada
+            if progress_manager.is_cancelled(session_id):
+                return
+            
+            in_flight[index] = f"{song.title} - {song.artist}"
+            progress_manager.update_session_progress(
+                session_id, completed, in_flight[index]
+            )
+            
+            try:
+                audio_path = await download_song_async(
+                    song, temp_dir, session_id, download_slots, output_format, filenames[index]
+                )
+                if audio_path:
+                    await asyncio.to_thread(archive.add, audio_path)
+                    successful_downloads += 1
+            except Exception as e:
+                print(f"Error añadiendo {song.title} al ZIP: {str(e)}")
+                # Sin ella en el ZIP la canción no está completada
+                progress_manager.update_song_progress(
+                    session_id, song.id or song.query, "error", 0, "Error: no se pudo añadir al ZIP"
+                )
+            finally:
+                del in_flight[index]
+            
+            completed += 1
+            if not progress_manager.is_cancelled(session_id):
+                # Mostrar alguna de las canciones que siguen en curso
+                current = next(iter(in_flight.values()), "")
+                progress_manager.update_session_progress(session_id, completed, current)
+    
+    workers = min(max(1, max_in_flight) + SEARCH_LOOKAHEAD, len(songs)) or 1
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    
+    if not progress_manager.is_local(session_id):
+        # Otro worker se quedó con la sesión: el directorio de trabajo y el
+        # ZIP a medias ahora son suyos
+        print(f"🛑 Sesión {session_id} reanudada por otro worker. Deteniendo descargas.")
+        archive.abandon()
+        return
+    
+    # Audios originales que quedaron a medias (errores o cancelación)
+    shutil.rmtree(temp_dir / ".work", ignore_errors=True)
+    
+    if progress_manager.is_cancelled(session_id):
+        print(f"🛑 Sesión {session_id} cancelada. Deteniendo descargas.")
+        archive.discard()
+        return
     
     if successful_downloads == 0:
+        archive.discard()
         progress_manager.fail_session(session_id)
         return
     
     try:
-        zip_path = temp_dir.parent / f"{session_id}.zip"
-        zip_files(temp_dir, zip_path)
+        zip_path = await asyncio.to_thread(archive.finalize)
         
         if zip_path.exists() and zip_path.stat().st_size > 0:
             download_url = f"/api/download-file/{session_id}"
@@ -135,13 +379,28 @@ async def process_downloads(songs: list[Song], temp_dir: Path, session_id: str):
 
 @router.post("/download")
 async def download_playlist(req: DownloadRequest, background_tasks: BackgroundTasks):
+    if req.output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato no soportado. Opciones: {', '.join(OUTPUT_FORMATS)}"
+        )
+    
     try:
         progress_manager.create_session(req.session_id, len(req.selected_songs))
+        job_journal.record_session(
+            req.session_id,
+            [song.model_dump() for song in req.selected_songs],
+            req.output_format,
+            progress_manager.get_summary(req.session_id)["created_at"]
+        )
         
         temp_dir = downloads_dir / req.session_id
         temp_dir.mkdir(exist_ok=True)
         
-        background_tasks.add_task(process_downloads, req.selected_songs, temp_dir, req.session_id)
+        background_tasks.add_task(
+            process_downloads, req.selected_songs, temp_dir, req.session_id,
+            output_format=req.output_format
+        )
         
         return {
             "status": "started",
@@ -149,13 +408,110 @@ async def download_playlist(req: DownloadRequest, background_tasks: BackgroundTa
             "message": "Descarga iniciada en segundo plano"
         }
         
+    except SessionLimitReached as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Sesiones reanudadas en segundo plano (referencia para que no se recolecten)
+_resumed_tasks: set[asyncio.Task] = set()
+
+
+async def resume_sessions():
+    """
+    Reconstruye el progreso desde el diario de sesiones y reanuda las que
+    quedaron a medias al reiniciar el servidor.
+    
+    Las canciones cuyo archivo ya está en downloads/<session_id>/ no se
+    vuelven a descargar; el resto (incluidas las que fallaron) se procesan
+    de nuevo.
+    
+    Con varios workers cada sesión la reanuda solo el que consigue su lease
+    (en el almacén compartido o, si no hay ninguno, en el diario).
+    Las que aún tienen el lease de un proceso anterior se reintentan cuando
+    caduca (si ese proceso sigue vivo y lo renueva, se quedan en él).
+    """
+    unclaimed = []
+    for saved in await asyncio.to_thread(job_journal.load):
+        if not await asyncio.to_thread(progress_manager.claim_session, saved["session_id"]):
+            if saved["status"] == "in_progress":
+                unclaimed.append(saved)
+            continue
+        resume_saved_session(saved)
+    
+    if unclaimed:
+        task = asyncio.create_task(_claim_later(unclaimed))
+        _resumed_tasks.add(task)
+        task.add_done_callback(_resumed_tasks.discard)
+
+
+async def _claim_later(unclaimed: list[dict]):
+    """Reintenta reanudar las sesiones cuyo lease tenía otro proceso"""
+    await asyncio.sleep(SESSION_LEASE_SECONDS)
+    for saved in unclaimed:
+        if await asyncio.to_thread(progress_manager.claim_session, saved["session_id"]):
+            resume_saved_session(saved)
+
+
+def resume_saved_session(saved: dict):
+    """Restaura el progreso de una sesión del diario y, si estaba a medias, la reanuda"""
+    session_id = saved["session_id"]
+    temp_dir = downloads_dir / session_id
+    songs = [Song(**song) for song in saved["songs"]]
+    output_format = saved["output_format"]
+    if output_format not in OUTPUT_FORMATS:
+        output_format = DEFAULT_OUTPUT_FORMAT
+    
+    if saved["status"] == "completed" and not (downloads_dir / f"{session_id}.zip").exists():
+        # El ZIP ya no existe: no hay nada que restaurar
+        job_journal.forget(session_id)
+        return
+    
+    progress_manager.restore_session(
+        session_id,
+        len(songs),
+        saved["song_progress"],
+        saved["status"],
+        saved["download_url"],
+        saved["created_at"]
+    )
+    
+    if saved["status"] != "in_progress":
+        return
+    
+    temp_dir.mkdir(exist_ok=True)
+    finished: list[Path] = []
+    remaining: list[Song] = []
+    remaining_names: list[str] = []
+    for song, filename in zip(songs, session_filenames(songs, output_format)):
+        path = temp_dir / filename
+        if path.exists():
+            finished.append(path)
+            progress_manager.update_song_progress(
+                session_id, song.id or song.query, "completed", 100, "Completado"
+            )
+        else:
+            remaining.append(song)
+            remaining_names.append(filename)
+            progress_manager.update_song_progress(
+                session_id, song.id or song.query, "queued", 0, "Reanudando tras reinicio..."
+            )
+    progress_manager.update_session_progress(session_id, len(finished))
+    
+    print(f"♻️ Reanudando sesión {session_id}: {len(finished)} listas, {len(remaining)} pendientes")
+    task = asyncio.create_task(process_downloads(
+        remaining, temp_dir, session_id, output_format=output_format, finished=finished,
+        filenames=remaining_names
+    ))
+    _resumed_tasks.add(task)
+    task.add_done_callback(_resumed_tasks.discard)
+
+
 @router.get("/progress/{session_id}")
 async def get_progress(session_id: str):
-    progress = progress_manager.get_progress(session_id)
+    # Con un almacén compartido la lectura es E/S bloqueante
+    progress = await asyncio.to_thread(progress_manager.get_progress, session_id)
     
     if not progress:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -163,12 +519,120 @@ async def get_progress(session_id: str):
     return progress
 
 
+@router.get("/progress/{session_id}/events")
+async def stream_progress(session_id: str, request: Request, cursor: str = ""):
+    """
+    Progreso de la sesión como Server-Sent Events.
+    
+    El primer evento es una instantánea completa; los siguientes solo
+    incluyen las canciones que cambiaron (y los datos generales si
+    cambiaron), agrupando los cambios de PROGRESS_STREAM_COALESCE segundos.
+    El id de cada evento es un cursor: al reconectar, EventSource lo envía
+    en Last-Event-ID y el stream continúa desde ahí sin perder cambios.
+    
+    Si la sesión la descarga otro worker, su progreso se lee del almacén
+    compartido cada STATE_FLUSH_INTERVAL segundos; las lecturas se hacen
+    en un hilo porque con SQLite o Redis son E/S bloqueante.
+    """
+    summary = await asyncio.to_thread(progress_manager.get_summary, session_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Formato del cursor: "<epoch>-<secuencia>"; otro epoch implica reinicio
+    # del servidor o que la sesión pasó a otro worker (se envía una instantánea)
+    epoch, _, seq = (request.headers.get("last-event-id") or cursor).partition("-")
+    position = int(seq) if seq.isdigit() else 0
+    
+    async def events():
+        nonlocal epoch, position
+        status = summary.get("status")
+        subscriber = progress_manager.subscribe(session_id)
+        _, wakeup = subscriber
+        last_sent = time.monotonic()
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                wakeup.clear()
+                # En sesiones de otro worker solo se leen las canciones si hubo cambios
+                current_epoch, seq, delta = await asyncio.to_thread(
+                    progress_manager.changes_since, session_id, position, epoch
+                )
+                if delta is None:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                
+                if seq != position or current_epoch != epoch:
+                    epoch, position = current_epoch, seq
+                    last_sent = time.monotonic()
+                    yield f"id: {epoch}-{seq}\nevent: progress\ndata: {json.dumps(delta)}\n\n"
+                
+                status = delta.get("session", {}).get("status", status)
+                if status != "in_progress":
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                
+                # Solo las sesiones de este worker avisan de sus cambios
+                local = progress_manager.is_local(session_id)
+                try:
+                    await asyncio.wait_for(
+                        wakeup.wait(), PROGRESS_STREAM_KEEPALIVE if local else STATE_FLUSH_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_sent >= PROGRESS_STREAM_KEEPALIVE:
+                        last_sent = time.monotonic()
+                        yield ": keepalive\n\n"
+                    continue
+                
+                # Dejar que se acumulen los cambios rápidos en un solo evento
+                await asyncio.sleep(PROGRESS_STREAM_COALESCE)
+        finally:
+            progress_manager.unsubscribe(session_id, subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/cancel/{session_id}")
 async def cancel_download(session_id: str):
     progress_manager.cancel_session(session_id)
+    job_scheduler.cancel_session(session_id)
     return {"status": "cancelled", "message": "Descarga cancelada"}
 
 
+@router.get("/metrics")
+async def get_metrics():
+    """Métricas internas del planificador y las cachés"""
+    return {
+        "scheduler": job_scheduler.stats(),
+        "playlist_cache": playlist_cache.stats(),
+        "search_cache": search_cache.stats(),
+        # La primera llamada recorre el almacén en disco
+        "audio_store": await asyncio.to_thread(audio_store.stats),
+        "ydl_pool": ydl_pool.stats(),
+        "ydl_options": ydl_options.stats(),
+        "strategies": strategy_selector.stats(),
+        "rate_limits": {
+            "search": search_limiter.stats(),
+            "download": download_limiter.stats()
+        },
+        "circuit_breaker": youtube_breaker.stats(),
+        "disk_writes": disk_writes.stats(),
+        "job_journal": job_journal.stats(),
+        "progress": progress_manager.stats(),
+        "disk_janitor": disk_janitor.stats(),
+        "youtube_search": search_metrics.stats()
+    }
+
+
+@router.get("/strategies")
+async def get_strategy_stats():
+    """Orden actual de las estrategias de YouTube y su tasa de éxito reciente"""
+    return strategy_selector.stats()
+
+
 @router.get("/download-file/{session_id}")
 async def download_file(session_id: str):
     zip_path = downloads_dir / f"{session_id}.zip"
@@ -179,8 +643,59 @@ async def download_file(session_id: str):
     if zip_path.stat().st_size == 0:
         raise HTTPException(status_code=404, detail="Archivo vacío")
     
+    # El conserje no borra el ZIP mientras se envía; después puede borrarlo tras un margen
+    await disk_janitor.hold_async(session_id)
     return FileResponse(
         path=zip_path,
         filename=f"spotify_playlist_{session_id}.zip",
-        media_type="application/zip"
+        media_type="application/zip",
+        background=BackgroundTask(disk_janitor.release, session_id, downloaded=True)
+    )
+
+
+@router.get("/stream-zip/{session_id}")
+async def stream_zip_file(session_id: str, live: bool = True):
+    """
+    Envía el ZIP de la sesión en streaming directamente desde los archivos de audio.
+    
+    Con live=true la respuesta empieza aunque la sesión siga descargando y
+    va añadiendo canciones a medida que terminan.
+    """
+    session_dir = downloads_dir / session_id
+    progress = progress_manager.get_summary(session_id)
+    
+    if not session_dir.is_dir() and (downloads_dir / f"{session_id}.zip").exists():
+        # Sesión terminada cuyo directorio ya limpió el conserje: se envía el ZIP
+        return await download_file(session_id)
+    
+    if not session_dir.is_dir() or (not progress and not any(audio_files(session_dir))):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    
+    def is_finished() -> bool:
+        progress = progress_manager.get_summary(session_id)
+        return (
+            not live
+            or not progress
+            or progress["status"] != "in_progress"
+            or progress["completed_songs"] >= progress["total_songs"]
+        )
+    
+    async def session_files():
+        # Cada canción terminada avisa por el suscriptor; las sesiones de otro
+        # worker no avisan y se revisan cada poll_interval
+        subscriber = progress_manager.subscribe(session_id)
+        try:
+            async for path in iter_session_files(session_dir, is_finished, wakeup=subscriber[1]):
+                yield path
+        finally:
+            progress_manager.unsubscribe(session_id, subscriber)
+    
+    await disk_janitor.hold_async(session_id)
+    return StreamingResponse(
+        stream_zip(session_files()),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="spotify_playlist_{session_id}.zip"'
+        },
+        background=BackgroundTask(disk_janitor.release, session_id)
     )
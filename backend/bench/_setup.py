@@ -0,0 +1,23 @@
+"""
+Preparación común de los benchmarks: se ejecutan sin red ni FFmpeg.
+
+Uso (desde backend/): python bench/bench_<nombre>.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "bench")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "bench")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="spotidl-bench-"))
+os.environ.setdefault("STATE_BACKEND", "")
+os.environ.setdefault("DOWNLOADS_DIR", tempfile.mkdtemp(prefix="spotidl-bench-downloads-"))
+
+import utils.ffmpeg_setup as ffmpeg_setup  # noqa: E402
+
+ffmpeg_setup.get_ffmpeg_path = lambda: None
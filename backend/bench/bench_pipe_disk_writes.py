@@ -0,0 +1,148 @@
+"""
+Bytes escritos en disco por canción al convertir desde un archivo descargado
+frente a enviar el stream directamente a FFmpeg (pipe_transcode).
+
+Un servidor local sirve un audio de origen generado (bytes aleatorios del
+tamaño indicado) y un FFmpeg sustituto copia su entrada en la salida, como
+un remux, así que no hace falta red ni FFmpeg:
+
+- archivo: el origen se descarga a disco como haría yt-dlp y transcode_audio
+  lo lee y escribe el resultado.
+- pipe: pipe_transcode descarga por rangos y escribe solo el resultado.
+
+Los bytes salen de DiskWriteMeter (los mismos que expone /metrics) y se
+comprueban con los tamaños de los archivos escritos en cada modo.
+
+    python bench/bench_pipe_disk_writes.py [--songs 20] [--size-mb 4] [--output-ratio 1.0]
+"""
+import argparse
+import http.server
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from services import downloader
+from utils import disk_metrics
+
+# FFmpeg sustituto: lee -i (archivo o pipe:0) y escribe ratio × bytes en la salida
+FAKE_FFMPEG = """#!{python}
+import sys
+args = sys.argv[1:]
+source = args[args.index("-i") + 1]
+with (sys.stdin.buffer if source == "pipe:0" else open(source, "rb")) as src:
+    data = src.read()
+with open(args[-1], "wb") as dst:
+    dst.write((data * {ratio_ceil})[:int(len(data) * {ratio})])
+"""
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Sirve `server.data` respetando la cabecera Range"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        data = self.server.data
+        requested = self.headers.get("Range")
+        if requested:
+            start, end = requested.split("=", 1)[1].split("-")
+            body = data[int(start):min(int(end), len(data) - 1) + 1]
+            self.send_response(206)
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def download_to_file(stream: dict, work_dir: Path) -> Path:
+    """Descarga el origen completo a disco, como fetch_audio con yt-dlp"""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    path = work_dir / f"{uuid.uuid4().hex}.{stream['ext']}"
+    with downloader._get_http_client().stream("GET", stream["url"]) as response, open(path, "wb") as f:
+        for chunk in response.iter_bytes():
+            f.write(chunk)
+    return path
+
+
+def run_mode(mode: str, stream: dict, songs: int, directory: Path) -> tuple[dict, int, float]:
+    """Estadísticas del medidor, bytes comprobados en disco y segundos por canción"""
+    disk_metrics.disk_writes = downloader.disk_writes = disk_metrics.DiskWriteMeter()
+    checked = 0
+    started = time.perf_counter()
+    for i in range(songs):
+        target = directory / mode / f"song{i}.m4a"
+        if mode == "file":
+            source = download_to_file(stream, directory / mode / ".work")
+            checked += source.stat().st_size
+            downloader.transcode_audio(source, target, "m4a")
+        else:
+            downloader.pipe_transcode(stream, target, "m4a")
+        checked += target.stat().st_size
+    elapsed = time.perf_counter() - started
+    return downloader.disk_writes.stats()[mode], checked, elapsed / songs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=4, help="Tamaño del audio de origen")
+    parser.add_argument("--output-ratio", type=float, default=1.0, help="Tamaño de la salida respecto al origen")
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.daemon_threads = True
+    server.data = os.urandom(int(args.size_mb * 1024 * 1024))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stream = {
+        "url": f"http://127.0.0.1:{server.server_port}/audio.m4a",
+        "http_headers": {},
+        "filesize": len(server.data),
+        "ext": "m4a",
+        "acodec": "mp4a.40.2",
+        "protocol": "https",
+    }
+
+    with tempfile.TemporaryDirectory(prefix="spotidl-disk-") as tmp:
+        directory = Path(tmp)
+        fake = directory / "ffmpeg"
+        fake.write_text(FAKE_FFMPEG.format(
+            python=sys.executable, ratio=args.output_ratio, ratio_ceil=int(args.output_ratio) + 1
+        ))
+        fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+        downloader.get_ffmpeg_binary = lambda: str(fake)
+
+        print(f"{args.songs} canciones de {args.size_mb:.1f} MB, salida × {args.output_ratio}")
+        print(f"{'modo':<9}{'escrito/canción':>17}{'origen':>12}{'salida':>12}{'comprobado':>13}{'s/canción':>11}")
+        results = {}
+        for mode in ("file", "pipe"):
+            stats, checked, per_song = run_mode(mode, stream, args.songs, directory)
+            results[mode] = stats["bytes_written_per_song"]
+            print(
+                f"{mode:<9}{stats['bytes_written_per_song'] / 1e6:>14.2f} MB"
+                f"{stats['intermediate_bytes'] / args.songs / 1e6:>9.2f} MB"
+                f"{stats['output_bytes'] / args.songs / 1e6:>9.2f} MB"
+                f"{checked / args.songs / 1e6:>10.2f} MB{per_song:>11.3f}"
+            )
+        print(f"pipe escribe un {(1 - results['pipe'] / results['file']) * 100:.0f}% menos por canción")
+
+    downloader.close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
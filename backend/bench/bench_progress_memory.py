@@ -0,0 +1,111 @@
+"""
+Memoria del almacén de progreso con muchas sesiones.
+
+Llena el ProgressManager con N sesiones de M canciones terminadas y mide la
+memoria asignada (tracemalloc), comparando con el almacén anterior de
+diccionarios anidados de cadenas. También mide el coste de un delta SSE
+(changes_since) con una sola canción cambiada según el tamaño de la sesión.
+
+    python bench/bench_progress_memory.py [--sessions 10000] [--songs 100]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+import _setup  # noqa: F401
+
+from utils.progress_manager import ProgressManager
+
+
+class DictProgressStore:
+    """Almacén anterior: un dict por sesión y otro por canción, con estados en texto"""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def create_session(self, session_id, total_songs):
+        self.sessions[session_id] = {
+            "total_songs": total_songs,
+            "completed_songs": 0,
+            "current_song": "",
+            "song_progress": {},
+            "status": "in_progress",
+            "download_url": None,
+            "created_at": datetime.now().isoformat(),
+            "cancelled": False,
+        }
+
+    def update_song_progress(self, session_id, song_id, status, percentage=0, message=""):
+        self.sessions[session_id]["song_progress"][song_id] = {
+            "status": status,
+            "percentage": percentage,
+            "message": message,
+        }
+
+    def complete_session(self, session_id, download_url):
+        self.sessions[session_id]["status"] = "completed"
+        self.sessions[session_id]["download_url"] = download_url
+
+
+def fill(store, sessions: int, songs: int):
+    for s in range(sessions):
+        session_id = f"session-{s:06d}"
+        store.create_session(session_id, songs)
+        for i in range(songs):
+            # Los estados y mensajes llegan como cadenas nuevas en cada llamada
+            store.update_song_progress(
+                session_id, f"track-{s:06d}-{i:04d}", "".join(("compl", "eted")), 100, "".join(("Comple", "tado"))
+            )
+        store.complete_session(session_id, f"/api/download-file/{session_id}")
+
+
+def measure(factory, sessions: int, songs: int):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = factory()
+    fill(store, sessions, songs)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, current, elapsed
+
+
+def delta_cost(songs: int, repeat: int = 2000) -> float:
+    """Microsegundos por changes_since con una canción cambiada"""
+    manager = ProgressManager()
+    manager.create_session("s", songs)
+    for i in range(songs):
+        manager.update_song_progress("s", f"song{i}", "queued", 20, "En cola para descargar...")
+    _, cursor, _ = manager.changes_since("s")
+    started = time.perf_counter()
+    for i in range(repeat):
+        manager.update_song_progress("s", f"song{i % songs}", "downloading", 50, "Descargando audio...")
+        _, cursor, _ = manager.changes_since("s", cursor)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--songs", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sesiones × {args.songs} canciones")
+    for name, factory in (
+        ("dicts anidados", DictProgressStore),
+        ("ProgressManager", lambda: ProgressManager(max_sessions=args.sessions + 1)),
+    ):
+        store, current, elapsed = measure(factory, args.sessions, args.songs)
+        print(f"  {name:<16} {current / 1e6:8.1f} MB  {elapsed:6.1f} s")
+        del store
+
+    print("Delta SSE con una canción cambiada")
+    for songs in (100, 1000, 10000):
+        print(f"  {songs:>6} canciones  {delta_cost(songs):6.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+CPU del servidor por cliente conectado: progreso por Server-Sent Events
+frente al sondeo de /progress cada 500 ms que hace el frontend sin SSE.
+
+Una sesión simulada actualiza una canción cada --update-ms. Los clientes
+llaman a la aplicación ASGI directamente, en el mismo proceso y sin red, así
+que se mide el coste de la aplicación (rutas, lecturas del progreso y JSON)
+sin el análisis HTTP del servidor; ese coste es por petición y pesaría más en
+el sondeo. Al CPU de cada pasada se le resta el de la sesión sin clientes.
+
+    python bench/bench_progress_sse.py [--clients 50 200] [--seconds 5]
+        [--songs 200] [--update-ms 100] [--poll-ms 500]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import _setup  # noqa: F401
+
+from fastapi import FastAPI
+
+from api import routes
+from utils.progress_manager import progress_manager
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    return app
+
+
+async def call(app: FastAPI, path: str, disconnect: asyncio.Event) -> int:
+    """Hace un GET contra la aplicación y devuelve los bytes recibidos"""
+    received = 0
+    request_sent = False
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return received
+
+
+async def sse_client(app: FastAPI, session_id: str, stop: asyncio.Event, totals: list):
+    totals.append(await call(app, f"/api/progress/{session_id}/events", stop))
+
+
+async def polling_client(app: FastAPI, session_id: str, stop: asyncio.Event, totals: list, interval: float):
+    received = 0
+    done = asyncio.Event()
+    done.set()
+    while not stop.is_set():
+        received += await call(app, f"/api/progress/{session_id}", done)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+    totals.append(received)
+
+
+async def update_session(session_id: str, songs: int, interval: float, stop: asyncio.Event):
+    """Progreso de descarga de una canción al azar cada `interval` segundos"""
+    while not stop.is_set():
+        song = random.randrange(songs)
+        progress_manager.update_song_progress(
+            session_id, f"song{song}", "downloading", random.randint(30, 90), "Descargando audio..."
+        )
+        await asyncio.sleep(interval)
+
+
+async def run(mode: str, clients: int, args) -> tuple[float, int]:
+    """CPU del proceso (s) y bytes enviados durante la pasada"""
+    app = build_app()
+    session_id = f"bench-{uuid.uuid4().hex}"
+    progress_manager.create_session(session_id, args.songs)
+    for i in range(args.songs):
+        progress_manager.update_song_progress(session_id, f"song{i}", "queued", 20, "En cola para descargar...")
+
+    stop = asyncio.Event()
+    totals: list[int] = []
+    updater = asyncio.create_task(update_session(session_id, args.songs, args.update_ms / 1000, stop))
+    tasks = []
+    cpu_before = time.process_time()
+    for _ in range(clients):
+        if mode == "sse":
+            tasks.append(asyncio.create_task(sse_client(app, session_id, stop, totals)))
+        else:
+            tasks.append(asyncio.create_task(polling_client(app, session_id, stop, totals, args.poll_ms / 1000)))
+        # Repartir las conexiones como llegarían los usuarios
+        await asyncio.sleep(args.poll_ms / 1000 / max(clients, 1))
+
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(updater, *tasks)
+    cpu = time.process_time() - cpu_before
+    progress_manager.cleanup_session(session_id)
+    return cpu, sum(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--songs", type=int, default=200)
+    parser.add_argument("--update-ms", type=float, default=100)
+    parser.add_argument("--poll-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    baseline, _ = asyncio.run(run("sse", 0, args))
+    print(f"Sesión de {args.songs} canciones, un cambio cada {args.update_ms:.0f} ms, "
+          f"{args.seconds:.0f} s por pasada (sin clientes: {baseline / args.seconds * 1000:.1f} ms CPU/s)")
+    print(f"{'modo':<8}{'clientes':>9}{'CPU ms/s por cliente':>22}{'KB/s por cliente':>18}")
+    for clients in args.clients:
+        for mode in ("sse", "sondeo"):
+            cpu, sent = asyncio.run(run(mode, clients, args))
+            per_client = max(cpu - baseline, 0) / args.seconds / clients * 1000
+            kb = sent / args.seconds / clients / 1024
+            print(f"{mode:<8}{clients:>9}{per_client:>22.3f}{kb:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Descarga de un stream de audio contra un servidor local que limita el ancho
+de banda de cada conexión (como hace YouTube), en una sola petición y por
+rangos paralelos, con los dos motores.
+
+    python bench/bench_range_download.py [--size-mb 8] [--kbps 2000]
+"""
+import argparse
+import asyncio
+import http.server
+import os
+import threading
+import time
+
+import _setup  # noqa: F401
+
+from services import async_downloader, downloader
+
+
+class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    """Sirve `server.data` con rangos, a `server.rate` bytes/s por conexión"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        data = self.server.data
+        requested = self.headers.get("Range")
+        if requested:
+            start, end = requested.split("=", 1)[1].split("-")
+            start, end = int(start), min(int(end), len(data) - 1)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = data[start:end + 1]
+            self.send_response(206)
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        step = 16 * 1024
+        started = time.monotonic()
+        for offset in range(0, len(body), step):
+            # Ritmo constante por conexión
+            delay = started + offset / self.server.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.wfile.write(body[offset:offset + step])
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def log_message(self, *args):
+        pass
+
+
+def run_threaded(stream, **kwargs) -> int:
+    client = downloader._get_http_client()
+    return sum(len(chunk) for chunk in downloader.iter_stream_ranges(client, stream, **kwargs))
+
+
+async def run_async(stream, **kwargs) -> int:
+    client = async_downloader.get_client()
+    try:
+        return sum([len(chunk) async for chunk in async_downloader._iter_ranges(client, stream, **kwargs)])
+    finally:
+        await async_downloader.close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--kbps", type=float, default=2000, help="Ancho de banda por conexión (KB/s)")
+    parser.add_argument("--range-mb", type=float, default=1)
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ThrottledHandler)
+    server.daemon_threads = True
+    server.data = os.urandom(int(args.size_mb * 1024 * 1024))
+    server.rate = args.kbps * 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base = {"url": f"http://127.0.0.1:{server.server_port}/audio", "http_headers": {}, "protocol": "https"}
+    range_size = int(args.range_mb * 1024 * 1024)
+    cases = [
+        ("una petición", {**base, "filesize": None}, 1),
+        ("rangos x2", {**base, "filesize": len(server.data)}, 2),
+        ("rangos x4", {**base, "filesize": len(server.data)}, 4),
+        ("rangos x8", {**base, "filesize": len(server.data)}, 8),
+    ]
+
+    print(f"{args.size_mb:.0f} MB a {args.kbps:.0f} KB/s por conexión, rangos de {args.range_mb:g} MB")
+    print(f"{'modo':<14}{'hilos (s)':>12}{'async (s)':>12}")
+    for name, stream, concurrency in cases:
+        kwargs = {"range_size": range_size, "concurrency": concurrency}
+        started = time.perf_counter()
+        assert run_threaded(stream, **kwargs) == len(server.data)
+        threaded = time.perf_counter() - started
+        started = time.perf_counter()
+        assert asyncio.run(run_async(stream, **kwargs)) == len(server.data)
+        asynchronous = time.perf_counter() - started
+        print(f"{name:<14}{threaded:>12.2f}{asynchronous:>12.2f}")
+
+    downloader.close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
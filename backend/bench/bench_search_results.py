@@ -0,0 +1,106 @@
+"""
+Resultados de YouTube pedidos por canción con la búsqueda adaptativa
+(ampliada solo si no hay un resultado seguro), con un extractor simulado sobre las búsquedas guardadas en
+fixtures/match_scoring.json.
+
+Cada búsqueda devuelve los resultados del caso y, detrás, resultados de
+relleno hasta el número pedido. Se cuenta todo lo que devuelve el extractor
+(al ampliar, solo los resultados posteriores a la primera página) y se
+compara con pedir siempre SEARCH_RESULTS_MAX.
+
+    python bench/bench_search_results.py [--fixtures ruta]
+"""
+import argparse
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from config import SEARCH_RESULTS_INITIAL, SEARCH_RESULTS_MAX
+from eval_match_scoring import FIXTURES, load_cases
+from models.song import Song
+from services import youtube_client
+from services.match_scoring import MatchTarget
+
+_QUERY = re.compile(r"ytsearch(\d+):(.*)")
+
+
+class StubExtractor:
+    """
+    YoutubeDL simulado: responde ytsearchN:consulta con el caso de la
+    consulta, recortado a playlist_items ("a-b") si las opciones lo fijan
+    """
+
+    def __init__(self, results_by_query: dict):
+        self.results_by_query = results_by_query
+        self.params = {}
+        self.requests = 0
+        self.returned = 0
+
+    def extract_info(self, url: str, download: bool = False) -> dict:
+        count, query = _QUERY.fullmatch(url).groups()
+        start, end = 1, int(count)
+        if self.params.get("playlist_items"):
+            start, end = map(int, self.params["playlist_items"].split("-"))
+        results = self.results_by_query[query][:int(count)][start - 1:end]
+        self.requests += 1
+        self.returned += len(results)
+        return {"entries": results}
+
+
+def filler(case_index: int, count: int) -> list:
+    """Resultados sin relación con la canción para completar la página"""
+    return [
+        {"id": f"f{case_index}-{i}", "title": f"Unrelated video {i}", "channel": "Someone", "duration": 600}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    args = parser.parse_args()
+
+    cases = load_cases(args.fixtures)
+    results_by_query = {}
+    songs = []
+    for i, case in enumerate(cases):
+        song = Song(
+            title=case["title"], artist=case["artist"], duration_ms=case["duration_ms"],
+            # Algunos casos repiten canción con otros resultados: consulta única por caso
+            query=f"{case['title']} #{i}"
+        )
+        query = f"{song.query} {song.artist}"
+        results_by_query[query] = case["results"] + filler(i, SEARCH_RESULTS_MAX)
+        songs.append(song)
+
+    stub = StubExtractor(results_by_query)
+
+    @contextmanager
+    def checkout(purpose, strategy, build_opts, **kwargs):
+        stub.params = build_opts()
+        yield stub
+
+    youtube_client.ydl_pool.checkout = checkout
+    before = youtube_client.search_metrics.stats()
+    correct = 0
+    for song, case in zip(songs, cases):
+        target = MatchTarget(song.title, song.artist, song.duration_ms)
+        video_id = youtube_client._search_video_id(song.query, song.artist, target)
+        correct += case["expected"] is not None and video_id == case["expected"]
+    stats = youtube_client.search_metrics.stats()
+
+    searches = stats["searches"] - before["searches"]
+    widened = stats["widened"] - before["widened"]
+    print(f"Canciones: {searches} (correctas {correct}/{sum(c['expected'] is not None for c in cases)})")
+    print(f"Búsquedas ampliadas: {widened} ({widened / searches:.0%})")
+    print(f"Peticiones al extractor por canción: {stub.requests / searches:.2f}")
+    print(f"Resultados devueltos por canción: {stub.returned / searches:.2f} "
+          f"(métrica: {stats['results_per_search']}, "
+          f"siempre ytsearch{SEARCH_RESULTS_MAX}: {SEARCH_RESULTS_MAX}; "
+          f"primera página: ytsearch{SEARCH_RESULTS_INITIAL})")
+
+
+if __name__ == "__main__":
+    main()
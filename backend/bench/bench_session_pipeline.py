@@ -0,0 +1,101 @@
+"""
+Tiempo total de una sesión según las canciones en curso a la vez.
+
+La búsqueda, la descarga y la conversión se sustituyen por funciones que
+solo esperan la latencia indicada, y el planificador no tiene límites de
+ritmo, así que solo se mide el pipeline de process_downloads.
+
+    python bench/bench_session_pipeline.py [--songs 40] [--in-flight 1 2 4 8]
+        [--search-ms 100] [--download-ms 300] [--transcode-ms 100]
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from api import routes
+from models.song import Song
+from services import downloader, youtube_client
+from services.audio_store import AudioStore
+from utils.job_scheduler import JobScheduler
+from utils.progress_manager import progress_manager
+
+
+def stub_pipeline(search_s: float, download_s: float, transcode_s: float):
+    """Sustituye las etapas bloqueantes por esperas"""
+    def search_youtube(query, artist="", track_id=None, song=None, check_cache=True):
+        time.sleep(search_s)
+        return f"https://www.youtube.com/watch?v={track_id:0>11}"
+
+    def fetch_audio(youtube_url, work_dir, title=None, artist=None, **kwargs):
+        time.sleep(download_s)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        path = work_dir / f"{uuid.uuid4().hex}.webm"
+        path.write_bytes(b"audio")
+        return path
+
+    def transcode_audio(source, target, output_format="mp3"):
+        time.sleep(transcode_s)
+        shutil.move(source, target)
+
+    youtube_client.search_youtube = search_youtube
+    routes.DOWNLOAD_ENGINE = "threaded"
+    routes.PIPE_TRANSCODE = False
+    downloader.fetch_audio = fetch_audio
+    downloader.transcode_audio = transcode_audio
+
+
+async def run_session(songs: list[Song], root: Path, in_flight: int) -> float:
+    session_id = f"bench-{uuid.uuid4().hex}"
+    temp_dir = root / session_id
+    temp_dir.mkdir()
+    progress_manager.create_session(session_id, len(songs))
+    started = time.perf_counter()
+    await routes.process_downloads(songs, temp_dir, session_id, max_in_flight=in_flight)
+    elapsed = time.perf_counter() - started
+    summary = progress_manager.get_summary(session_id)
+    assert summary["status"] == "completed", summary
+    assert summary["completed_songs"] == len(songs)
+    progress_manager.cleanup_session(session_id)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=40)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--search-ms", type=float, default=100)
+    parser.add_argument("--download-ms", type=float, default=300)
+    parser.add_argument("--transcode-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    stub_pipeline(args.search_ms / 1000, args.download_ms / 1000, args.transcode_ms / 1000)
+    # Sin límites de ritmo ni de hilos que enmascaren la concurrencia de la sesión
+    limit = max(args.in_flight) + routes.SEARCH_LOOKAHEAD
+    routes.job_scheduler = JobScheduler({"search": limit, "download": limit, "transcode": limit})
+
+    per_song = (args.search_ms + args.download_ms + args.transcode_ms) / 1000
+    print(f"{args.songs} canciones, {per_song * 1000:.0f} ms por canción "
+          f"(todo en serie: {args.songs * per_song:.1f} s)")
+    print(f"{'en curso':>9}{'total (s)':>12}{'aceleración':>14}")
+    with tempfile.TemporaryDirectory(prefix="spotidl-pipeline-") as tmp:
+        baseline = None
+        for in_flight in args.in_flight:
+            # Almacén vacío en cada pasada: ninguna canción se reutiliza
+            routes.audio_store = AudioStore(Path(tmp) / f"store-{in_flight}")
+            songs = [
+                Song(id=f"{in_flight}x{i}", title=f"Song {i}", artist="Artist", query=f"Song {i} - Artist")
+                for i in range(args.songs)
+            ]
+            elapsed = asyncio.run(run_session(songs, Path(tmp), in_flight))
+            baseline = baseline or elapsed
+            print(f"{in_flight:>9}{elapsed:>12.2f}{baseline / elapsed:>13.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latencia de fin de sesión: tiempo desde que termina la última canción hasta
+que el ZIP está disponible, comprimiendo todo al final (zip_files) o
+añadiendo cada canción al terminar (IncrementalZip).
+
+    python bench/bench_session_zip.py [--tracks 50 500] [--size-kb 1024]
+
+Las canciones son archivos aleatorios del tamaño indicado. Con IncrementalZip
+el coste de add() se paga mientras las demás canciones se descargan; se
+muestra aparte como trabajo repartido durante la sesión.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from utils.zipper import IncrementalZip, zip_files
+
+
+def make_tracks(directory: Path, count: int, size: int) -> list[Path]:
+    directory.mkdir()
+    data = os.urandom(size)
+    tracks = []
+    for i in range(count):
+        path = directory / f"Track {i:04d} - Artist.mp3"
+        # Contenido distinto por archivo sin generar N bloques aleatorios
+        path.write_bytes(i.to_bytes(4, "big") + data[4:])
+        tracks.append(path)
+    return tracks
+
+
+def bench(count: int, size: int, root: Path) -> tuple[float, float, float]:
+    session_dir = root / f"s{count}"
+    tracks = make_tracks(session_dir, count, size)
+
+    # Todo al final: el ZIP se construye después de la última canción
+    started = time.perf_counter()
+    zip_files(session_dir, root / f"full-{count}.zip")
+    at_end = time.perf_counter() - started
+
+    # Incremental: add() al terminar cada canción, finalize() al acabar
+    archive = IncrementalZip(root / f"inc-{count}.zip")
+    started = time.perf_counter()
+    for track in tracks:
+        archive.add(track)
+    during = time.perf_counter() - started
+    started = time.perf_counter()
+    archive.finalize()
+    incremental = time.perf_counter() - started
+
+    shutil.rmtree(session_dir)
+    return at_end, incremental, during
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tracks", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--size-kb", type=int, default=1024, help="Tamaño de cada canción (KB)")
+    args = parser.parse_args()
+
+    size = args.size_kb * 1024
+    print(f"Canciones de {args.size_kb} KB")
+    print(f"{'canciones':>10}{'zip_files (s)':>16}{'incremental (s)':>18}{'add() en sesión (s)':>22}")
+    with tempfile.TemporaryDirectory(prefix="spotidl-zip-") as tmp:
+        for count in args.tracks:
+            at_end, incremental, during = bench(count, size, Path(tmp))
+            print(f"{count:>10}{at_end:>16.3f}{incremental:>18.4f}{during:>22.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Segundos de CPU por canción al remuxar (-codec:a copy) frente a recodificar,
+con audio de prueba generado localmente por FFmpeg.
+
+Se generan dos pistas de la duración indicada, AAC (.m4a) y Opus (.webm),
+como las que entrega YouTube, y se convierten con transcode_audio:
+
+- m4a desde AAC y opus desde Opus: remux, sin decodificar.
+- m4a desde Opus, opus desde AAC y mp3 desde cualquiera: recodificación.
+
+El tiempo de CPU es el de los procesos FFmpeg hijos (getrusage). Requiere
+FFmpeg: el de backend/bin/ffmpeg, el del PATH o el indicado con --ffmpeg; si
+no hay ninguno, el benchmark lo indica y termina sin medir.
+
+    python bench/bench_transcode_cpu.py [--seconds 180] [--repeat 3] [--ffmpeg ruta]
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from services import downloader
+from utils.ffmpeg_setup import get_bin_directory
+
+# Pistas de prueba: extensión -> opciones de codificación
+SOURCES = {
+    "m4a": ["-codec:a", "aac", "-b:a", "128k"],
+    "webm": ["-codec:a", "libopus", "-b:a", "128k"],
+}
+CASES = [
+    # (formato de salida, pista de origen)
+    ("m4a", "m4a"),
+    ("opus", "webm"),
+    ("m4a", "webm"),
+    ("opus", "m4a"),
+    ("mp3", "m4a"),
+    ("mp3", "webm"),
+]
+
+
+def find_ffmpeg(explicit: str = None) -> str:
+    """Ruta de FFmpeg o None si no hay ninguno"""
+    candidates = [explicit] if explicit else [
+        str(get_bin_directory() / ("ffmpeg.exe" if os.name == "nt" else "ffmpeg")),
+        shutil.which("ffmpeg"),
+    ]
+    return next((c for c in candidates if c and os.path.isfile(c)), None)
+
+
+def generate(ffmpeg: str, directory: Path, seconds: float) -> dict:
+    """Genera las pistas de prueba (música sintética estéreo)"""
+    tracks = {}
+    for ext, codec_args in SOURCES.items():
+        path = directory / f"source.{ext}"
+        subprocess.run([
+            ffmpeg, "-y", "-nostdin", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+            "-f", "lavfi", "-i", f"anoisesrc=color=pink:sample_rate=48000:amplitude=0.05:duration={seconds}",
+            "-filter_complex", "[0][1]amix=inputs=2,aformat=channel_layouts=stereo",
+            *codec_args, str(path)
+        ], check=True)
+        tracks[ext] = path
+    return tracks
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(source: Path, output_format: str, directory: Path, repeat: int) -> tuple[float, float, str]:
+    """CPU y tiempo real medios por conversión, y si fue remux o recodificación"""
+    cpu = wall = 0.0
+    for i in range(repeat):
+        # transcode_audio borra el origen: se trabaja sobre una copia
+        work = directory / f"work-{i}{source.suffix}"
+        shutil.copyfile(source, work)
+        target = directory / f"out-{i}.{output_format}"
+        cpu_before, started = children_cpu(), time.perf_counter()
+        downloader.transcode_audio(work, target, output_format)
+        wall += time.perf_counter() - started
+        cpu += children_cpu() - cpu_before
+        target.unlink()
+    args = downloader.ffmpeg_output_args(output_format, downloader.source_codec(source.suffix))
+    return cpu / repeat, wall / repeat, "remux" if "copy" in args else "recodificación"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=180, help="Duración de las pistas de prueba")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ffmpeg", help="Ruta del ejecutable de FFmpeg")
+    args = parser.parse_args()
+
+    ffmpeg = find_ffmpeg(args.ffmpeg)
+    if ffmpeg is None:
+        print("⚠️ FFmpeg no encontrado (ni en backend/bin/ffmpeg ni en el PATH): no se puede medir.")
+        print("   Instálalo o indica la ruta con --ffmpeg.")
+        return 0
+    downloader.get_ffmpeg_binary = lambda: ffmpeg
+
+    with tempfile.TemporaryDirectory(prefix="spotidl-transcode-") as tmp:
+        directory = Path(tmp)
+        tracks = generate(ffmpeg, directory, args.seconds)
+        print(f"Pistas de {args.seconds:.0f} s, {args.repeat} repeticiones")
+        print(f"{'salida':<8}{'origen':<8}{'modo':<16}{'CPU (s)':>9}{'real (s)':>10}")
+        for output_format, source_ext in CASES:
+            cpu, wall, mode = measure(tracks[source_ext], output_format, directory, args.repeat)
+            print(f"{output_format:<8}{source_ext:<8}{mode:<16}{cpu:>9.3f}{wall:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
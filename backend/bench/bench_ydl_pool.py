@@ -0,0 +1,90 @@
+"""
+Coste de preparar yt-dlp por canción: una instancia YoutubeDL nueva en cada
+descarga frente a una reutilizada del pool, con un extractor simulado que
+responde sin red, así que solo se mide la preparación y el procesado de
+yt-dlp.
+
+    python bench/bench_ydl_pool.py [--songs 200]
+"""
+import argparse
+import tempfile
+import time
+
+import _setup  # noqa: F401
+
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.common import InfoExtractor
+
+from services.ydl_pool import YDLPool
+
+STRATEGY = {"name": "bench"}
+
+
+class StubIE(InfoExtractor):
+    """Responde stub:<id> con un vídeo de un solo formato de audio"""
+
+    IE_NAME = "stub"
+    _VALID_URL = r"stub:(?P<id>\w+)"
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return {
+            "id": video_id,
+            "title": f"Song {video_id}",
+            "formats": [{"url": f"http://127.0.0.1/{video_id}.m4a", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none"}],
+        }
+
+
+def build_opts() -> dict:
+    return {"quiet": True, "no_warnings": True, "skip_download": True, "format": "bestaudio"}
+
+
+# Instancias que ya tienen el extractor simulado
+_prepared: set[int] = set()
+
+
+def extract(ydl: YoutubeDL, i: int):
+    if id(ydl) not in _prepared:
+        ydl.add_info_extractor(StubIE())
+        _prepared.add(id(ydl))
+    return ydl.extract_info(f"stub:s{i}", download=False, ie_key=StubIE.ie_key())
+
+
+def fresh(songs: int, tmp: str) -> float:
+    started = time.perf_counter()
+    for i in range(songs):
+        ydl = YoutubeDL({**build_opts(), "outtmpl": f"{tmp}/{i}.%(ext)s", "progress_hooks": [lambda d: None]})
+        extract(ydl, i)
+        _prepared.discard(id(ydl))
+        ydl.close()
+    return time.perf_counter() - started
+
+
+def pooled(songs: int, tmp: str) -> float:
+    pool = YDLPool()
+    started = time.perf_counter()
+    for i in range(songs):
+        with pool.checkout("bench", STRATEGY, build_opts, f"{tmp}/{i}.%(ext)s", [lambda d: None]) as ydl:
+            extract(ydl, i)
+    elapsed = time.perf_counter() - started
+    pool.close_all()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--songs", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.gettempdir()
+    # Calentar importaciones perezosas de yt-dlp para no cargarlas al primero
+    fresh(2, tmp)
+    new = fresh(args.songs, tmp)
+    reused = pooled(args.songs, tmp)
+    print(f"{args.songs} canciones con extractor simulado")
+    print(f"{'instancia nueva':<18}{new / args.songs * 1000:>8.2f} ms/canción")
+    print(f"{'pool':<18}{reused / args.songs * 1000:>8.2f} ms/canción")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Evaluación sin red de la puntuación de resultados de YouTube.
+
+Recorre un conjunto de búsquedas guardadas (fixtures/match_scoring.json:
+canción de Spotify, resultado correcto y resultados de YouTube) y mide:
+
+- Aciertos: el resultado elegido es el correcto. En los casos sin resultado
+  correcto ("expected": null) acierta si ninguno se acepta como seguro.
+- Seguros erróneos: un resultado equivocado aceptado sin mirar los demás
+  (el peor fallo: la búsqueda no se amplía).
+- Tiempo de puntuación por búsqueda.
+
+Se compara con la heurística anterior (artista y palabras clave).
+
+    python bench/eval_match_scoring.py [--fixtures ruta] [--repeat 2000]
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import _setup  # noqa: F401
+
+from services.match_scoring import MatchTarget, best_match, is_confident
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "match_scoring.json"
+
+
+def load_cases(path: Path = FIXTURES) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def legacy_pick(entries: list, artist: str) -> dict:
+    """Heurística anterior: artista en el título o el canal y palabras clave"""
+    def normalize(text):
+        return re.sub(r"\W+", "", text).lower()
+
+    artist_key = normalize(artist)
+
+    def score(entry):
+        title = entry.get("title", "").lower()
+        uploader = entry.get("channel", "").lower()
+        value = 0
+        if artist_key and (artist_key in normalize(title) or artist_key in normalize(uploader)):
+            value += 3
+        if any(k in title for k in ["audio", "lyrics", "letra"]):
+            value += 2
+        if "official" in title:
+            value += 1
+        if any(k in title for k in ["live", "mix", "video"]):
+            value -= 2
+        return value
+
+    return max(entries[:5], key=score)
+
+
+def evaluate(cases: list) -> dict:
+    """Aciertos y seguros erróneos de la puntuación actual y de la anterior"""
+    correct = legacy_correct = confident_wrong = 0
+    misses = []
+    for case in cases:
+        target = MatchTarget(case["title"], case["artist"], case["duration_ms"])
+        entry, score = best_match(case["results"], target)
+        confident = entry is not None and is_confident(target, entry, score)
+        expected = case["expected"]
+        if expected is None:
+            ok = not confident
+        else:
+            ok = entry is not None and entry["id"] == expected
+        if confident and (expected is None or entry["id"] != expected):
+            confident_wrong += 1
+        if ok:
+            correct += 1
+        else:
+            misses.append(f"{case['artist']} - {case['title']}: {entry and entry['id']} ({score:.2f})")
+        # La heurística anterior siempre aceptaba su elección
+        legacy = legacy_pick(case["results"], case["artist"])
+        legacy_correct += expected is not None and legacy["id"] == expected
+
+    return {
+        "cases": len(cases),
+        "correct": correct,
+        "confident_wrong": confident_wrong,
+        "legacy_correct": legacy_correct,
+        "misses": misses,
+    }
+
+
+def time_scoring(cases: list, repeat: int) -> float:
+    """Microsegundos por búsqueda (MatchTarget + best_match)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            best_match(case["results"], MatchTarget(case["title"], case["artist"], case["duration_ms"]))
+    return (time.perf_counter() - started) / (repeat * len(cases)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = load_cases(args.fixtures)
+    result = evaluate(cases)
+    print(f"Casos: {result['cases']}")
+    print(f"Aciertos: {result['correct']}/{result['cases']} (heurística anterior {result['legacy_correct']}/{result['cases']})")
+    print(f"Seguros erróneos: {result['confident_wrong']}")
+    for miss in result["misses"]:
+        print(f"  ✗ {miss}")
+    print(f"Tiempo por búsqueda: {time_scoring(cases, args.repeat):.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,167 @@
 """
 Configuración centralizada para yt-dlp con múltiples estrategias anti-bot
 """
+import atexit
+import copy
 import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Optional, Tuple
+
+# Concurrencia de descargas
+# Número de canciones que una sesión mantiene en curso al mismo tiempo
+SONGS_IN_FLIGHT_PER_SESSION = max(1, int(os.getenv("SONGS_IN_FLIGHT_PER_SESSION", "3")))
+# Canciones que una sesión puede tener buscadas por adelantado, esperando turno de descarga
+SEARCH_LOOKAHEAD = max(0, int(os.getenv("SEARCH_LOOKAHEAD", "10")))
+
+# Límites globales (todas las sesiones) del planificador de trabajos
+# Búsquedas: solo metadatos por red, admiten un pool amplio
+SEARCH_CONCURRENCY = max(1, int(os.getenv("SEARCH_CONCURRENCY", "8")))
+DOWNLOAD_CONCURRENCY = max(1, int(os.getenv("DOWNLOAD_CONCURRENCY", "3")))
+# Conversión a MP3: limitada por CPU, un proceso FFmpeg por núcleo
+TRANSCODE_CONCURRENCY = max(1, int(os.getenv("TRANSCODE_CONCURRENCY", str(os.cpu_count() or 1))))
+
+# Resultados por búsqueda de YouTube: se piden pocos y solo se amplía hasta
+# el máximo si ninguno coincide claramente con la canción
+SEARCH_RESULTS_INITIAL = max(1, int(os.getenv("SEARCH_RESULTS_INITIAL", "3")))
+SEARCH_RESULTS_MAX = max(SEARCH_RESULTS_INITIAL, int(os.getenv("SEARCH_RESULTS_MAX", "10")))
+
+# Ritmo máximo de peticiones a YouTube (compartido por todas las sesiones)
+SEARCH_RATE_PER_SECOND = float(os.getenv("SEARCH_RATE_PER_SECOND", "5"))
+SEARCH_BURST = float(os.getenv("SEARCH_BURST", "10"))
+DOWNLOAD_RATE_PER_SECOND = float(os.getenv("DOWNLOAD_RATE_PER_SECOND", "2"))
+DOWNLOAD_BURST = float(os.getenv("DOWNLOAD_BURST", "5"))
+# Circuit breaker: fallos 403/bot seguidos que lo abren y segundos hasta probar de nuevo
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "8"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+# Espera antes de probar la siguiente estrategia tras un bloqueo
+STRATEGY_RETRY_DELAY = float(os.getenv("STRATEGY_RETRY_DELAY", "2"))
+
+# Motor de descarga: "async" (yt-dlp solo resuelve la URL y los bytes se
+# descargan con httpx directamente hacia FFmpeg) o "threaded" (yt-dlp y
+# FFmpeg se ejecutan en hilos del planificador)
+DOWNLOAD_ENGINE = os.getenv("DOWNLOAD_ENGINE", "async").lower()
+# Con el motor "threaded": enviar los bytes a FFmpeg por una tubería en lugar
+# de guardar el audio original en disco y leerlo después
+PIPE_TRANSCODE = os.getenv("PIPE_TRANSCODE", "1") != "0"
+# Descargas asíncronas simultáneas (todas las sesiones) y conexiones HTTP del pool
+ASYNC_MAX_STREAMS = max(1, int(os.getenv("ASYNC_MAX_STREAMS", "200")))
+ASYNC_HTTP_MAX_CONNECTIONS = max(1, int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "100")))
+# Descarga por rangos: YouTube limita el ancho de banda de cada conexión, así
+# que el stream se pide en rangos de DOWNLOAD_RANGE_SIZE bytes, hasta
+# DOWNLOAD_RANGE_CONCURRENCY a la vez, y se reensambla en orden. Cada rango se
+# lee por trozos a medida que llega; los rangos adelantados guardan como mucho
+# DOWNLOAD_RANGE_BUFFER bytes y dejan de leer de su conexión hasta que les toca,
+# así que la memoria por canción es como mucho búfer × concurrencia.
+DOWNLOAD_RANGE_SIZE = max(64 * 1024, int(os.getenv("DOWNLOAD_RANGE_SIZE", str(2 * 1024 * 1024))))
+DOWNLOAD_RANGE_CONCURRENCY = max(1, int(os.getenv("DOWNLOAD_RANGE_CONCURRENCY", "4")))
+DOWNLOAD_RANGE_BUFFER = max(64 * 1024, int(os.getenv("DOWNLOAD_RANGE_BUFFER", str(256 * 1024))))
+
+# Páginas de una playlist de Spotify que se piden en paralelo
+SPOTIFY_PAGE_WORKERS = max(1, int(os.getenv("SPOTIFY_PAGE_WORKERS", "4")))
+
+# Caché de playlists de Spotify (revalidada con snapshot_id)
+PLAYLIST_CACHE_MAX_PLAYLISTS = int(os.getenv("PLAYLIST_CACHE_MAX_PLAYLISTS", "500"))
+PLAYLIST_CACHE_MAX_TRACKS = int(os.getenv("PLAYLIST_CACHE_MAX_TRACKS", "200000"))
+
+# Calidad del MP3 generado (kbps)
+MP3_BITRATE = "192"
+
+# Formatos de salida. Los que tienen copy_codec se remuxan con "-c:a copy"
+# cuando el stream de YouTube ya viene en ese códec (sin decodificar ni
+# perder calidad); si no, o para MP3, se recodifica con encoder. quality
+# distingue las variantes de un mismo vídeo en el almacén de audio.
+OUTPUT_FORMATS = {
+    "mp3": {
+        "ext": "mp3",
+        "muxer": "mp3",
+        "quality": MP3_BITRATE,
+        "copy_codec": None,
+        "encoder": ["-codec:a", "libmp3lame", "-b:a", f"{MP3_BITRATE}k"],
+        "ydl_format": "bestaudio/best",
+    },
+    "m4a": {
+        "ext": "m4a",
+        "muxer": "ipod",
+        "quality": "best",
+        "copy_codec": "aac",
+        "encoder": ["-codec:a", "aac", "-b:a", "192k"],
+        "ydl_format": "bestaudio[ext=m4a]/bestaudio/best",
+    },
+    "opus": {
+        "ext": "opus",
+        "muxer": "opus",
+        "quality": "best",
+        "copy_codec": "opus",
+        "encoder": ["-codec:a", "libopus", "-b:a", "160k"],
+        "ydl_format": "bestaudio[acodec=opus]/bestaudio/best",
+    },
+}
+DEFAULT_OUTPUT_FORMAT = os.getenv("DEFAULT_OUTPUT_FORMAT", "mp3")
+# Extensiones de los archivos de audio terminados de una sesión
+AUDIO_EXTENSIONS = tuple(f".{fmt['ext']}" for fmt in OUTPUT_FORMATS.values())
+
+# Directorio para cachés persistentes (búsquedas, audio...)
+CACHE_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent / "cache"))
+
+# Caché de búsquedas de YouTube
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(30 * 24 * 3600)))  # 30 días
+SEARCH_CACHE_NEGATIVE_TTL = float(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", str(6 * 3600)))  # 6 horas
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "100000"))
+
+# Sesiones de progreso en memoria: segundos que se conservan las terminadas
+# (completadas, fallidas o canceladas), máximo de sesiones guardadas (las
+# descargas nuevas se rechazan si todas siguen en curso) y cada cuánto se
+# buscan sesiones caducadas
+PROGRESS_SESSION_TTL = float(os.getenv("PROGRESS_SESSION_TTL", str(3600)))
+PROGRESS_MAX_SESSIONS = max(1, int(os.getenv("PROGRESS_MAX_SESSIONS", "10000")))
+PROGRESS_EVICT_INTERVAL = max(1.0, float(os.getenv("PROGRESS_EVICT_INTERVAL", "60")))
+
+# Actualizaciones de progreso por bytes descargados: máximo por canción y segundo
+PROGRESS_UPDATES_PER_SECOND = float(os.getenv("PROGRESS_UPDATES_PER_SECOND", "4"))
+
+# Stream de progreso (Server-Sent Events): ventana en la que se agrupan los
+# cambios antes de enviarlos y cada cuánto se envía un keepalive (segundos)
+PROGRESS_STREAM_COALESCE = float(os.getenv("PROGRESS_STREAM_COALESCE", "0.25"))
+PROGRESS_STREAM_KEEPALIVE = float(os.getenv("PROGRESS_STREAM_KEEPALIVE", "15"))
+
+# Diario persistente de sesiones (para reanudarlas tras un reinicio)
+JOB_JOURNAL_PATH = Path(os.getenv("JOB_JOURNAL_PATH", CACHE_DIR / "jobs.sqlite3"))
+# Cada cuánto se vuelcan al disco los cambios acumulados (segundos)
+JOB_JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOB_JOURNAL_FLUSH_INTERVAL", "1"))
+# Sesiones sin actividad durante más tiempo no se restauran (segundos)
+JOB_JOURNAL_RETENTION = float(os.getenv("JOB_JOURNAL_RETENTION", str(24 * 3600)))
+
+# Estado compartido entre workers/nodos (progreso y dueño de cada sesión):
+# "" (solo en el proceso), "memory", "sqlite" o una URL redis://
+STATE_BACKEND = os.getenv("STATE_BACKEND", "")
+STATE_DB_PATH = Path(os.getenv("STATE_DB_PATH", CACHE_DIR / "state.sqlite3"))
+# Cada cuánto se publica el progreso en el almacén (segundos)
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0.25"))
+# Un worker que deja de renovar su lease pierde la sesión tras estos segundos
+SESSION_LEASE_SECONDS = float(os.getenv("SESSION_LEASE_SECONDS", "30"))
+
+# Directorio de las descargas (compartido entre nodos si hay varios)
+DOWNLOADS_DIR = Path(os.getenv("DOWNLOADS_DIR", Path(__file__).resolve().parent.parent / "downloads"))
+
+# Limpieza del directorio de descargas: cuota total, cada cuánto se revisa,
+# cuánto se guarda un ZIP (sin descargar / tras descargarlo) y edad mínima
+# antes de borrar por cuota o de limpiar sesiones fallidas (segundos)
+JANITOR_MAX_BYTES = int(os.getenv("JANITOR_MAX_BYTES", str(20 * 1024 ** 3)))  # 20 GB
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "60"))
+JANITOR_ZIP_TTL = float(os.getenv("JANITOR_ZIP_TTL", str(24 * 3600)))
+JANITOR_DOWNLOADED_GRACE = float(os.getenv("JANITOR_DOWNLOADED_GRACE", "600"))
+JANITOR_MIN_AGE = float(os.getenv("JANITOR_MIN_AGE", "300"))
+
+# Almacén compartido de audio ya convertido
+AUDIO_STORE_DIR = Path(os.getenv("AUDIO_STORE_DIR", CACHE_DIR / "audio"))
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(5 * 1024 ** 3)))  # 5 GB
+# Edad a partir de la cual un .part del almacén es un resto de un worker caído
+AUDIO_STORE_PART_GRACE = float(os.getenv("AUDIO_STORE_PART_GRACE", "3600"))  # 1 hora
 
 # User-Agent moderno (Chrome en Windows)
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
@@ -45,9 +205,25 @@ YOUTUBE_STRATEGIES = [
     }
 ]
 
-def get_base_ydl_opts():
-    """Retorna opciones base de yt-dlp optimizadas para producción"""
-    opts = {
+# Estadísticas para ordenar las estrategias según su éxito reciente
+STRATEGY_STATS_WINDOW = float(os.getenv("STRATEGY_STATS_WINDOW", "1800"))  # 30 minutos
+STRATEGY_STATS_HALF_LIFE = float(os.getenv("STRATEGY_STATS_HALF_LIFE", "300"))  # 5 minutos
+
+# Ubicaciones donde se buscan las cookies (ya sea local o inyectado por Render secrets)
+# Render suele montar secrets en /etc/secrets/ o en la raíz si se configura así
+COOKIE_LOCATIONS = [
+    "cookies.txt",  # Local / Root
+    "/etc/secrets/cookies.txt",  # Render Secret File standard path
+    "backend/cookies.txt"
+]
+
+# Cada cuánto se comprueba si el archivo de cookies ha cambiado (segundos)
+COOKIE_CHECK_INTERVAL = float(os.getenv("COOKIE_CHECK_INTERVAL", "5"))
+
+
+def _build_base_ydl_opts():
+    """Opciones base de yt-dlp optimizadas para producción (sin cookies)"""
+    return {
         "quiet": True,
         "no_warnings": True,
         "user_agent": USER_AGENT,
@@ -67,30 +243,66 @@ def get_base_ydl_opts():
         "force_ipv4": False,
     }
 
-    # Verificar si existe archivo de cookies (ya sea local o inyectado por Render secrets)
-    # Render suele montar secrets en /etc/secrets/ o en la raíz si se configura así
-    cookie_locations = [
-        "cookies.txt",  # Local / Root
-        "/etc/secrets/cookies.txt",  # Render Secret File standard path
-        "backend/cookies.txt"
-    ]
-    
-    for cookie_path in cookie_locations:
-        if os.path.exists(cookie_path):
+
+class YdlOptionsManager:
+    """
+    Prepara las opciones base de yt-dlp una sola vez y las reutiliza.
+
+    Las cookies se copian a un único archivo temporal gestionado (yt-dlp las
+    reescribe al cerrar y el original puede ser de solo lectura). La copia
+    solo se rehace cuando cambia el mtime del archivo original, y como mucho
+    se comprueba cada COOKIE_CHECK_INTERVAL segundos; se escribe aparte y se
+    renombra encima, así que nunca se lee a medias. Las opciones se
+    entregan como un mapeo inmutable; los valores anidados (listas y
+    diccionarios, como postprocessors o http_headers) se copian en cada
+    entrega, así que modificarlos no altera las opciones de los demás.
+    """
+
+    def __init__(self, cookie_locations: list[str], check_interval: float = COOKIE_CHECK_INTERVAL):
+        self.cookie_locations = cookie_locations
+        self.check_interval = check_interval
+        self.refreshes = 0
+        # Cambia en cada refresco; permite descartar instancias creadas con opciones viejas
+        self.version = 0
+        self._lock = threading.Lock()
+        self._snapshot: Optional[MappingProxyType] = None
+        # Claves del snapshot con valores mutables, que se copian en cada get()
+        self._nested: Tuple[str, ...] = ()
+        self._source: Optional[Tuple[str, float]] = None
+        self._last_check = 0.0
+        self._cookie_copy: Optional[str] = None
+
+    def _find_cookies(self) -> Optional[Tuple[str, float]]:
+        for cookie_path in self.cookie_locations:
+            try:
+                return cookie_path, os.stat(cookie_path).st_mtime
+            except OSError:
+                continue
+        return None
+
+    def get(self) -> MappingProxyType:
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is None or now - self._last_check >= self.check_interval:
+                self._last_check = now
+                source = self._find_cookies()
+                if self._snapshot is None or source != self._source:
+                    self._refresh(source)
+            snapshot, nested = self._snapshot, self._nested
+        if not nested:
+            return snapshot
+        return MappingProxyType({**snapshot, **{key: copy.deepcopy(snapshot[key]) for key in nested}})
+
+    def _refresh(self, source: Optional[Tuple[str, float]]):
+        opts = _build_base_ydl_opts()
+
+        if source:
+            cookie_path = source[0]
             print(f"🍪 Cookies encontradas en: {cookie_path}")
             
-            # COPY LOGIC STARTS HERE
             try:
-                import shutil
-                import tempfile
-                
-                # Crear archivo temporal
-                temp_cookie = tempfile.NamedTemporaryFile(delete=False, suffix='.txt')
-                temp_cookie.close()
-                
-                shutil.copy2(cookie_path, temp_cookie.name)
-                print(f"🍪 Cookies copiadas a: {temp_cookie.name}")
-                opts["cookiefile"] = temp_cookie.name
+                opts["cookiefile"] = self._copy_cookies(cookie_path)
+                print(f"🍪 Cookies copiadas a: {opts['cookiefile']}")
                 
                 # CRITICAL CHANGE: Remove explicit User-Agent when using cookies
                 # to avoid mismatch with the browser session in the cookies
@@ -104,7 +316,56 @@ def get_base_ydl_opts():
             except Exception as e:
                 print(f"⚠️ Error preparing cookies: {e}")
                 opts["cookiefile"] = cookie_path
-                
-            break
-            
-    return opts
+
+            self.refreshes += 1
+
+        self._source = source
+        self._snapshot = MappingProxyType(opts)
+        self._nested = tuple(key for key, value in opts.items() if isinstance(value, (dict, list, set)))
+        self.version += 1
+
+    def _copy_cookies(self, cookie_path: str) -> str:
+        """Copia las cookies sobre el temporal gestionado (escribir y renombrar)"""
+        if self._cookie_copy is None:
+            fd, self._cookie_copy = tempfile.mkstemp(prefix='spotidl-cookies-', suffix='.txt')
+            os.close(fd)
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(self._cookie_copy), suffix='.part')
+        os.close(fd)
+        try:
+            shutil.copy2(cookie_path, partial)
+            os.replace(partial, self._cookie_copy)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        return self._cookie_copy
+
+    def cleanup(self):
+        """Elimina la copia temporal de las cookies (al apagar la aplicación)"""
+        with self._lock:
+            if self._cookie_copy is not None:
+                try:
+                    os.remove(self._cookie_copy)
+                except OSError:
+                    pass
+                self._cookie_copy = None
+            self._snapshot = None
+            self._source = None
+
+    def stats(self):
+        return {
+            "cookie_source": self._source[0] if self._source else None,
+            "cookie_refreshes": self.refreshes,
+            "options_version": self.version,
+        }
+
+
+ydl_options = YdlOptionsManager(COOKIE_LOCATIONS)
+atexit.register(ydl_options.cleanup)
+
+
+def get_base_ydl_opts():
+    """Retorna opciones base de yt-dlp (mapeo inmutable, preparado una sola vez)"""
+    return ydl_options.get()
@@ -3,7 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse
 from pathlib import Path
-from api.routes import router as api_router
+from api.routes import router as api_router, resume_sessions
+from services.ydl_pool import ydl_pool
+from services import downloader, async_downloader
+from utils.job_journal import job_journal
+from utils.job_scheduler import job_scheduler
+from utils.progress_manager import progress_manager
+from utils.disk_janitor import disk_janitor
+from config import ydl_options
 
 app = FastAPI(
     title="SpotiDownloader API",
@@ -23,6 +30,66 @@ app.add_middleware(
 # Registrar las rutas de la API bajo el prefijo /api
 app.include_router(api_router, prefix="/api")
 
+
+@app.on_event("startup")
+async def watch_remote_cancels():
+    # Las cancelaciones hechas desde otro worker también vacían las colas de este
+    progress_manager.add_cancel_handler(job_scheduler.cancel_session)
+
+
+@app.on_event("startup")
+async def resume_interrupted_sessions():
+    # Restaura el progreso y reanuda las sesiones que quedaron a medias
+    await resume_sessions()
+
+
+@app.on_event("startup")
+async def start_progress_eviction():
+    # Descarta periódicamente las sesiones terminadas que superan su TTL
+    progress_manager.start_eviction()
+
+
+@app.on_event("startup")
+async def start_disk_janitor():
+    # Limpieza periódica de downloads/ (después de reanudar, para no borrar sesiones a medias)
+    disk_janitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_disk_janitor():
+    await disk_janitor.stop()
+
+
+@app.on_event("shutdown")
+async def stop_progress_eviction():
+    await progress_manager.stop_eviction()
+
+
+@app.on_event("shutdown")
+def close_youtube_clients():
+    # Guarda cookies y cierra conexiones de las instancias YoutubeDL reutilizadas
+    ydl_pool.close_all()
+    ydl_options.cleanup()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    # Cierra las conexiones HTTP de la descarga por tubería (asíncrona y con hilos)
+    await async_downloader.close_client()
+    downloader.close_http_client()
+
+
+@app.on_event("shutdown")
+def close_progress_state():
+    # Publica el último progreso y libera los leases de las sesiones en curso
+    progress_manager.close()
+
+
+@app.on_event("shutdown")
+def close_job_journal():
+    # Vuelca al disco los cambios de progreso pendientes
+    job_journal.close()
+
 # Ruta del frontend compilado
 frontend_path = Path(__file__).resolve().parent.parent / "frontend" / "dist"
 
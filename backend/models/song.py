@@ -6,3 +6,6 @@ class Song(BaseModel):
     artist: str      # Ejemplo: "Ed Sheeran"
     query: str       # Ejemplo: "Shape of You - Ed Sheeran"
     youtube_url: str | None = None  # Se completará después
+    duration_ms: int | None = None  # Duración en Spotify, para elegir el resultado de YouTube
+    isrc: str | None = None         # Código ISRC de la grabación
+    album: str | None = None
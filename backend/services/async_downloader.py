@@ -0,0 +1,241 @@
+"""
+Motor de descarga asíncrono.
+
+yt-dlp solo se usa para resolver la URL del stream de audio (una llamada
+corta en un hilo). Los bytes se descargan con un cliente HTTP asíncrono que
+reutiliza conexiones, por rangos, y se envían directamente a la entrada de
+un proceso FFmpeg controlado con asyncio. Una descarga en curso no ocupa
+ningún hilo y la memoria usada por canción son unos pocos trozos por rango,
+así que un solo proceso puede mantener cientos de descargas simultáneas.
+
+Los remux (copia del stream) apenas usan CPU y solo los limita
+ASYNC_MAX_STREAMS. Las recodificaciones, como MP3, esperan además un hueco de
+un semáforo del tamaño de TRANSCODE_CONCURRENCY, el mismo límite que la etapa
+"transcode" del planificador, para no lanzar más codificadores que núcleos.
+"""
+import asyncio
+import os
+from collections import deque
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Optional
+
+import httpx
+
+from config import (
+    DEFAULT_OUTPUT_FORMAT,
+    ASYNC_MAX_STREAMS,
+    TRANSCODE_CONCURRENCY,
+    ASYNC_HTTP_MAX_CONNECTIONS,
+    DOWNLOAD_RANGE_SIZE,
+    DOWNLOAD_RANGE_CONCURRENCY,
+    DOWNLOAD_RANGE_BUFFER,
+)
+from services.downloader import (
+    get_ffmpeg_binary,
+    ffmpeg_input_args,
+    ffmpeg_output_args,
+    source_codec,
+    can_pipe,
+    FFMPEG_INPUT_PROTOCOLS,
+    RANGE_CHUNK_SIZE,
+)
+from utils.disk_metrics import disk_writes
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_streams: Optional[asyncio.Semaphore] = None
+_encoders: Optional[asyncio.Semaphore] = None
+
+
+def supports_stream(stream: dict) -> bool:
+    """Indica si el stream resuelto puede descargarse con este motor"""
+    return can_pipe(stream)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartido (pool de conexiones) del event loop actual"""
+    global _client, _client_loop, _streams, _encoders
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, pool=None),
+            limits=httpx.Limits(
+                max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS
+            ),
+            follow_redirects=True
+        )
+        _client_loop = loop
+        _streams = asyncio.Semaphore(ASYNC_MAX_STREAMS)
+        _encoders = asyncio.Semaphore(TRANSCODE_CONCURRENCY)
+    return _client
+
+
+async def close_client():
+    """Cierra el cliente HTTP compartido (al apagar la aplicación)"""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+async def _stream_range(
+    client: httpx.AsyncClient,
+    stream: dict,
+    start: int,
+    size: int,
+    chunks: asyncio.Queue
+):
+    """
+    Descarga un rango de bytes hacia `chunks`: primero el código de estado,
+    después los trozos y al final None (o la excepción si falla). Con la
+    cola llena deja de leer de la conexión hasta que le toca.
+    """
+    headers = {**(stream.get("http_headers") or {}), "Range": f"bytes={start}-{start + size - 1}"}
+    try:
+        async with client.stream("GET", stream["url"], headers=headers) as response:
+            if response.status_code != 416:
+                response.raise_for_status()
+            await chunks.put(response.status_code)
+            if response.status_code != 416:
+                async for chunk in response.aiter_bytes(RANGE_CHUNK_SIZE):
+                    await chunks.put(chunk)
+        await chunks.put(None)
+    except Exception as e:
+        await chunks.put(e)
+
+
+async def _iter_ranges(
+    client: httpx.AsyncClient,
+    stream: dict,
+    range_size: int,
+    concurrency: int,
+    buffer_size: int = DOWNLOAD_RANGE_BUFFER
+):
+    """
+    Descarga el stream por rangos; si no se conoce el tamaño, en una sola petición.
+
+    Se piden hasta `concurrency` rangos a la vez y se entregan en orden, así
+    que una conexión lenta solo retrasa su propio rango. El primer rango se
+    entrega trozo a trozo según llega; los siguientes guardan como mucho
+    `buffer_size` bytes cada uno mientras esperan su turno.
+    """
+    total = stream.get("filesize")
+
+    if not total:
+        async with client.stream("GET", stream["url"], headers=stream.get("http_headers") or {}) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        return
+
+    window = deque()
+    next_start = 0
+    # Trozos en cola por rango (el código de estado ocupa un hueco más)
+    slots = max(1, buffer_size // RANGE_CHUNK_SIZE) + 1
+
+    def fill():
+        nonlocal next_start
+        # Pasado el tamaño (quizá aproximado), se sondea un rango cada vez
+        while len(window) < concurrency and (next_start < total or not window):
+            chunks = asyncio.Queue(maxsize=slots)
+            task = asyncio.ensure_future(_stream_range(client, stream, next_start, range_size, chunks))
+            window.append((task, chunks))
+            next_start += range_size
+
+    try:
+        fill()
+        while window:
+            chunks = window[0][1]
+            status = received = 0
+            while (item := await chunks.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, int):
+                    status = item
+                    continue
+                received += len(item)
+                yield item
+            window.popleft()
+            # 200: el servidor ignoró el rango y envió el archivo completo
+            if status != 206 or received < range_size:
+                return
+            fill()
+    finally:
+        for task, _ in window:
+            task.cancel()
+
+
+async def stream_to_audio(
+    stream: dict,
+    target: Path,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    range_size: int = DOWNLOAD_RANGE_SIZE,
+    concurrency: int = DOWNLOAD_RANGE_CONCURRENCY
+) -> Path:
+    """
+    Descarga el stream resuelto y lo convierte sin archivo intermedio.
+
+    Los bytes se escriben en la entrada estándar de FFmpeg a medida que
+    llegan; drain() frena la descarga si FFmpeg va más lento, de modo que la
+    memoria no crece. Las listas HLS las abre FFmpeg directamente. Si el
+    stream ya está en el códec del formato pedido se remuxa sin recodificar.
+    La salida se escribe como .part y se renombra al terminar.
+
+    Args:
+        stream: Resultado de downloader.resolve_audio_stream
+        target: Ruta final del archivo
+        output_format: Clave de OUTPUT_FORMATS
+        on_progress: Llamada con (bytes descargados, total o None)
+    """
+    client = get_client()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(target.name + ".part")
+    feed = stream.get("protocol") not in FFMPEG_INPUT_PROTOCOLS
+    output_args = ffmpeg_output_args(output_format, source_codec(stream.get("acodec") or stream.get("ext")))
+    # Un remux no ocupa núcleo: solo las recodificaciones esperan un hueco
+    encoder_slot = nullcontext() if "copy" in output_args else _encoders
+
+    async with _streams, encoder_slot:
+        process = await asyncio.create_subprocess_exec(
+            get_ffmpeg_binary(), "-y", "-nostdin", "-loglevel", "error",
+            *ffmpeg_input_args(stream),
+            *output_args,
+            str(partial),
+            stdin=asyncio.subprocess.PIPE if feed else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_task = asyncio.create_task(process.stderr.read())
+
+        try:
+            if feed:
+                downloaded = 0
+                async for chunk in _iter_ranges(client, stream, range_size, concurrency):
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+                    downloaded += len(chunk)
+                    if on_progress:
+                        on_progress(downloaded, stream.get("filesize"))
+
+                process.stdin.close()
+            returncode = await process.wait()
+            stderr = (await stderr_task).decode(errors="replace").strip()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            stderr_task.cancel()
+            partial.unlink(missing_ok=True)
+            raise
+
+    if returncode != 0:
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f"FFmpeg falló al convertir a {output_format}: {stderr}")
+
+    os.replace(partial, target)
+    disk_writes.record("pipe", target.stat().st_size)
+    return target
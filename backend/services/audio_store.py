@@ -0,0 +1,304 @@
+"""
+Almacén de audio convertido direccionado por contenido.
+
+Cada archivo se identifica por (ID de YouTube, códec, bitrate), así que la
+misma canción pedida por distintas sesiones se descarga y convierte una sola
+vez. Las sesiones reciben un hardlink del archivo almacenado (o una copia si
+el sistema de archivos no lo permite). El tamaño total se limita expulsando
+los archivos usados hace más tiempo.
+
+Un archivo no se expulsa mientras se está enlazando en una sesión (está
+fijado) ni mientras alguna sesión conserva su hardlink: borrarlo del almacén
+no liberaría espacio. Se expulsa cuando el conserje borra esas sesiones.
+
+Varios workers comparten el directorio: un archivo que no está en el índice
+de este proceso se busca en disco y se adopta, así que lo publicado por otro
+worker también se reutiliza. Las operaciones de disco se hacen en un hilo.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import AUDIO_STORE_DIR, AUDIO_STORE_MAX_BYTES, AUDIO_STORE_PART_GRACE
+from utils.job_scheduler import JobCancelled
+
+
+class AudioStore:
+    """Almacén LRU de archivos de audio con publicación atómica y descargas compartidas"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = AUDIO_STORE_MAX_BYTES,
+        part_grace: float = AUDIO_STORE_PART_GRACE
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.part_grace = part_grace
+        self.hits = 0
+        self.misses = 0
+        self.adopted = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.reclaimed_bytes = 0
+        self._lock = threading.Lock()
+        # ruta -> tamaño, ordenado del menos al más recientemente usado
+        self._index: Optional["OrderedDict[Path, int]"] = None
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Producciones terminadas; detecta las que acaban durante un lookup
+        self._produced = 0
+        # Archivos que se están enlazando en una sesión (ruta -> enlaces en curso)
+        self._pins: Dict[Path, int] = {}
+
+    def _load_index(self):
+        """
+        Recorre el almacén una sola vez; el mtime hace de fecha de último uso.
+
+        Los .part recientes pueden ser de otro worker que aún está escribiendo;
+        solo se borran los que superan part_grace.
+        """
+        if self._index is not None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        stale_before = time.time() - self.part_grace
+        for path in self.root.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.endswith(".part"):
+                if stat.st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        self._index = OrderedDict((path, size) for _, path, size in files)
+        self._total_bytes = sum(self._index.values())
+
+    def key(self, video_id: str, codec: str, bitrate: str) -> str:
+        return hashlib.sha256(f"{video_id}:{codec}:{bitrate}".encode()).hexdigest()
+
+    def path_for(self, video_id: str, codec: str, bitrate: str) -> Path:
+        """Ruta final del archivo dentro del almacén"""
+        digest = self.key(video_id, codec, bitrate)
+        return self.root / digest[:2] / f"{digest}.{codec}"
+
+    def lookup(self, video_id: str, codec: str, bitrate: str, pin: bool = False) -> Optional[Path]:
+        """
+        Devuelve el archivo almacenado, marcándolo como recién usado. Con
+        pin=True no se expulsa hasta llamar a unpin().
+
+        Un archivo que no está en el índice pero sí en disco (lo publicó otro
+        worker) se adopta. Hace E/S de disco: desde el event loop, llamarlo
+        en un hilo.
+        """
+        path = self.path_for(video_id, codec, bitrate)
+        with self._lock:
+            self._load_index()
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                if path in self._index:
+                    self._total_bytes -= self._index.pop(path)
+                return None
+            if path in self._index:
+                self._index.move_to_end(path)
+            else:
+                self._index[path] = size
+                self._total_bytes += size
+                self.adopted += 1
+            if pin:
+                self._pins[path] = self._pins.get(path, 0) + 1
+            self._evict()
+        os.utime(path)
+        return path
+
+    def publish(self, path: Path, pin: bool = False):
+        """
+        Registra un archivo ya escrito en su ruta final del almacén (fijado
+        con pin=True, como en lookup).
+
+        El archivo debe haberse escrito en un temporal y renombrado a path
+        (como hace transcode_audio), de modo que nunca se ve a medias. Hace E/S
+        de disco, como lookup.
+        """
+        size = path.stat().st_size
+        with self._lock:
+            self._load_index()
+            if pin:
+                self._pins[path] = self._pins.get(path, 0) + 1
+            self._total_bytes -= self._index.pop(path, 0)
+            self._index[path] = size
+            self._total_bytes += size
+            self._evict()
+
+    def unpin(self, path: Path):
+        """Libera un archivo fijado con lookup(pin=True); puede expulsarse ya"""
+        with self._lock:
+            remaining = self._pins.get(path, 0) - 1
+            if remaining > 0:
+                self._pins[path] = remaining
+            else:
+                self._pins.pop(path, None)
+            self._evict()
+
+    def _evict(self):
+        """Expulsa lo menos usado hasta la cuota; llamar con el lock tomado"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        # El último es el recién publicado: nunca se expulsa
+        for path, size in list(self._index.items())[:-1]:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path in self._pins:
+                continue
+            try:
+                links = path.stat().st_nlink
+            except FileNotFoundError:
+                links = 1
+            if links > 1:
+                # Una sesión tiene su hardlink: borrarlo no libera nada
+                continue
+            path.unlink(missing_ok=True)
+            del self._index[path]
+            self._total_bytes -= size
+            self.reclaimed_bytes += size
+            self.evictions += 1
+
+    def link_into(self, stored: Path, target: Path):
+        """Coloca el archivo almacenado en el directorio de la sesión"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + ".part")
+        partial.unlink(missing_ok=True)
+        try:
+            os.link(stored, partial)
+        except OSError:
+            # Otro sistema de archivos o sin soporte de hardlinks
+            shutil.copyfile(stored, partial)
+        os.replace(partial, target)
+
+    def _link_pinned(self, stored: Path, target: Path):
+        try:
+            self.link_into(stored, target)
+        finally:
+            self.unpin(stored)
+
+    async def link_or_produce(
+        self,
+        video_id: str,
+        codec: str,
+        bitrate: str,
+        produce: Callable[[Path], Awaitable[Any]],
+        target: Path
+    ) -> Path:
+        """
+        Coloca el archivo del almacén en target, generándolo si no existe.
+
+        El archivo queda fijado desde que se encuentra (o se publica) hasta
+        que está enlazado, así que una expulsión no puede borrarlo entre
+        medias.
+
+        Args:
+            produce: Corrutina que escribe el audio en la ruta recibida
+            target: Ruta del archivo en el directorio de la sesión
+        """
+        stored = await self._get_or_produce_pinned(video_id, codec, bitrate, produce)
+        await asyncio.to_thread(self._link_pinned, stored, target)
+        return target
+
+    async def _get_or_produce_pinned(
+        self,
+        video_id: str,
+        codec: str,
+        bitrate: str,
+        produce: Callable[[Path], Awaitable[Any]]
+    ) -> Path:
+        """
+        Devuelve el archivo del almacén fijado (ver unpin), generándolo si no
+        existe.
+
+        Si otra sesión ya está generando el mismo archivo, se espera a que
+        termine en lugar de descargarlo de nuevo.
+        """
+        waited = False
+        key = self.key(video_id, codec, bitrate)
+        while True:
+            produced = self._produced
+            stored = await asyncio.to_thread(self.lookup, video_id, codec, bitrate, True)
+            if stored:
+                if not waited:
+                    self.hits += 1
+                return stored
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                if produced != self._produced:
+                    # Una producción terminó mientras se buscaba: puede ser esta
+                    continue
+                break
+
+            self.coalesced += 1
+            waited = True
+            try:
+                # Se fija en la siguiente vuelta; si ya se expulsó, se genera otra vez
+                await asyncio.shield(pending)
+            except JobCancelled:
+                # La sesión que lo estaba generando se canceló: reintentar
+                continue
+            except asyncio.CancelledError:
+                if pending.cancelled():
+                    continue
+                raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            path = self.path_for(video_id, codec, bitrate)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            await produce(path)
+            await asyncio.to_thread(self.publish, path, True)
+            future.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evitar el aviso de "exception never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+            self._produced += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load_index()
+            files = len(self._index)
+            total = self._total_bytes
+        return {
+            "files": files,
+            "total_bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "adopted": self.adopted,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "pinned": len(self._pins),
+            "inflight": len(self._inflight),
+        }
+
+
+# Global audio store instance
+audio_store = AudioStore(AUDIO_STORE_DIR)
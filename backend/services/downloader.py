@@ -1,16 +1,34 @@
-from yt_dlp import YoutubeDL
 from pathlib import Path
 import os
+import queue
 import re
+import subprocess
+import threading
 import traceback
-from typing import Optional, Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Iterator
+
+import httpx
 
 # Import FFmpeg setup utility
 from utils.ffmpeg_setup import get_ffmpeg_path
 
 # Import configuration and retry handler
-from config import get_base_ydl_opts, YOUTUBE_STRATEGIES
+from config import (
+    get_base_ydl_opts,
+    YOUTUBE_STRATEGIES,
+    MP3_BITRATE,
+    OUTPUT_FORMATS,
+    DOWNLOAD_RANGE_SIZE,
+    DOWNLOAD_RANGE_CONCURRENCY,
+    DOWNLOAD_RANGE_BUFFER,
+    DOWNLOAD_CONCURRENCY,
+)
 from utils.retry_handler import RetryHandler
+from utils.job_scheduler import RetryLater, JobCancelled
+from utils.disk_metrics import disk_writes
+from services.ydl_pool import ydl_pool
 
 # Get FFmpeg path from local installation
 FFMPEG_LOCATION = get_ffmpeg_path()
@@ -18,6 +36,20 @@ FFMPEG_LOCATION = get_ffmpeg_path()
 # Global dictionary for download progress tracking
 DOWNLOAD_PROGRESS = {}
 
+# Protocols whose bytes can be fetched with plain (ranged) HTTP requests
+HTTP_PROTOCOLS = {"http", "https"}
+# Protocols FFmpeg can read by itself straight from the stream URL
+FFMPEG_INPUT_PROTOCOLS = {"m3u8", "m3u8_native"}
+# Size of the pieces a ranged response is read in
+RANGE_CHUNK_SIZE = 64 * 1024
+# Range fetches of every threaded pipe transfer share one pool (and as many
+# HTTP connections): each of the DOWNLOAD_CONCURRENCY songs gets its ranges
+RANGE_WORKERS = DOWNLOAD_CONCURRENCY * DOWNLOAD_RANGE_CONCURRENCY
+
+_http_client: Optional[httpx.Client] = None
+_range_pool: Optional[ThreadPoolExecutor] = None
+_http_client_lock = threading.Lock()
+
 
 def sanitize_filename(name: str) -> str:
     """Remove invalid characters from filename."""
@@ -26,6 +58,43 @@ def sanitize_filename(name: str) -> str:
     return name
 
 
+def _build_download_opts(strategy: dict, extract_audio: bool, output_format: str = "mp3") -> dict:
+    """
+    Build the yt-dlp options shared by every download with a strategy.
+    
+    Per-song settings (output template, progress hooks) are applied by the
+    YoutubeDL pool on each checkout. output_format picks the source stream:
+    for remuxable formats the stream already in the target codec is preferred.
+    """
+    # Get base options and merge with download-specific options
+    base_opts = get_base_ydl_opts()
+    
+    ydl_opts = {
+        **base_opts,
+        "format": OUTPUT_FORMATS[output_format]["ydl_format"],
+        "noplaylist": True,
+        "extractor_args": {
+            "youtube": strategy
+        },
+        # Chunked HTTP requests and parallel fragments (DASH/HLS) to work
+        # around per-connection throttling
+        "http_chunk_size": DOWNLOAD_RANGE_SIZE,
+        "concurrent_fragment_downloads": DOWNLOAD_RANGE_CONCURRENCY,
+    }
+
+    if extract_audio:
+        ydl_opts["postprocessors"] = [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",
+            "preferredquality": MP3_BITRATE,
+        }]
+
+    if FFMPEG_LOCATION:
+        ydl_opts["ffmpeg_location"] = FFMPEG_LOCATION
+
+    return ydl_opts
+
+
 def _download_with_strategy(
     youtube_url: str,
     output_dir: Path,
@@ -34,8 +103,10 @@ def _download_with_strategy(
     artist: str = None,
     filename: str = None,
     progress_callback: Optional[Callable] = None,
-    song_id: Optional[str] = None
-):
+    song_id: Optional[str] = None,
+    extract_audio: bool = True,
+    output_format: str = "mp3"
+) -> Path:
     """
     Download a song from YouTube using a specific strategy.
     
@@ -48,6 +119,12 @@ def _download_with_strategy(
         filename: Custom filename (optional)
         progress_callback: Callback function for progress updates
         song_id: Unique identifier for tracking progress
+        extract_audio: Convert to MP3 with FFmpeg after downloading. When False
+            the original audio stream is kept so it can be transcoded separately.
+        output_format: Final format the source stream is selected for
+    
+    Returns:
+        Path of the downloaded (or converted) file
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -93,28 +170,6 @@ def _download_with_strategy(
                     'message': 'Convirtiendo a MP3...'
                 })
 
-    # Get base options and merge with download-specific options
-    base_opts = get_base_ydl_opts()
-    
-    ydl_opts = {
-        **base_opts,
-        "format": "bestaudio/best",
-        "outtmpl": outtmpl,
-        "noplaylist": True,
-        "progress_hooks": [progress_hook] if progress_callback else [],
-        "extractor_args": {
-            "youtube": strategy
-        },
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-            "preferredquality": "192",
-        }],
-    }
-
-    if FFMPEG_LOCATION:
-        ydl_opts["ffmpeg_location"] = FFMPEG_LOCATION
-
     # Notify start
     if progress_callback and song_id:
         progress_callback({
@@ -124,8 +179,17 @@ def _download_with_strategy(
             'message': f'Iniciando descarga de {title or "canción"}...'
         })
 
-    with YoutubeDL(ydl_opts) as ydl:
-        ydl.download([youtube_url])
+    # Reuse this thread's YoutubeDL for the strategy (warm extractors and connections)
+    with ydl_pool.checkout(
+        "download_mp3" if extract_audio else f"download:{output_format}",
+        strategy,
+        lambda: _build_download_opts(strategy, extract_audio, output_format),
+        outtmpl=outtmpl,
+        progress_hooks=[progress_hook] if progress_callback else []
+    ) as ydl:
+        info = ydl.extract_info(youtube_url, download=True)
+        requested = info.get("requested_downloads") or [{}]
+        file_path = Path(requested[0].get("filepath") or ydl.prepare_filename(info))
 
     # Notify completion
     if progress_callback and song_id:
@@ -136,6 +200,8 @@ def _download_with_strategy(
             'message': 'Descarga completada!'
         })
 
+    return file_path
+
 
 def download_songs(
     youtube_url: str, 
@@ -145,7 +211,7 @@ def download_songs(
     filename: str = None,
     progress_callback: Optional[Callable] = None,
     song_id: Optional[str] = None
-):
+) -> Path:
     """
     Download a song from YouTube with automatic retry using multiple strategies.
     
@@ -157,21 +223,487 @@ def download_songs(
         filename: Custom filename (optional)
         progress_callback: Callback function for progress updates
         song_id: Unique identifier for tracking progress
+    
+    Returns:
+        Path of the converted MP3 file
+    """
+    return _download_with_retry(
+        youtube_url,
+        output_dir=output_dir,
+        title=title,
+        artist=artist,
+        filename=filename,
+        progress_callback=progress_callback,
+        song_id=song_id,
+        extract_audio=True
+    )
+
+
+def fetch_audio(
+    youtube_url: str,
+    output_dir: Path,
+    title: str = None,
+    artist: str = None,
+    filename: str = None,
+    progress_callback: Optional[Callable] = None,
+    song_id: Optional[str] = None,
+    defer_retries: bool = False,
+    output_format: str = "mp3"
+) -> Path:
+    """
+    Download the best audio stream of a video without converting it.
+    
+    This is the network-bound half of download_songs; the CPU-bound
+    encode (or remux) is done afterwards by transcode_audio so both can run
+    in separately sized worker pools.
+    
+    Args:
+        defer_retries: Raise RetryLater between strategies instead of
+            sleeping (only when run through the job scheduler)
+        output_format: Key of OUTPUT_FORMATS the audio will be converted to
+    
+    Returns:
+        Path of the downloaded source audio file
+    """
+    return _download_with_retry(
+        youtube_url,
+        output_dir=output_dir,
+        title=title,
+        artist=artist,
+        filename=filename,
+        progress_callback=progress_callback,
+        song_id=song_id,
+        extract_audio=False,
+        defer_retries=defer_retries,
+        output_format=output_format
+    )
+
+
+def source_codec(hint: Optional[str]) -> Optional[str]:
+    """
+    Normalize a yt-dlp acodec ("mp4a.40.2", "opus") or a file extension
+    ("m4a", "webm") to the codec names used by OUTPUT_FORMATS.
+    """
+    hint = (hint or "").lower().lstrip(".")
+    if hint.startswith("mp4a") or hint in ("aac", "m4a", "mp4"):
+        return "aac"
+    if hint in ("opus", "webm"):
+        return "opus"
+    return hint or None
+
+
+def ffmpeg_output_args(output_format: str, codec: Optional[str]) -> list:
+    """
+    FFmpeg output options for a format: stream copy when the source is
+    already in the format's codec, otherwise a re-encode.
+    """
+    fmt = OUTPUT_FORMATS[output_format]
+    if fmt["copy_codec"] and fmt["copy_codec"] == codec:
+        codec_args = ["-codec:a", "copy"]
+    else:
+        codec_args = fmt["encoder"]
+    return ["-vn", *codec_args, "-f", fmt["muxer"]]
+
+
+def transcode_audio(source: Path, target: Path, output_format: str = "mp3") -> Path:
+    """
+    Convert an audio file to the requested output format with FFmpeg.
+    
+    Remuxable formats (m4a, opus) only rewrap the stream when the source is
+    already in that codec, which skips decoding entirely. The output is
+    written next to the target and renamed once complete, so a partial file
+    never appears as finished. The source file is removed on success.
+    
+    Args:
+        source: Downloaded audio file (webm, m4a, ...)
+        target: Destination path
+        output_format: Key of OUTPUT_FORMATS
+    
+    Returns:
+        Path of the converted file
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(target.name + ".part")
+
+    def run(output_args: list) -> subprocess.CompletedProcess:
+        cmd = [
+            get_ffmpeg_binary(), "-y", "-nostdin", "-loglevel", "error",
+            "-i", str(source), *output_args, str(partial)
+        ]
+        return subprocess.run(cmd, capture_output=True, text=True)
+
+    output_args = ffmpeg_output_args(output_format, source_codec(source.suffix))
+    result = run(output_args)
+    if result.returncode != 0 and "copy" in output_args:
+        # The extension only hints the codec (e.g. Vorbis inside webm)
+        result = run(ffmpeg_output_args(output_format, None))
+
+    if result.returncode != 0:
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f"FFmpeg falló al convertir a {output_format}: {result.stderr.strip()}")
+
+    os.replace(partial, target)
+    disk_writes.record("file", target.stat().st_size, source.stat().st_size)
+    source.unlink(missing_ok=True)
+    return target
+
+
+def get_ffmpeg_binary() -> str:
+    """Return the FFmpeg executable, preferring the project-local install."""
+    if FFMPEG_LOCATION:
+        name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+        return os.path.join(FFMPEG_LOCATION, name)
+    return "ffmpeg"
+
+
+def _resolve_with_strategy(
+    youtube_url: str,
+    strategy: dict,
+    output_format: str = "mp3",
+    **kwargs
+) -> dict:
     """
-    retry_handler = RetryHandler(max_retries=len(YOUTUBE_STRATEGIES))
+    Resolve the direct URL of the best audio stream without downloading it.
+    
+    Returns:
+        Dict with the stream url, the HTTP headers yt-dlp would send,
+        the (approximate) size, container extension, audio codec and protocol
+    """
+    with ydl_pool.checkout(
+        f"resolve:{output_format}",
+        strategy,
+        lambda: _build_download_opts(strategy, False, output_format)
+    ) as ydl:
+        info = ydl.extract_info(youtube_url, download=False)
+
+    return {
+        "id": info.get("id"),
+        "url": info["url"],
+        "http_headers": dict(info.get("http_headers") or {}),
+        "filesize": info.get("filesize") or info.get("filesize_approx"),
+        "ext": info.get("ext"),
+        "acodec": info.get("acodec"),
+        "protocol": info.get("protocol"),
+    }
+
+
+def resolve_audio_stream(
+    youtube_url: str,
+    title: str = None,
+    defer_retries: bool = False,
+    output_format: str = "mp3"
+) -> dict:
+    """
+    Resolve the best audio stream URL, retrying with multiple strategies.
+    
+    This is the only yt-dlp call of the pipe transcode modes; the audio bytes
+    are then fetched by pipe_transcode or services.async_downloader.
+    """
+    return _download_with_retry(
+        youtube_url,
+        title=title,
+        defer_retries=defer_retries,
+        attempt=_resolve_with_strategy,
+        output_format=output_format
+    )
+
+
+def can_pipe(stream: dict) -> bool:
+    """Whether a resolved stream can be transcoded without an intermediate file."""
+    protocol = stream.get("protocol") or "https"
+    return protocol in HTTP_PROTOCOLS or protocol in FFMPEG_INPUT_PROTOCOLS
+
+
+def ffmpeg_input_args(stream: dict) -> list:
+    """
+    FFmpeg input options for a resolved stream.
+    
+    HLS playlists are opened by FFmpeg itself (with yt-dlp's headers); every
+    other stream is fed through stdin.
+    """
+    if stream.get("protocol") in FFMPEG_INPUT_PROTOCOLS:
+        headers = "".join(f"{k}: {v}\r\n" for k, v in (stream.get("http_headers") or {}).items())
+        return ["-headers", headers, "-i", stream["url"]] if headers else ["-i", stream["url"]]
+    return ["-i", "pipe:0"]
+
+
+def _get_http_client() -> httpx.Client:
+    """Shared pooled HTTP client for the threaded pipe transcoder."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(30.0, pool=None),
+                limits=httpx.Limits(max_connections=RANGE_WORKERS, max_keepalive_connections=RANGE_WORKERS),
+                follow_redirects=True
+            )
+        return _http_client
+
+
+def _get_range_pool() -> ThreadPoolExecutor:
+    """Shared thread pool that fetches the ranges of every piped transfer."""
+    global _range_pool
+    with _http_client_lock:
+        if _range_pool is None:
+            _range_pool = ThreadPoolExecutor(max_workers=RANGE_WORKERS, thread_name_prefix="range")
+        return _range_pool
+
+
+def _put(chunks: queue.Queue, item, cancelled: threading.Event) -> bool:
+    """Block until the reader takes more; False once the transfer was abandoned."""
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stream_range(
+    client: httpx.Client,
+    stream: dict,
+    start: int,
+    size: int,
+    chunks: queue.Queue,
+    cancelled: threading.Event
+):
+    """
+    Fetch one byte range into `chunks`: the status code, then the body in
+    pieces, then None (or the exception on failure). While the queue is full
+    the connection is not read, so a range waiting for its turn holds at most
+    the queue's worth of bytes.
+    """
+    headers = {**(stream.get("http_headers") or {}), "Range": f"bytes={start}-{start + size - 1}"}
+    try:
+        with client.stream("GET", stream["url"], headers=headers) as response:
+            if response.status_code != 416:
+                response.raise_for_status()
+            if not _put(chunks, response.status_code, cancelled):
+                return
+            if response.status_code != 416:
+                for chunk in response.iter_bytes(RANGE_CHUNK_SIZE):
+                    if not _put(chunks, chunk, cancelled):
+                        return
+        _put(chunks, None, cancelled)
+    except Exception as e:
+        _put(chunks, e, cancelled)
+
+
+def iter_stream_ranges(
+    client: httpx.Client,
+    stream: dict,
+    range_size: int = DOWNLOAD_RANGE_SIZE,
+    concurrency: int = DOWNLOAD_RANGE_CONCURRENCY,
+    buffer_size: int = DOWNLOAD_RANGE_BUFFER
+) -> Iterator[bytes]:
+    """
+    Fetch a resolved stream in ranged requests (a single request when the
+    size is unknown).
+    
+    Up to `concurrency` ranges are fetched at once on the shared range pool
+    and yielded in order, so a throttled connection only slows down its own
+    range. The current range is yielded piece by piece as it arrives; the
+    ones ahead of it buffer at most `buffer_size` bytes each.
+    """
+    total = stream.get("filesize")
+
+    if not total:
+        with client.stream("GET", stream["url"], headers=stream.get("http_headers") or {}) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes()
+        return
+
+    pool = _get_range_pool()
+    cancelled = threading.Event()
+    window = deque()
+    next_start = 0
+    # Pieces queued per range (plus one slot for the status code)
+    slots = max(1, buffer_size // RANGE_CHUNK_SIZE) + 1
+
+    def fill():
+        nonlocal next_start
+        # Past the (possibly approximate) size, probe one range at a time
+        while len(window) < concurrency and (next_start < total or not window):
+            chunks = queue.Queue(maxsize=slots)
+            future = pool.submit(_stream_range, client, stream, next_start, range_size, chunks, cancelled)
+            window.append((future, chunks))
+            next_start += range_size
+
+    try:
+        fill()
+        while window:
+            chunks = window[0][1]
+            status = received = 0
+            while (item := chunks.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, int):
+                    status = item
+                    continue
+                received += len(item)
+                yield item
+            window.popleft()
+            # 200: the server ignored the range and sent the whole file
+            if status != 206 or received < range_size:
+                return
+            fill()
+    finally:
+        # Queued ranges never start; running ones stop at their next piece
+        cancelled.set()
+        for future, _ in window:
+            future.cancel()
+
+
+def pipe_transcode(
+    stream: dict,
+    target: Path,
+    output_format: str = "mp3",
+    range_size: int = DOWNLOAD_RANGE_SIZE,
+    concurrency: int = DOWNLOAD_RANGE_CONCURRENCY,
+    on_progress: Optional[Callable[[int, Optional[int]], None]] = None
+) -> Path:
+    """
+    Download a resolved stream straight into FFmpeg and write only the result.
+    
+    Blocking counterpart of async_downloader.stream_to_audio for the
+    threaded engine: the source audio never touches the disk, so each song
+    costs a single write of the converted file instead of writing the
+    source, reading it back and writing the output. The calling thread is
+    mostly waiting on the network, so it belongs to the "download" stage.
+    
+    Args:
+        stream: Result of resolve_audio_stream
+        target: Destination path
+        output_format: Key of OUTPUT_FORMATS
+        on_progress: Called with (downloaded bytes, total or None)
+    
+    Returns:
+        Path of the converted file
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(target.name + ".part")
+    feed = stream.get("protocol") not in FFMPEG_INPUT_PROTOCOLS
+
+    cmd = [
+        get_ffmpeg_binary(), "-y", "-nostdin", "-loglevel", "error",
+        *ffmpeg_input_args(stream),
+        *ffmpeg_output_args(output_format, source_codec(stream.get("acodec") or stream.get("ext"))),
+        str(partial)
+    ]
+
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    # Drain stderr while feeding stdin: if FFmpeg filled the pipe buffer with
+    # warnings it would stop reading its input and both sides would block
+    stderr_chunks = []
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_chunks.extend(iter(lambda: process.stderr.read(4096), b"")),
+        name="ffmpeg-stderr",
+        daemon=True
+    )
+    stderr_reader.start()
+    try:
+        if feed:
+            try:
+                downloaded = 0
+                for chunk in iter_stream_ranges(_get_http_client(), stream, range_size, concurrency):
+                    process.stdin.write(chunk)
+                    downloaded += len(chunk)
+                    if on_progress:
+                        on_progress(downloaded, stream.get("filesize"))
+            except BrokenPipeError:
+                # FFmpeg exited early; its error is reported below
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        returncode = process.wait()
+        stderr_reader.join()
+        stderr = b"".join(stderr_chunks).decode(errors="replace").strip()
+    except BaseException:
+        process.kill()
+        process.wait()
+        stderr_reader.join(timeout=5)
+        partial.unlink(missing_ok=True)
+        raise
+
+    if returncode != 0:
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f"FFmpeg falló al convertir a {output_format}: {stderr}")
+
+    os.replace(partial, target)
+    disk_writes.record("pipe", target.stat().st_size)
+    return target
+
+
+def close_http_client():
+    """Close the shared HTTP client and range pool of the threaded pipe transcoder."""
+    global _http_client, _range_pool
+    with _http_client_lock:
+        if _range_pool is not None:
+            _range_pool.shutdown(wait=False, cancel_futures=True)
+            _range_pool = None
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+def _download_with_retry(
+    youtube_url: str,
+    title: str = None,
+    progress_callback: Optional[Callable] = None,
+    song_id: Optional[str] = None,
+    defer_retries: bool = False,
+    strategies: Optional[list] = None,
+    attempt: Callable = _download_with_strategy,
+    **kwargs
+) -> Path:
+    """
+    Run a per-strategy attempt (by default _download_with_strategy) through
+    the RetryHandler with user-friendly errors.
+    
+    With defer_retries the pause between strategies is not slept here: a
+    RetryLater is raised so the job scheduler resumes the remaining
+    strategies later, through this same wrapper.
+    """
+    retry_handler = RetryHandler(max_retries=len(YOUTUBE_STRATEGIES), defer_retries=defer_retries)
     
     try:
         return retry_handler.execute_with_retry(
-            _download_with_strategy,
+            attempt,
+            youtube_url,
+            strategies=strategies,
+            title=title,
+            progress_callback=progress_callback,
+            song_id=song_id,
+            **kwargs
+        )
+        
+    except RetryLater as e:
+        raise RetryLater(
+            e.delay,
+            _download_with_retry,
             youtube_url,
-            output_dir=output_dir,
             title=title,
-            artist=artist,
-            filename=filename,
             progress_callback=progress_callback,
-            song_id=song_id
+            song_id=song_id,
+            defer_retries=True,
+            strategies=e.kwargs["strategies"],
+            attempt=attempt,
+            **kwargs
         )
         
+    except JobCancelled:
+        # Raised by the progress hook once the session is cancelled
+        raise
+        
     except Exception as e:
         error_msg = str(e)
         
@@ -206,4 +738,3 @@ def download_songs(
                 })
             
             raise
-
@@ -0,0 +1,183 @@
+"""
+Puntuación de resultados de búsqueda de YouTube frente a una canción de Spotify.
+
+Cada resultado se puntúa con tres señales:
+
+- Duración: Spotify da la duración exacta de la pista; una diferencia de
+  pocos segundos es la señal más fiable de que es la misma grabación, y una
+  diferencia grande delata versiones en directo, extendidas o vídeos con
+  intro.
+- Similitud de tokens: parecido entre el título esperado ("título artista")
+  y el del resultado (título + canal) como conjuntos de palabras
+  normalizadas, sin importar el orden.
+- Canal: los canales "Artista - Topic" (pistas oficiales subidas por la
+  discográfica) y VEVO, o un canal con el nombre del artista.
+
+Además se penalizan versiones (live, cover, remix...) que no aparecen en el
+título original y las palabras del título que faltan en el del resultado:
+otra canción del mismo artista con la misma duración no debe pasar por la
+buena. Los resultados se recorren en el orden de YouTube y se para en el
+primero que es claramente correcto.
+"""
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from services.search_cache import normalize_query
+
+# Palabras que indican otra versión de la canción (salvo que estén en el título original)
+VERSION_WORDS = {
+    "live", "directo", "vivo", "cover", "remix", "karaoke", "instrumental",
+    "acoustic", "acustico", "nightcore", "slowed", "sped", "reverb", "8d",
+    "reaction", "tutorial", "lesson", "mashup", "edit", "extended",
+}
+# Palabras que indican el audio de la pista
+AUDIO_WORDS = {"audio", "lyrics", "lyric", "letra", "official", "oficial"}
+# Palabras de relleno que no cuentan para la similitud
+FILLER_WORDS = AUDIO_WORDS | {
+    "video", "music", "musica", "feat", "ft", "hd", "hq", "4k", "visualizer", "topic", "vevo", "the",
+    "remastered", "remaster",
+}
+
+# Duración: diferencia (segundos) que se considera idéntica y a partir de la que puntúa 0
+DURATION_EXACT = 2
+DURATION_TOLERANCE = 15
+# Un resultado con al menos esta puntuación y esta fracción de las palabras
+# del título se acepta sin mirar los demás
+CONFIDENT_SCORE = 0.85
+CONFIDENT_TITLE_COVERAGE = 0.8
+# Resta máxima cuando no aparece ninguna palabra del título
+MISSING_TITLE_PENALTY = 0.4
+
+_TOPIC_SUFFIX = re.compile(r"\s+-\s+topic$", re.IGNORECASE)
+
+
+def tokens(text: str) -> set[str]:
+    """Palabras normalizadas (sin acentos ni signos) de un texto"""
+    return set(normalize_query(text).split())
+
+
+def token_set_similarity(expected: set[str], candidate: set[str]) -> float:
+    """
+    Parecido entre dos conjuntos de palabras (0-1).
+
+    Pesa sobre todo cuántas palabras esperadas aparecen en el resultado; las
+    palabras de más en el resultado restan un poco (títulos con otra canción).
+    """
+    expected = expected - FILLER_WORDS or expected
+    candidate = candidate - FILLER_WORDS or candidate
+    if not expected or not candidate:
+        return 0.0
+    common = len(expected & candidate)
+    return 0.8 * common / len(expected) + 0.2 * common / len(candidate)
+
+
+def duration_score(expected_seconds: Optional[float], candidate_seconds: Optional[float]) -> Optional[float]:
+    """1 si la duración coincide, 0 a partir de DURATION_TOLERANCE; None si falta alguna"""
+    if not expected_seconds or not candidate_seconds:
+        return None
+    diff = abs(expected_seconds - candidate_seconds)
+    if diff <= DURATION_EXACT:
+        return 1.0
+    return max(0.0, 1 - (diff - DURATION_EXACT) / (DURATION_TOLERANCE - DURATION_EXACT))
+
+
+class MatchTarget:
+    """Lo que se espera encontrar: título, artista y duración de Spotify"""
+
+    __slots__ = (
+        "title", "artist", "duration", "expected", "title_tokens", "artist_tokens", "allowed_versions",
+    )
+
+    def __init__(self, title: str, artist: str = "", duration_ms: Optional[int] = None):
+        self.title = title
+        self.artist = artist
+        self.duration = duration_ms / 1000 if duration_ms else None
+        title_tokens = tokens(title)
+        self.artist_tokens = tokens(artist)
+        self.expected = title_tokens | self.artist_tokens
+        self.title_tokens = title_tokens - FILLER_WORDS or title_tokens
+        # "Song (Live)" en Spotify: la versión en directo es la correcta
+        self.allowed_versions = title_tokens & VERSION_WORDS
+
+
+def title_coverage(target: MatchTarget, title_tokens: set[str]) -> float:
+    """Fracción de las palabras del título esperado que aparecen en el del resultado"""
+    if not target.title_tokens:
+        return 1.0
+    return len(target.title_tokens & title_tokens) / len(target.title_tokens)
+
+
+def score_entry(target: MatchTarget, entry: Dict[str, Any]) -> float:
+    """
+    Puntuación de un resultado (aprox. 0-1, puede ser negativa).
+
+    Sin duración en alguno de los lados, la similitud y el canal se reparten
+    su peso.
+    """
+    title = entry.get("title") or ""
+    channel = entry.get("channel") or entry.get("uploader") or ""
+    title_tokens = tokens(title)
+    channel_tokens = tokens(_TOPIC_SUFFIX.sub("", channel))
+
+    similarity = token_set_similarity(target.expected, title_tokens | channel_tokens)
+
+    channel_score = 0.0
+    if _TOPIC_SUFFIX.search(channel):
+        channel_score = 1.0
+    elif target.artist_tokens and target.artist_tokens <= channel_tokens:
+        channel_score = 0.8
+    elif "vevo" in channel.lower():
+        channel_score = 0.6
+    if channel_score == 0.0 and target.artist_tokens and target.artist_tokens <= title_tokens:
+        channel_score = 0.3
+
+    versions = (title_tokens & VERSION_WORDS) - target.allowed_versions
+    penalty = 0.3 if versions else 0.0
+    penalty += MISSING_TITLE_PENALTY * (1 - title_coverage(target, title_tokens))
+    bonus = 0.05 if title_tokens & AUDIO_WORDS else 0.0
+
+    duration = duration_score(target.duration, entry.get("duration"))
+    if duration is None:
+        score = 0.7 * similarity + 0.3 * channel_score
+    else:
+        score = 0.45 * duration + 0.4 * similarity + 0.15 * channel_score
+    return score + bonus - penalty
+
+
+def is_confident(
+    target: MatchTarget,
+    entry: Dict[str, Any],
+    score: float,
+    confident_score: float = CONFIDENT_SCORE
+) -> bool:
+    """
+    Si un resultado ya puntuado es claramente la canción: puntuación alta y
+    el título del resultado contiene (casi) todas las palabras del esperado.
+    """
+    if score < confident_score:
+        return False
+    return title_coverage(target, tokens(entry.get("title") or "")) >= CONFIDENT_TITLE_COVERAGE
+
+
+def best_match(
+    entries: Iterable[Dict[str, Any]],
+    target: MatchTarget,
+    confident_score: float = CONFIDENT_SCORE
+) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Mejor resultado para la canción y su puntuación ((None, -inf) si no hay resultados).
+
+    Se recorren en el orden de YouTube y se para en el primero que es
+    claramente la canción (is_confident: duración y título coinciden), así
+    que en el caso habitual no se puntúan todos.
+    """
+    best, best_score = None, float("-inf")
+    for entry in entries:
+        if not entry or not entry.get("id"):
+            continue
+        score = score_entry(target, entry)
+        if is_confident(target, entry, score, confident_score):
+            return entry, score
+        if score > best_score:
+            best, best_score = entry, score
+    return best, best_score
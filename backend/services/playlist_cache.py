@@ -0,0 +1,108 @@
+"""
+Caché en memoria de playlists de Spotify.
+
+Guarda las canciones ya procesadas junto con el snapshot_id de la playlist.
+En cada consulta solo se pide a Spotify el snapshot_id actual: si no ha
+cambiado, se devuelven las canciones guardadas sin volver a paginar.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import spotipy
+
+from config import PLAYLIST_CACHE_MAX_PLAYLISTS, PLAYLIST_CACHE_MAX_TRACKS
+from models.song import Song
+from services import spotify_client
+from services.spotify_client import extract_playlist_id, iter_playlist_tracks
+
+
+class _CachedPlaylist:
+    __slots__ = ("snapshot_id", "songs")
+
+    def __init__(self, snapshot_id: str, songs: list[Song]):
+        self.snapshot_id = snapshot_id
+        self.songs = songs
+
+
+class PlaylistCache:
+    """Caché LRU de playlists limitada por número de playlists y de canciones"""
+
+    def __init__(
+        self,
+        max_playlists: int = PLAYLIST_CACHE_MAX_PLAYLISTS,
+        max_tracks: int = PLAYLIST_CACHE_MAX_TRACKS
+    ):
+        self.max_playlists = max_playlists
+        self.max_tracks = max_tracks
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _CachedPlaylist]" = OrderedDict()
+        self._total_tracks = 0
+        self._lock = threading.Lock()
+
+    def get_tracks(self, playlist_url: str, client: Optional[spotipy.Spotify] = None) -> list[Song]:
+        """Devuelve las canciones de la playlist, revalidando con su snapshot_id"""
+        try:
+            client = client or spotify_client.sp
+            playlist_id = extract_playlist_id(playlist_url)
+            snapshot_id = client.playlist(playlist_id, fields="snapshot_id")["snapshot_id"]
+
+            with self._lock:
+                cached = self._entries.get(playlist_id)
+                if cached and cached.snapshot_id == snapshot_id:
+                    self._entries.move_to_end(playlist_id)
+                    self.hits += 1
+                    return list(cached.songs)
+                if cached:
+                    self.stale += 1
+                else:
+                    self.misses += 1
+
+            songs = list(iter_playlist_tracks(playlist_url, client))
+        except Exception as e:
+            raise RuntimeError(f"Error al obtener canciones: {str(e)}")
+
+        self._store(playlist_id, _CachedPlaylist(snapshot_id, songs))
+        return list(songs)
+
+    def _store(self, playlist_id: str, entry: _CachedPlaylist):
+        with self._lock:
+            old = self._entries.pop(playlist_id, None)
+            if old:
+                self._total_tracks -= len(old.songs)
+
+            # Una playlist más grande que el límite total no se guarda
+            if len(entry.songs) > self.max_tracks:
+                return
+
+            self._entries[playlist_id] = entry
+            self._total_tracks += len(entry.songs)
+
+            while (
+                len(self._entries) > self.max_playlists
+                or self._total_tracks > self.max_tracks
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_tracks -= len(evicted.songs)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "playlists": len(self._entries),
+            "tracks": self._total_tracks,
+            "max_playlists": self.max_playlists,
+            "max_tracks": self.max_tracks,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global playlist cache instance
+playlist_cache = PlaylistCache()
@@ -0,0 +1,157 @@
+"""
+Caché persistente de búsquedas de YouTube.
+
+Guarda en SQLite el vídeo elegido para cada canción, indexado por el ID de
+Spotify y por el texto normalizado "título artista", de modo que las
+canciones populares que aparecen en muchas playlists no vuelven a pasar por
+yt-dlp. Las búsquedas sin resultados también se guardan, con un TTL más corto.
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    CACHE_DIR,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_NEGATIVE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+)
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza un texto de búsqueda: sin acentos, signos ni mayúsculas"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w]+", " ", text.lower())
+    return " ".join(text.split())
+
+
+def cache_keys(query: str, track_id: Optional[str] = None) -> list[str]:
+    """Claves bajo las que se guarda una canción (ID de Spotify primero)"""
+    keys = []
+    # Los IDs "idx_N" son posiciones en la playlist, no identifican la canción
+    if track_id and not track_id.startswith("idx_"):
+        keys.append(f"spotify:{track_id}")
+    keys.append(f"query:{normalize_query(query)}")
+    return keys
+
+
+class SearchCache:
+    """Caché SQLite con TTL, límite de tamaño LRU y contadores de aciertos"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        ttl: float = SEARCH_CACHE_TTL,
+        negative_ttl: float = SEARCH_CACHE_NEGATIVE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES
+    ):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY,"
+                " video_id TEXT,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_lru ON search_cache(last_used)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, query: str, track_id: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Busca una canción en la caché.
+
+        Returns:
+            (encontrado, video_id). video_id es None para resultados negativos.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for key in cache_keys(query, track_id):
+                row = conn.execute(
+                    "SELECT video_id, expires_at FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                video_id, expires_at = row
+                if expires_at < now:
+                    conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    continue
+
+                conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+                if video_id is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return True, video_id
+
+            conn.commit()
+            self.misses += 1
+            return False, None
+
+    def set(self, query: str, video_id: Optional[str], track_id: Optional[str] = None):
+        """Guarda el vídeo elegido (o None si no hubo resultados)"""
+        now = time.time()
+        ttl = self.ttl if video_id else self.negative_ttl
+        rows = [(key, video_id, now + ttl, now) for key in cache_keys(query, track_id)]
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO search_cache (key, video_id, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.negative_hits + self.misses
+        with self._lock:
+            (entries,) = self._connect().execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global search cache instance
+search_cache = SearchCache(CACHE_DIR / "search_cache.sqlite3")
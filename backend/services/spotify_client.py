@@ -1,9 +1,12 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 from dotenv import load_dotenv
 from models.song import Song
+from config import SPOTIFY_PAGE_WORKERS
 
 load_dotenv()
 
@@ -13,6 +16,11 @@ sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
     client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
 ))
 
+# Máximo de elementos por página que permite la API de Spotify
+PLAYLIST_PAGE_SIZE = 100
+# Solo pedir los campos que usamos para reducir el tamaño de las respuestas
+PLAYLIST_ITEM_FIELDS = "total,next,items(track(id,name,duration_ms,artists(name),album(name),external_ids(isrc)))"
+
 def extract_playlist_id(url: str) -> str:
     """
     Extrae de forma robusta el ID de una playlist desde cualquier URL válida de Spotify.
@@ -22,22 +30,71 @@ def extract_playlist_id(url: str) -> str:
         return match.group(1)
     raise ValueError("No se pudo extraer el ID de la playlist desde la URL proporcionada.")
 
-def get_playlist_tracks(playlist_url: str) -> list[Song]:
+def _songs_from_items(items: list, offset: int) -> Iterator[Song]:
+    for i, item in enumerate(items, start=offset):
+        track = item.get("track")
+        if not track:
+            continue
+        title = track['name']
+        artist = track['artists'][0]['name']
+        query = f"{title} - {artist}"
+        track_id = track.get('id') or f"idx_{i}"
+        yield Song(
+            id=track_id,
+            title=title,
+            artist=artist,
+            query=query,
+            duration_ms=track.get('duration_ms'),
+            isrc=(track.get('external_ids') or {}).get('isrc'),
+            album=(track.get('album') or {}).get('name')
+        )
+
+def iter_playlist_tracks(playlist_url: str, client: spotipy.Spotify = None) -> Iterator[Song]:
+    """
+    Recorre todas las canciones de una playlist, en orden.
+
+    La primera página indica el total; el resto se piden en paralelo con un
+    pool acotado y se devuelven en orden a medida que llegan. La lectura
+    termina en la primera página sin "next"; si la playlist creció después
+    de leer el total, las páginas nuevas se siguen una a una.
+
+    Args:
+        playlist_url: URL de la playlist de Spotify
+        client: Cliente de Spotify (por defecto el global; permite usar un sustituto local)
+    """
+    client = client or sp
+    playlist_id = extract_playlist_id(playlist_url)
+
+    def fetch_page(offset: int) -> dict:
+        return client.playlist_items(
+            playlist_id,
+            fields=PLAYLIST_ITEM_FIELDS,
+            limit=PLAYLIST_PAGE_SIZE,
+            offset=offset
+        )
+
+    page = fetch_page(0)
+    yield from _songs_from_items(page["items"], 0)
+    offset = 0
+
+    total = page.get("total") or 0
+    offsets = range(PLAYLIST_PAGE_SIZE, total, PLAYLIST_PAGE_SIZE)
+    if offsets and page.get("next"):
+        with ThreadPoolExecutor(max_workers=min(SPOTIFY_PAGE_WORKERS, len(offsets))) as pool:
+            # map conserva el orden de las páginas aunque terminen desordenadas
+            for offset, page in zip(offsets, pool.map(fetch_page, offsets)):
+                yield from _songs_from_items(page["items"], offset)
+                # La playlist se acortó: las páginas siguientes vendrían vacías
+                if not page.get("next"):
+                    break
+
+    while page.get("next"):
+        offset += PLAYLIST_PAGE_SIZE
+        page = fetch_page(offset)
+        yield from _songs_from_items(page["items"], offset)
+
+def get_playlist_tracks(playlist_url: str, client: spotipy.Spotify = None) -> list[Song]:
     try:
-        playlist_id = extract_playlist_id(playlist_url)
-        results = sp.playlist_items(playlist_id)
-        songs: list[Song] = []
-
-        for i, item in enumerate(results["items"]):
-            track = item.get("track")
-            if not track:
-                continue
-            title = track['name']
-            artist = track['artists'][0]['name']
-            query = f"{title} - {artist}"
-            track_id = track.get('id') or f"idx_{i}"
-            songs.append(Song(id=track_id, title=title, artist=artist, query=query))
-
-        return songs
+        return list(iter_playlist_tracks(playlist_url, client))
     except Exception as e:
         raise RuntimeError(f"Error al obtener canciones: {str(e)}")
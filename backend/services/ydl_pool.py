@@ -0,0 +1,162 @@
+"""
+Pool de instancias YoutubeDL reutilizables.
+
+Crear un YoutubeDL por canción y por estrategia repite la carga de
+extractores, la preparación de cookies y abre conexiones HTTP nuevas cada
+vez. Este pool guarda una instancia por hilo y por (uso, estrategia), de modo
+que los extractores ya inicializados y las conexiones TCP/TLS se reutilizan
+entre canciones. YoutubeDL no es seguro entre hilos, por eso cada hilo de
+los pools del planificador tiene sus propias instancias.
+
+Solo se usan opciones públicas de yt-dlp: los hooks de progreso de cada
+préstamo pasan por un único hook registrado con la opción progress_hooks, y
+la plantilla de salida se cambia en params["outtmpl"], el diccionario
+documentado de plantillas por tipo. Si una versión de yt-dlp deja de
+exponerlo así, cada préstamo con plantilla usa una instancia nueva (como
+antes del pool) en lugar de fallar.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from yt_dlp import YoutubeDL
+
+from config import ydl_options
+
+
+class YDLPool:
+    """Instancias YoutubeDL preinicializadas por hilo y por estrategia"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances: list[YoutubeDL] = []
+        self.created = 0
+        self.reused = 0
+        self.fresh = 0
+
+    def _get(self, key: Tuple[str, str], build_opts: Callable[[], dict]) -> Tuple[YoutubeDL, List[Callable]]:
+        """Instancia del hilo para la clave y la lista de hooks de su préstamo actual"""
+        instances: Dict[Tuple[str, str], Tuple[int, YoutubeDL, List[Callable]]] = (
+            self._local.__dict__.setdefault("instances", {})
+        )
+        # Leer las opciones primero: refresca las cookies si el archivo cambió
+        ydl_options.get()
+        version = ydl_options.version
+
+        cached = instances.get(key)
+        if cached is not None:
+            cached_version, ydl, hooks = cached
+            if cached_version == version:
+                with self._lock:
+                    self.reused += 1
+                return ydl, hooks
+            # Creada con cookies antiguas: cerrarla sin que guarde sus cookies
+            # encima de la copia recién refrescada, y crear otra
+            ydl.params["cookiefile"] = None
+            self._discard(ydl)
+
+        hooks: List[Callable] = []
+
+        def dispatch(status: dict):
+            for hook in list(hooks):
+                hook(status)
+
+        ydl = YoutubeDL({**build_opts(), "progress_hooks": [dispatch]})
+        instances[key] = (version, ydl, hooks)
+        with self._lock:
+            self._instances.append(ydl)
+            self.created += 1
+        return ydl, hooks
+
+    def _discard(self, ydl: YoutubeDL):
+        with self._lock:
+            if ydl in self._instances:
+                self._instances.remove(ydl)
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"⚠️ Error cerrando YoutubeDL: {e}")
+
+    @contextmanager
+    def checkout(
+        self,
+        purpose: str,
+        strategy: dict,
+        build_opts: Callable[[], dict],
+        outtmpl: Optional[str] = None,
+        progress_hooks: Iterable[Callable] = ()
+    ) -> Iterator[YoutubeDL]:
+        """
+        Presta la instancia del hilo actual para un uso y estrategia.
+
+        Las opciones fijas se toman de build_opts() solo al crear la
+        instancia (o cuando cambian las cookies); la plantilla de salida y
+        los hooks de progreso cambian en cada canción y se aplican en cada
+        préstamo.
+
+        Args:
+            purpose: Uso de la instancia ("search", "download", ...); las
+                opciones fijas de cada uso deben ser siempre las mismas
+            strategy: Estrategia de YOUTUBE_STRATEGIES
+            build_opts: Construye las opciones completas de yt-dlp
+            outtmpl: Plantilla de nombre de archivo para esta descarga
+            progress_hooks: Hooks de progreso para esta descarga
+        """
+        ydl, hooks = self._get((purpose, strategy["name"]), build_opts)
+
+        if outtmpl is not None:
+            templates = ydl.params.get("outtmpl")
+            if not isinstance(templates, dict) or "default" not in templates:
+                # Formato de params desconocido: instancia nueva solo para este préstamo
+                with self._fresh(build_opts, outtmpl, progress_hooks) as fresh:
+                    yield fresh
+                return
+            # yt-dlp normaliza el resto de plantillas en __init__; solo cambia la general
+            templates["default"] = outtmpl
+        hooks[:] = list(progress_hooks)
+
+        try:
+            yield ydl
+        finally:
+            hooks.clear()
+
+    @contextmanager
+    def _fresh(
+        self,
+        build_opts: Callable[[], dict],
+        outtmpl: str,
+        progress_hooks: Iterable[Callable]
+    ) -> Iterator[YoutubeDL]:
+        with self._lock:
+            self.fresh += 1
+            first = self.fresh == 1
+        if first:
+            print("⚠️ yt-dlp no expone params['outtmpl'] como diccionario: las descargas no reutilizan instancias")
+        ydl = YoutubeDL({**build_opts(), "outtmpl": outtmpl, "progress_hooks": list(progress_hooks)})
+        try:
+            yield ydl
+        finally:
+            ydl.close()
+
+    def close_all(self):
+        """Cierra todas las instancias (guarda cookies y conexiones)"""
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception as e:
+                print(f"⚠️ Error cerrando YoutubeDL: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "instances": len(self._instances),
+            "created": self.created,
+            "reused": self.reused,
+            "fresh": self.fresh,
+        }
+
+
+# Global YoutubeDL pool instance
+ydl_pool = YDLPool()
@@ -1,70 +1,231 @@
-from yt_dlp import YoutubeDL
+import asyncio
 import re
-from config import get_base_ydl_opts, YOUTUBE_STRATEGIES
+import threading
+from typing import AsyncIterator, Iterable
+from config import (
+    get_base_ydl_opts,
+    YOUTUBE_STRATEGIES,
+    SEARCH_RESULTS_INITIAL,
+    SEARCH_RESULTS_MAX,
+)
+from models.song import Song
+from services.match_scoring import MatchTarget, best_match, is_confident
+from services.search_cache import search_cache
+from services.ydl_pool import ydl_pool
+from utils.job_scheduler import job_scheduler
 
-def normalize(text: str) -> str:
-    return re.sub(r'\\W+', '', text).lower()
 
-def search_youtube(query: str, artist: str = "") -> str:
+class SearchMetrics:
+    """Results fetched per YouTube search, and how often a search had to widen"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.widened = 0
+        self.results = 0
+    
+    def record(self, results: int, widened: bool):
+        with self._lock:
+            self.searches += 1
+            self.results += results
+            self.widened += widened
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "widened": self.widened,
+                "results_per_search": round(self.results / self.searches, 2) if self.searches else 0,
+            }
+
+
+# Global search metrics instance
+search_metrics = SearchMetrics()
+
+def youtube_watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def video_id_from_url(url: str) -> str:
+    match = re.search(r'(?:v=|youtu\.be/|/shorts/)([\w-]{11})', url)
+    return match.group(1) if match else None
+
+def cached_youtube_url(query: str, artist: str = "", track_id: str = None) -> tuple[bool, str]:
+    """
+    Look up a search in the persistent cache only, without touching yt-dlp.
+    
+    Returns:
+        (found, url): url is None for cached searches that had no match
+    """
+    cache_query = f"{query} {artist}" if artist else query
+    found, video_id = search_cache.get(cache_query, track_id)
+    return found, (youtube_watch_url(video_id) if video_id else None)
+
+def search_youtube(
+    query: str,
+    artist: str = "",
+    track_id: str = None,
+    song: Song = None,
+    check_cache: bool = True
+) -> str:
     """
     Search for a song on YouTube and return the best match URL.
     
+    Results are looked up in the persistent search cache first; a hit
+    returns without touching yt-dlp.
+    
     Args:
         query: Song title or search query
         artist: Artist name (optional, improves search accuracy)
+        track_id: Spotify track id (optional, used as cache key)
+        song: Spotify song (optional); its title, artist and duration are
+            used to score the results
+        check_cache: False when the caller already missed the cache; the
+            result is still stored in it
         
     Returns:
-        YouTube video URL of the best match
+        YouTube video URL of the best match, or None if nothing was found
         
     Raises:
-        RuntimeError: If search fails or no results found
+        RuntimeError: If search fails
     """
-    try:
-        # Get base options and merge with search-specific options
-        base_opts = get_base_ydl_opts()
-        
-        ydl_opts = {
-            **base_opts,
-            'skip_download': True,
-            'default_search': 'ytsearch10',
-            'noplaylist': True,
-            'extract_flat': 'in_playlist',
-            'extractor_args': {
-                'youtube': YOUTUBE_STRATEGIES[0]  # Use first strategy for search
-            }
+    if check_cache:
+        found, url = cached_youtube_url(query, artist, track_id)
+        if found:
+            return url
+    
+    target = (
+        MatchTarget(song.title, song.artist, song.duration_ms) if song
+        else MatchTarget(query, artist)
+    )
+    video_id = _search_video_id(query, artist, target)
+    search_cache.set(f"{query} {artist}" if artist else query, video_id, track_id)
+    return youtube_watch_url(video_id) if video_id else None
+
+def _build_search_opts(playlist_items: str = None) -> dict:
+    # Get base options and merge with search-specific options
+    base_opts = get_base_ydl_opts()
+    
+    opts = {
+        **base_opts,
+        'skip_download': True,
+        'default_search': f'ytsearch{SEARCH_RESULTS_MAX}',
+        'noplaylist': True,
+        'extract_flat': 'in_playlist',
+        'extractor_args': {
+            'youtube': YOUTUBE_STRATEGIES[0]  # Use first strategy for search
         }
+    }
+    if playlist_items:
+        opts['playlist_items'] = playlist_items
+    return opts
 
+def _search_rounds() -> list:
+    """(results requested, playlist_items) of the first search and of the widened one"""
+    rounds = [(SEARCH_RESULTS_INITIAL, None)]
+    if SEARCH_RESULTS_MAX > SEARCH_RESULTS_INITIAL:
+        # Only the results after the first page come back when widening
+        rounds.append((SEARCH_RESULTS_MAX, f"{SEARCH_RESULTS_INITIAL + 1}-{SEARCH_RESULTS_MAX}"))
+    return rounds
+
+def _search_video_id(query: str, artist: str = "", target: MatchTarget = None) -> str:
+    """
+    Run a yt-dlp search and return the id of the best scored entry.
+    
+    Only SEARCH_RESULTS_INITIAL results are requested first. If none of them
+    is a confident match, the search is widened to SEARCH_RESULTS_MAX with
+    playlist_items set to skip the results already scored, so each result
+    is returned and scored once. The widened search uses its own pooled
+    instance because playlist_items is a fixed option.
+    """
+    try:
         if artist:
             query = f"{query} {artist}"
+        target = target or MatchTarget(query, artist)
         
-        with YoutubeDL(ydl_opts) as ydl:
-            result = ydl.extract_info(query, download=False)
-
-            if 'entries' not in result or not result['entries']:
-                return None
-
-            entries = result['entries'][:5]  # Solo analizamos los 5 primeros
-            artist_norm = normalize(artist)
-
-            def score(entry):
-                title = entry.get('title', '').lower()
-                uploader = entry.get('uploader', '').lower()
-                title_norm = normalize(title)
-                uploader_norm = normalize(uploader)
-
-                s = 0
-                if artist_norm and (artist_norm in title_norm or artist_norm in uploader_norm):
-                    s += 3
-                if any(k in title for k in ["audio", "lyrics", "letra"]):
-                    s += 2
-                if "official" in title:
-                    s += 1
-                if any(k in title for k in ["live", "mix", "video"]):
-                    s -= 2
-                return s
-
-            best_entry = max(entries, key=score)
-            return f"https://www.youtube.com/watch?v={best_entry['id']}"
+        best_entry, best_score = None, float("-inf")
+        seen = set()
+        fetched = 0
+        widened = False
+        already = 0
+        for count, items in _search_rounds():
+            widened = items is not None
+            with ydl_pool.checkout(
+                f"search:{items}" if items else "search",
+                YOUTUBE_STRATEGIES[0],
+                lambda: _build_search_opts(items)
+            ) as ydl:
+                result = ydl.extract_info(f"ytsearch{count}:{query}", download=False)
+            returned = result.get('entries') or []
+            fetched += len(returned)
+            entries = [e for e in returned if e and e.get('id') not in seen]
+            seen.update(e.get('id') for e in entries)
+            
+            # Duración, similitud y canal; se para en el primer resultado claro
+            entry, score = best_match(entries, target)
+            if entry and score > best_score:
+                best_entry, best_score = entry, score
+            # Menos resultados de los pedidos: no hay más que buscar
+            if (best_entry and is_confident(target, best_entry, best_score)) or len(returned) < count - already:
+                break
+            already = count
+        
+        search_metrics.record(fetched, widened=widened)
+        return best_entry['id'] if best_entry else None
 
     except Exception as e:
         raise RuntimeError(f"Error en búsqueda de YouTube: {str(e)}")
+
+async def find_youtube_url(song: Song, session_id: str) -> str:
+    """
+    Resolve a song's YouTube URL, searching only on a cache miss.
+    
+    The cache is checked before the job is queued, so cached songs return
+    at once instead of waiting for the "search" stage's rate limiter, which
+    only has to pace the requests that actually reach YouTube.
+    
+    Args:
+        song: Song to resolve
+        session_id: Scheduler session the search is queued under
+    
+    Returns:
+        YouTube video URL of the best match, or None if nothing was found
+    """
+    found, url = await asyncio.to_thread(cached_youtube_url, song.query, track_id=song.id)
+    if found:
+        return url
+    return await job_scheduler.submit(
+        "search", session_id, search_youtube, song.query,
+        track_id=song.id, song=song, check_cache=False
+    )
+
+async def search_songs(
+    songs: Iterable[Song],
+    session_id: str = "search"
+) -> AsyncIterator[Song]:
+    """
+    Search many songs at once and yield each one as soon as it resolves.
+    
+    Cached songs resolve at once; the rest run concurrently in the
+    scheduler's "search" stage, so they share its bounded pool and rate
+    limiter with the download sessions. Each yielded song has youtube_url
+    set (None if no match was found or the search failed).
+    
+    Args:
+        songs: Songs to search
+        session_id: Scheduler session the searches are queued under
+    """
+    async def search(song: Song) -> Song:
+        try:
+            url = await find_youtube_url(song, session_id)
+        except Exception as e:
+            print(f"Error buscando {song.title}: {str(e)}")
+            url = None
+        return song.model_copy(update={"youtube_url": url})
+    
+    tasks = [asyncio.ensure_future(search(song)) for song in songs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
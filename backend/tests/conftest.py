@@ -0,0 +1,87 @@
+"""
+Configuración común de las pruebas.
+
+Las pruebas se ejecutan sin red ni FFmpeg: se fijan variables de entorno
+inocuas antes de importar los módulos del backend y se evita que
+utils.ffmpeg_setup intente descargar FFmpeg.
+"""
+import http.server
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="spotidl-cache-"))
+os.environ.setdefault("STATE_BACKEND", "")
+os.environ.setdefault("DOWNLOADS_DIR", tempfile.mkdtemp(prefix="spotidl-downloads-"))
+
+import utils.ffmpeg_setup as ffmpeg_setup  # noqa: E402
+
+ffmpeg_setup.get_ffmpeg_path = lambda: None
+
+
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Sirve `server.data` respetando (o no) la cabecera Range"""
+
+    def do_GET(self):
+        data = self.server.data
+        requested = self.headers.get("Range")
+        if requested and not self.server.ignore_range:
+            start, end = requested.split("=", 1)[1].split("-")
+            start, end = int(start), min(int(end), len(data) - 1)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = data[start:end + 1]
+            self.send_response(206)
+        else:
+            body = data
+            self.send_response(200)
+        self.server.requests += 1
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def range_server():
+    """Servidor HTTP local con soporte de rangos; devuelve la fábrica de streams"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    server.daemon_threads = True
+    server.data = b""
+    server.ignore_range = False
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def make_stream(data: bytes, filesize=..., ignore_range: bool = False) -> dict:
+        server.data = data
+        server.ignore_range = ignore_range
+        return {
+            "url": f"http://127.0.0.1:{server.server_port}/audio",
+            "http_headers": {},
+            "filesize": len(data) if filesize is ... else filesize,
+            "protocol": "https",
+            "acodec": "opus",
+        }
+
+    make_stream.server = server
+    yield make_stream
+    server.shutdown()
+    server.server_close()
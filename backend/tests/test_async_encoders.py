@@ -0,0 +1,62 @@
+"""Motor asíncrono: cuántos codificadores FFmpeg corren a la vez"""
+import asyncio
+import os
+import stat
+import sys
+
+from services import async_downloader
+
+# FFmpeg sustituto: registra inicio y fin (remux o recodificación) y copia la entrada
+FAKE_FFMPEG = """#!{python}
+import os, sys, time
+kind = "copy" if "copy" in sys.argv else "encode"
+with open({log!r}, "a") as log:
+    log.write(f"{{time.monotonic()}} {{kind}} 1\\n")
+data = sys.stdin.buffer.read()
+time.sleep(0.2)
+with open(sys.argv[-1], "wb") as out:
+    out.write(data)
+with open({log!r}, "a") as log:
+    log.write(f"{{time.monotonic()}} {{kind}} -1\\n")
+"""
+
+
+def max_running(log_path, kind: str) -> int:
+    events = []
+    with open(log_path) as log:
+        for line in log:
+            when, event_kind, delta = line.split()
+            if event_kind == kind:
+                events.append((float(when), int(delta)))
+    running = peak = 0
+    # Con el mismo instante, los finales antes que los inicios
+    for _, delta in sorted(events):
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+
+def test_encoders_are_capped_but_remuxes_are_not(range_server, tmp_path, monkeypatch):
+    log_path = tmp_path / "ffmpeg.log"
+    fake = tmp_path / "ffmpeg"
+    fake.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(log_path)))
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(async_downloader, "get_ffmpeg_binary", lambda: str(fake))
+    monkeypatch.setattr(async_downloader, "TRANSCODE_CONCURRENCY", 2)
+
+    data = os.urandom(32 * 1024)
+    stream = range_server(data)  # Opus: se remuxa a opus y se recodifica a mp3
+
+    async def main():
+        try:
+            await asyncio.gather(*(
+                async_downloader.stream_to_audio(stream, tmp_path / "out" / f"{i}.{fmt}", fmt)
+                for i in range(6) for fmt in ("mp3", "opus")
+            ))
+        finally:
+            await async_downloader.close_client()
+
+    asyncio.run(main())
+    assert max_running(log_path, "encode") == 2
+    assert max_running(log_path, "copy") > 2
+    assert all((tmp_path / "out" / f"{i}.{fmt}").read_bytes() == data for i in range(6) for fmt in ("mp3", "opus"))
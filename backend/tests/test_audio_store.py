@@ -0,0 +1,98 @@
+"""Almacén de audio: archivos fijados, hardlinks de sesión, cuota y varios workers"""
+import asyncio
+import os
+import time
+
+from services.audio_store import AudioStore
+
+
+def store_file(store, video_id, size):
+    path = store.path_for(video_id, "mp3", "192")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"a" * size)
+    store.publish(path)
+    return path
+
+
+def test_pinned_file_is_not_evicted_until_unpinned(tmp_path):
+    store = AudioStore(tmp_path / "store", max_bytes=150)
+    first = store_file(store, "first", 100)
+    assert store.lookup("first", "mp3", "192", pin=True) == first
+
+    store_file(store, "second", 100)
+    assert first.exists()
+
+    store.unpin(first)
+    assert not first.exists()
+    assert store.stats()["reclaimed_bytes"] == 100
+    assert store.stats()["total_bytes"] == 100
+
+
+def test_file_linked_into_a_session_is_kept_and_not_counted_as_freed(tmp_path):
+    store = AudioStore(tmp_path / "store", max_bytes=150)
+    first = store_file(store, "first", 100)
+    session_copy = tmp_path / "session" / "first.mp3"
+    store.link_into(first, session_copy)
+
+    store_file(store, "second", 100)
+    # Borrarlo no liberaría espacio: la sesión conserva el hardlink
+    assert first.exists()
+    assert store.stats()["evictions"] == 0
+    assert store.stats()["total_bytes"] == 200
+
+    # El conserje borra la sesión: ya se puede expulsar
+    session_copy.unlink()
+    store_file(store, "third", 10)
+    assert not first.exists()
+    assert store.stats()["reclaimed_bytes"] == 100
+
+
+def test_link_or_produce_shares_one_production(tmp_path):
+    store = AudioStore(tmp_path / "store", max_bytes=0)
+    produced = []
+
+    async def produce(path):
+        produced.append(path)
+        await asyncio.sleep(0.01)
+        path.write_bytes(b"audio")
+
+    async def main():
+        return await asyncio.gather(*(
+            store.link_or_produce("vid", "mp3", "192", produce, tmp_path / f"s{i}" / "song.mp3")
+            for i in range(3)
+        ))
+
+    targets = asyncio.run(main())
+    assert len(produced) == 1
+    assert all(target.read_bytes() == b"audio" for target in targets)
+    stats = store.stats()
+    assert (stats["misses"], stats["coalesced"], stats["pinned"]) == (1, 2, 0)
+
+
+def test_file_published_by_another_worker_is_adopted(tmp_path):
+    mine = AudioStore(tmp_path / "store")
+    assert mine.lookup("vid", "mp3", "192") is None
+    # Otro worker publica el archivo después de que este cargara su índice
+    other = AudioStore(tmp_path / "store")
+    path = store_file(other, "vid", 50)
+
+    assert mine.lookup("vid", "mp3", "192") == path
+    stats = mine.stats()
+    assert (stats["adopted"], stats["files"], stats["total_bytes"]) == (1, 1, 50)
+
+
+def test_only_stale_partial_files_are_removed(tmp_path):
+    store = AudioStore(tmp_path / "store", part_grace=60)
+    writing = store.path_for("writing", "mp3", "192").with_suffix(".mp3.part")
+    stale = store.path_for("stale", "mp3", "192").with_suffix(".mp3.part")
+    for path in (writing, stale):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"partial")
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+
+    store.stats()
+    # El .part reciente puede ser de otro worker que sigue escribiendo
+    assert writing.exists()
+    assert not stale.exists()
+    assert store.stats()["files"] == 0
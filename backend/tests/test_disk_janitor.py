@@ -0,0 +1,125 @@
+"""
+Conserje de disco con varios workers sobre el mismo directorio.
+
+Cada worker se simula con su propia instancia de DiskJanitor: los bloqueos
+de archivo (flock) se comportan igual entre descriptores del mismo proceso
+que entre procesos distintos.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from utils import disk_janitor as janitor_module
+from utils.disk_janitor import DiskJanitor
+
+pytestmark = pytest.mark.skipif(janitor_module.fcntl is None, reason="requiere fcntl")
+
+OLD = 3600
+
+
+def make_session(root, session_id, age=OLD, with_zip=True):
+    """Directorio de sesión (y su ZIP) con mtime de hace `age` segundos"""
+    session_dir = root / session_id
+    session_dir.mkdir()
+    (session_dir / "song.mp3").write_bytes(b"x" * 1000)
+    paths = [session_dir / "song.mp3", session_dir]
+    if with_zip:
+        zip_path = root / f"{session_id}.zip"
+        zip_path.write_bytes(b"z" * 1000)
+        paths.append(zip_path)
+    stamp = time.time() - age
+    for path in paths:
+        os.utime(path, (stamp, stamp))
+    return session_dir
+
+
+def workers(root, **kwargs):
+    options = dict(min_age=60, zip_ttl=7200, downloaded_grace=0)
+    options.update(kwargs)
+    return DiskJanitor(root, **options), DiskJanitor(root, **options)
+
+
+def test_hold_in_another_worker_protects_unfinished_session(tmp_path):
+    leader, other = workers(tmp_path)
+    session_dir = make_session(tmp_path, "s1", with_zip=False)
+
+    other.hold("s1")
+    asyncio.run(leader.run_once())
+    assert session_dir.exists()
+
+    other.release("s1")
+    asyncio.run(leader.run_once())
+    assert not session_dir.exists()
+
+
+def test_only_one_worker_cleans(tmp_path):
+    first, second = workers(tmp_path)
+    session_dir = make_session(tmp_path, "s1", with_zip=False)
+
+    assert asyncio.run(first.run_once()) > 0
+    assert not session_dir.exists()
+    make_session(tmp_path, "s2", with_zip=False)
+    assert asyncio.run(second.run_once()) == 0
+    assert (tmp_path / "s2").exists()
+    assert second.stats()["leader"] is False
+
+    # Al parar el conserje otro worker toma el relevo
+    asyncio.run(first.stop())
+    assert asyncio.run(second.run_once()) > 0
+    assert second.stats()["leader"] is True
+
+
+def test_downloaded_mark_is_shared(tmp_path):
+    leader, other = workers(tmp_path)
+    make_session(tmp_path, "s1", age=120)
+    zip_path = tmp_path / "s1.zip"
+
+    asyncio.run(leader.run_once())
+    assert zip_path.exists()
+
+    # El ZIP lo descargó un cliente del otro worker
+    other.hold("s1")
+    other.release("s1", downloaded=True)
+    asyncio.run(leader.run_once())
+    assert not zip_path.exists()
+    assert not (tmp_path / "s1").exists()
+    # Las marcas de sesiones sin archivos se limpian en la siguiente pasada
+    asyncio.run(leader.run_once())
+    assert list((tmp_path / ".janitor").iterdir()) == [tmp_path / ".janitor" / "leader"]
+
+
+def test_state_dir_is_not_a_session(tmp_path):
+    leader, _ = workers(tmp_path, max_bytes=0)
+    make_session(tmp_path, "s1")
+    asyncio.run(leader.run_once())
+    assert (tmp_path / ".janitor" / "leader").exists()
+
+
+def test_hold_async_waits_for_the_lock_off_the_event_loop(tmp_path):
+    janitor = DiskJanitor(tmp_path)
+    janitor.state_dir.mkdir()
+    # Otro worker está borrando la sesión: tiene el bloqueo exclusivo
+    with open(janitor._state_file("s1", "active"), "a") as deleting:
+        janitor_module.fcntl.flock(deleting, janitor_module.fcntl.LOCK_EX)
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            await janitor.hold_async("s1")
+            task.cancel()
+            return ticks
+
+        # Los reintentos (HOLD_ATTEMPTS × 10 ms) no paran el event loop
+        assert asyncio.run(main()) >= 3
+    assert janitor.stats()["sessions_in_use"] == 1
+    janitor.release("s1")
+    assert janitor.stats()["sessions_in_use"] == 0
@@ -0,0 +1,67 @@
+"""Diario de sesiones compartido por varios workers sin almacén de estado"""
+import sqlite3
+import time
+
+from utils.job_journal import JobJournal
+from utils.progress_manager import ProgressManager
+
+
+def journal(tmp_path, **kwargs) -> JobJournal:
+    """Un worker del nodo: abre el mismo archivo que los demás"""
+    worker = JobJournal(tmp_path / "jobs.sqlite3", flush_interval=3600, **kwargs)
+    worker._stopped = True
+    return worker
+
+
+def record(worker: JobJournal, session_id: str):
+    worker.record_session(session_id, [{"title": "Song", "artist": "Artist", "query": "Song"}], "mp3", "2024-01-01")
+    worker.flush()
+
+
+def test_only_one_worker_resumes_a_session(tmp_path):
+    workers = [journal(tmp_path) for _ in range(4)]
+    record(workers[0], "s")
+    # El worker que la descargaba se apaga y la libera; arrancan tres nuevos
+    workers[0].close()
+
+    managers = [ProgressManager(worker, state=None) for worker in workers[1:]]
+    claims = [manager.claim_session("s") for manager in managers]
+    assert claims.count(True) == 1
+    assert all(saved["session_id"] == "s" for saved in workers[1].load())
+
+
+def test_running_session_is_not_claimed_by_another_worker(tmp_path):
+    owner = journal(tmp_path, lease=0.2)
+    other = journal(tmp_path, lease=0.2)
+    record(owner, "s")
+
+    assert not other.claim("s")
+    # El dueño renueva en cada volcado mientras vive
+    for _ in range(3):
+        time.sleep(0.1)
+        owner._last_renewal = 0
+        owner.flush()
+        assert not other.claim("s")
+
+    # Deja de renovar (proceso caído): al caducar el lease, otro la reclama
+    time.sleep(0.3)
+    assert other.claim("s")
+    assert not owner.claim("s")
+
+
+def test_journal_without_owner_columns_is_upgraded(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    conn.execute(
+        "CREATE TABLE sessions (session_id TEXT PRIMARY KEY, songs TEXT NOT NULL,"
+        " output_format TEXT NOT NULL, status TEXT NOT NULL, download_url TEXT,"
+        " created_at TEXT NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO sessions VALUES ('old', '[]', 'mp3', 'in_progress', NULL, '2024-01-01', ?)", (time.time(),)
+    )
+    conn.commit()
+    conn.close()
+
+    worker = journal(tmp_path)
+    assert [saved["session_id"] for saved in worker.load()] == ["old"]
+    assert worker.claim("old")
@@ -0,0 +1,129 @@
+"""Planificador de trabajos con workers falsos que solo duermen"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.job_scheduler import JobCancelled, JobScheduler, RetryLater
+from utils.rate_limiter import TokenBucket
+
+
+class FakeWorker:
+    """Registra el orden de inicio y la concurrencia máxima de sus trabajos"""
+
+    def __init__(self, duration=0.02):
+        self.duration = duration
+        self.started = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, session_id, n):
+        with self._lock:
+            self.started.append((session_id, n))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.duration)
+        with self._lock:
+            self.running -= 1
+        return session_id, n
+
+
+def test_sessions_take_turns_in_a_stage():
+    worker = FakeWorker()
+
+    async def main():
+        scheduler = JobScheduler({"download": 1})
+        # Una sesión grande encola primero; la pequeña no espera a que acabe
+        jobs = [scheduler.submit("download", "big", worker, "big", n) for n in range(6)]
+        jobs += [scheduler.submit("download", "small", worker, "small", n) for n in range(2)]
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    sessions = [session for session, _ in worker.started]
+    # big0 ya estaba en marcha cuando llegó la sesión pequeña
+    assert sessions[:6] == ["big", "big", "small", "big", "small", "big"]
+    # Dentro de cada sesión, en orden de llegada
+    assert [n for s, n in worker.started if s == "big"] == list(range(6))
+
+
+def test_each_stage_has_its_own_cap():
+    searches, downloads = FakeWorker(), FakeWorker()
+
+    async def main():
+        scheduler = JobScheduler({"search": 4, "download": 2})
+        await asyncio.gather(
+            *(scheduler.submit("search", f"s{n % 3}", searches, "s", n) for n in range(12)),
+            *(scheduler.submit("download", f"s{n % 3}", downloads, "d", n) for n in range(12)),
+        )
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert searches.max_running == 4
+    assert downloads.max_running == 2
+    assert stats["search"]["finished"] == stats["search"]["submitted"] == 12
+    assert stats["download"]["queued"] == 0 and stats["download"]["running"] == 0
+
+
+def test_metrics_report_queue_depth_and_wait():
+    worker = FakeWorker(duration=0.05)
+
+    async def main():
+        scheduler = JobScheduler({"download": 1})
+        jobs = [asyncio.ensure_future(scheduler.submit("download", "a", worker, "a", n)) for n in range(3)]
+        jobs.append(asyncio.ensure_future(scheduler.submit("download", "b", worker, "b", 0)))
+        await asyncio.sleep(0.01)
+        during = scheduler.stats()["download"]
+        await asyncio.gather(*jobs)
+        return during, scheduler.stats()["download"]
+
+    during, after = asyncio.run(main())
+    assert during["running"] == 1
+    assert during["queued"] == 3
+    assert during["queued_by_session"] == {"a": 2, "b": 1}
+    # El último trabajo esperó a los tres anteriores
+    assert after["max_wait_seconds"] >= 0.14
+    assert 0 < after["avg_wait_seconds"] < after["max_wait_seconds"]
+
+
+def test_cancel_session_drops_its_pending_jobs():
+    worker = FakeWorker(duration=0.05)
+
+    async def main():
+        scheduler = JobScheduler({"download": 1})
+        first = asyncio.ensure_future(scheduler.submit("download", "a", worker, "a", 0))
+        pending = [asyncio.ensure_future(scheduler.submit("download", "a", worker, "a", n)) for n in (1, 2)]
+        other = asyncio.ensure_future(scheduler.submit("download", "b", worker, "b", 0))
+        await asyncio.sleep(0.01)
+        scheduler.cancel_session("a")
+        assert await first == ("a", 0)
+        for job in pending:
+            with pytest.raises(JobCancelled):
+                await job
+        assert await other == ("b", 0)
+
+    asyncio.run(main())
+    assert ("a", 1) not in worker.started and ("a", 2) not in worker.started
+
+
+def test_rate_limited_and_retried_jobs_are_requeued():
+    calls = []
+
+    def flaky(n):
+        calls.append(n)
+        if calls.count(n) == 1:
+            raise RetryLater(0.05, flaky, n)
+        return n
+
+    async def main():
+        # Dos trabajos por ráfaga; el resto espera tokens con un temporizador
+        scheduler = JobScheduler({"search": 1}, limiters={"search": TokenBucket(rate=50, capacity=2)})
+        started = time.monotonic()
+        results = await asyncio.gather(*(scheduler.submit("search", "s", flaky, n) for n in range(3)))
+        return results, time.monotonic() - started, scheduler.stats()["search"]
+
+    results, elapsed, stats = asyncio.run(main())
+    assert results == [0, 1, 2]
+    assert stats["retries"] == 3
+    assert elapsed >= 0.05
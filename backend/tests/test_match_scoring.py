@@ -0,0 +1,66 @@
+"""Puntuación de resultados de YouTube y cuándo un resultado se acepta como seguro"""
+import json
+from pathlib import Path
+
+from services.match_scoring import MatchTarget, best_match, is_confident, score_entry
+
+FIXTURES = Path(__file__).resolve().parent.parent / "bench" / "fixtures" / "match_scoring.json"
+
+
+def entry(video_id, title, channel, duration):
+    return {"id": video_id, "title": title, "channel": channel, "duration": duration}
+
+
+def test_same_artist_and_duration_is_not_confident_without_the_title():
+    target = MatchTarget("Perfect", "Ed Sheeran", 263000)
+    wrong = entry("ph", "Ed Sheeran - Photograph (Official Audio)", "Ed Sheeran", 263)
+    right = entry("ok", "Ed Sheeran - Perfect (Official Audio)", "Ed Sheeran", 263)
+
+    assert not is_confident(target, wrong, score_entry(target, wrong))
+    assert score_entry(target, right) > score_entry(target, wrong)
+    assert best_match([wrong, right], target)[0]["id"] == "ok"
+
+
+def test_missing_title_words_lower_the_score():
+    target = MatchTarget("Viva La Vida", "Coldplay", 242000)
+    full = entry("a", "Coldplay - Viva La Vida", "Coldplay", 242)
+    partial = entry("b", "Coldplay - La Vida", "Coldplay", 242)
+    other = entry("c", "Coldplay - Clocks", "Coldplay", 242)
+    assert score_entry(target, full) > score_entry(target, partial) > score_entry(target, other)
+
+
+def test_versions_not_in_the_title_are_penalised():
+    studio = MatchTarget("Hotel California", "Eagles", 391000)
+    live = MatchTarget("Hotel California - Live", "Eagles", 430000)
+    live_entry = entry("l", "Eagles - Hotel California (Live 1994)", "Eagles", 432)
+    studio_entry = entry("s", "Eagles - Hotel California (Official Audio)", "Eagles", 391)
+    assert best_match([live_entry, studio_entry], studio)[0]["id"] == "s"
+    assert best_match([studio_entry, live_entry], live)[0]["id"] == "l"
+
+
+def test_first_confident_result_stops_the_scan():
+    target = MatchTarget("Shape of You", "Ed Sheeran", 233712)
+    scored = []
+
+    def results():
+        for item in (
+            entry("ok", "Shape of You", "Ed Sheeran - Topic", 234),
+            entry("late", "Ed Sheeran - Shape of You (Audio)", "Ed Sheeran", 234),
+        ):
+            scored.append(item["id"])
+            yield item
+
+    assert best_match(results(), target)[0]["id"] == "ok"
+    assert scored == ["ok"]
+
+
+def test_fixture_set_has_no_wrong_picks():
+    cases = json.loads(FIXTURES.read_text(encoding="utf-8"))
+    for case in cases:
+        target = MatchTarget(case["title"], case["artist"], case["duration_ms"])
+        picked, score = best_match(case["results"], target)
+        confident = is_confident(target, picked, score)
+        if case["expected"] is None:
+            assert not confident, case
+        else:
+            assert picked["id"] == case["expected"], case
@@ -0,0 +1,152 @@
+"""ProgressManager: sesiones locales, cancelación y deltas"""
+import asyncio
+
+import pytest
+
+from utils.job_scheduler import JobCancelled
+from utils.progress_manager import ProgressManager, SessionLimitReached, STATUSES
+
+
+class FakeJournal:
+    """Registra lo que se escribiría en el diario de trabajos"""
+
+    def __init__(self):
+        self.songs = []
+        self.sessions = []
+        self.forgotten = []
+
+    def song_state(self, session_id, song_id, status, percentage, message):
+        self.songs.append((session_id, song_id, status))
+
+    def session_status(self, session_id, status, download_url=None):
+        self.sessions.append((session_id, status))
+
+    def forget(self, session_id):
+        self.forgotten.append(session_id)
+
+
+def test_updates_after_cancel_are_dropped():
+    journal = FakeJournal()
+    manager = ProgressManager(journal)
+    manager.create_session("s", 2)
+    manager.update_song_progress("s", "a", "downloading", 40, "Descargando audio...")
+    manager.cancel_session("s")
+    journal.songs.clear()
+
+    # Una transferencia que aún no se ha enterado de la cancelación
+    manager.update_song_progress("s", "a", "completed", 100, "Completado")
+    manager.update_session_progress("s", 2, "")
+
+    progress = manager.get_progress("s")
+    assert progress["status"] == "cancelled"
+    assert progress["song_progress"]["a"]["status"] == "cancelled"
+    assert progress["completed_songs"] == 0
+    assert journal.songs == []
+
+
+def test_reporter_aborts_transfers_of_a_cancelled_session():
+    async def main():
+        manager = ProgressManager()
+        manager.create_session("s", 1)
+        reporter = manager.song_reporter("s", "a")
+        reporter(1000, 10000)
+        manager.cancel_session("s")
+        with pytest.raises(JobCancelled):
+            reporter(2000, 10000)
+        with pytest.raises(JobCancelled):
+            reporter.hook({"status": "downloading", "downloaded_bytes": 3000, "total_bytes": 10000})
+
+    asyncio.run(main())
+
+
+def test_changes_since_returns_only_changed_songs():
+    manager = ProgressManager()
+    manager.create_session("s", 1000)
+    for i in range(1000):
+        manager.update_song_progress("s", f"song{i}", "queued", 20, "En cola para descargar...")
+    _, cursor, snapshot = manager.changes_since("s")
+    assert len(snapshot["songs"]) == 1000
+
+    manager.update_song_progress("s", "song10", "downloading", 30, "Descargando audio...")
+    manager.update_song_progress("s", "song500", "completed", 100, "Completado")
+    manager.update_song_progress("s", "song10", "downloading", 50, "Descargando audio...")
+    _, cursor, delta = manager.changes_since("s", cursor)
+    assert "session" not in delta
+    assert delta["songs"] == {
+        "song10": {"status": "downloading", "percentage": 50, "message": "Descargando audio..."},
+        "song500": {"status": "completed", "percentage": 100, "message": "Completado"},
+    }
+
+    manager.update_session_progress("s", 1, "Canción")
+    _, cursor, delta = manager.changes_since("s", cursor)
+    assert delta["session"]["completed_songs"] == 1
+    assert "songs" not in delta
+    assert manager.changes_since("s", cursor) == (manager.epoch, cursor, {})
+
+
+def test_cancel_marks_pending_songs_in_the_delta():
+    manager = ProgressManager()
+    manager.create_session("s", 3)
+    for song_id, status in (("a", "completed"), ("b", "downloading"), ("c", "queued")):
+        manager.update_song_progress("s", song_id, status, 50, "")
+    _, cursor, _ = manager.changes_since("s")
+    manager.cancel_session("s")
+    _, _, delta = manager.changes_since("s", cursor)
+    assert delta["session"]["status"] == "cancelled"
+    assert {song_id: song["status"] for song_id, song in delta["songs"].items()} == {
+        "b": "cancelled", "c": "cancelled",
+    }
+
+
+def test_finished_sessions_expire_and_running_ones_are_kept():
+    journal = FakeJournal()
+    manager = ProgressManager(journal, session_ttl=0)
+    manager.create_session("done", 1)
+    manager.create_session("running", 1)
+    manager.complete_session("done", "/api/download-file/done")
+
+    assert manager.evict_expired() == 1
+    assert manager.get_progress("done") == {}
+    assert manager.get_progress("running")["status"] == "in_progress"
+    assert journal.forgotten == ["done"]
+
+
+def test_session_limit_never_drops_running_sessions():
+    manager = ProgressManager(max_sessions=2)
+    manager.create_session("a", 1)
+    manager.create_session("b", 1)
+    with pytest.raises(SessionLimitReached):
+        manager.create_session("c", 1)
+    assert manager.get_summary("a")["status"] == "in_progress"
+    assert manager.get_summary("b")["status"] == "in_progress"
+    assert manager.get_summary("c") == {}
+
+    # Una sesión terminada deja sitio a la nueva
+    manager.fail_session("a")
+    manager.create_session("c", 1)
+    assert manager.get_summary("a") == {}
+    assert manager.get_summary("c")["status"] == "in_progress"
+
+
+def test_periodic_eviction_runs_on_the_loop():
+    async def main():
+        manager = ProgressManager(session_ttl=0)
+        manager.create_session("s", 1)
+        manager.complete_session("s", "/api/download-file/s")
+        manager.start_eviction(interval=0.01)
+        for _ in range(100):
+            if not manager.get_summary("s"):
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop_eviction()
+        return manager.get_summary("s")
+
+    assert asyncio.run(main()) == {}
+
+
+def test_unknown_status_is_rejected_without_growing_the_table():
+    manager = ProgressManager()
+    manager.create_session("s", 1)
+    with pytest.raises(ValueError):
+        manager.update_song_progress("s", "a", "mystery", 0, "")
+    assert "mystery" not in STATUSES
@@ -0,0 +1,76 @@
+"""ZIP de sesión: nombres repetidos y canciones que no llegan al ZIP"""
+import asyncio
+import uuid
+import zipfile
+
+from api import routes
+from models.song import Song
+from utils.progress_manager import progress_manager
+from utils.zipper import IncrementalZip
+
+
+def song(title, artist="Artist", id=None):
+    return Song(id=id, title=title, artist=artist, query=f"{title} - {artist}")
+
+
+def test_session_filenames_are_unique_and_stable():
+    songs = [song("Intro", id="a"), song("Intro", id="b"), song("Other", id="c"), song("INTRO", id="d")]
+    names = routes.session_filenames(songs, "mp3")
+    assert names == ["Intro - Artist.mp3", "Intro - Artist (2).mp3", "Other - Artist.mp3", "INTRO - Artist (3).mp3"]
+    # Los mismos nombres al reanudar la sesión
+    assert routes.session_filenames(songs, "mp3") == names
+
+
+def test_incremental_zip_keeps_same_named_files(tmp_path):
+    first = tmp_path / "a" / "Song.mp3"
+    second = tmp_path / "b" / "Song.mp3"
+    for path, data in ((first, b"one"), (second, b"two")):
+        path.parent.mkdir()
+        path.write_bytes(data)
+
+    archive = IncrementalZip(tmp_path / "s.zip")
+    assert archive.add(first) == "Song.mp3"
+    assert archive.add(second) == "Song (2).mp3"
+    # El mismo archivo no se duplica
+    assert archive.add(first) == "Song.mp3"
+    assert len(archive) == 2
+
+    with zipfile.ZipFile(archive.finalize()) as zipf:
+        assert zipf.read("Song.mp3") == b"one"
+        assert zipf.read("Song (2).mp3") == b"two"
+
+
+def test_song_that_fails_to_reach_the_zip_is_an_error(tmp_path, monkeypatch):
+    session_id = f"zip-{uuid.uuid4().hex}"
+    songs = [song("Same", id="a"), song("Same", id="b"), song("Broken", id="c")]
+    temp_dir = tmp_path / session_id
+    temp_dir.mkdir()
+
+    async def fake_download(song, temp_dir, session_id, download_slots, output_format, filename):
+        target = temp_dir / filename
+        target.write_bytes(song.id.encode())
+        progress_manager.update_song_progress(session_id, song.id, "completed", 100, "Completado")
+        return target
+
+    original_add = IncrementalZip.add
+
+    def failing_add(self, file):
+        if file.name.startswith("Broken"):
+            raise OSError("disco lleno")
+        return original_add(self, file)
+
+    monkeypatch.setattr(routes, "download_song_async", fake_download)
+    monkeypatch.setattr(IncrementalZip, "add", failing_add)
+    progress_manager.create_session(session_id, len(songs))
+    try:
+        asyncio.run(routes.process_downloads(songs, temp_dir, session_id, max_in_flight=1))
+
+        progress = progress_manager.get_progress(session_id)
+        assert progress["status"] == "completed"
+        assert progress["song_progress"]["a"]["status"] == "completed"
+        assert progress["song_progress"]["b"]["status"] == "completed"
+        assert progress["song_progress"]["c"]["status"] == "error"
+        with zipfile.ZipFile(tmp_path / f"{session_id}.zip") as zipf:
+            assert sorted(zipf.namelist()) == ["Same - Artist (2).mp3", "Same - Artist.mp3"]
+    finally:
+        progress_manager.cleanup_session(session_id)
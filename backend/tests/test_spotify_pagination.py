@@ -0,0 +1,88 @@
+"""Paginación de playlists contra un sustituto local de la Web API de Spotify"""
+import threading
+import time
+
+from services.spotify_client import PLAYLIST_PAGE_SIZE, iter_playlist_tracks
+
+URL = "https://open.spotify.com/playlist/abc123"
+
+
+def track(position: int, local: bool = False) -> dict:
+    return {
+        "track": {
+            # Los archivos locales no tienen ID en Spotify
+            "id": None if local else f"t{position}",
+            "name": f"Song {position}",
+            "duration_ms": 200000,
+            "artists": [{"name": "Artist"}],
+            "album": {"name": "Album"},
+            "external_ids": {},
+        }
+    }
+
+
+class FakeSpotify:
+    """
+    Sirve playlist_items por páginas como la Web API. Las páginas más
+    tempranas tardan más, así que terminan en desorden.
+    """
+
+    def __init__(self, tracks: list, total: int = None, delay: float = 0.02):
+        self.tracks = tracks
+        self.total = len(tracks) if total is None else total
+        self.delay = delay
+        self.offsets = []
+        self._lock = threading.Lock()
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0):
+        assert playlist_id == "abc123"
+        with self._lock:
+            self.offsets.append(offset)
+        time.sleep(self.delay * max(0, 5 - offset // limit))
+        end = offset + limit
+        return {
+            "total": self.total,
+            "next": f"https://api.spotify.com/v1/playlists/abc123/tracks?offset={end}" if end < len(self.tracks) else None,
+            "items": self.tracks[offset:end],
+        }
+
+
+def test_pages_are_yielded_in_playlist_order():
+    local = {5, 150, 249}
+    client = FakeSpotify([track(i, local=i in local) for i in range(250)])
+
+    songs = list(iter_playlist_tracks(URL, client))
+
+    assert [song.title for song in songs] == [f"Song {i}" for i in range(250)]
+    # Los IDs de posición cuentan desde el principio de la playlist, no de la página
+    assert [song.id for song in songs if song.id.startswith("idx_")] == ["idx_5", "idx_150", "idx_249"]
+    assert songs[100].id == "t100"
+    assert sorted(client.offsets) == [0, 100, 200]
+
+
+def test_iteration_stops_at_the_last_page():
+    # Menos canciones que el total anunciado: la página sin next es la última
+    client = FakeSpotify([track(i) for i in range(120)], total=450)
+
+    songs = list(iter_playlist_tracks(URL, client))
+
+    assert len(songs) == 120
+    assert client.offsets[0] == 0
+    assert max(client.offsets) <= 400
+
+
+def test_single_page_playlist_makes_one_request():
+    client = FakeSpotify([track(i) for i in range(PLAYLIST_PAGE_SIZE)])
+
+    assert len(list(iter_playlist_tracks(URL, client))) == PLAYLIST_PAGE_SIZE
+    assert client.offsets == [0]
+
+
+def test_playlist_that_grew_after_the_first_page_is_read_to_the_end():
+    # El total de la primera página se quedó corto: se siguen los next
+    client = FakeSpotify([track(i) for i in range(330)], total=150)
+
+    songs = list(iter_playlist_tracks(URL, client))
+
+    assert [song.title for song in songs] == [f"Song {i}" for i in range(330)]
+    assert client.offsets == [0, 100, 200, 300]
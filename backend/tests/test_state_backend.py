@@ -0,0 +1,233 @@
+"""Progreso, cancelaciones y leases compartidos entre workers por el almacén de estado"""
+import asyncio
+import time
+
+import pytest
+
+from utils.progress_manager import ProgressManager, _owner_key
+from utils.state_backend import MemoryStateBackend, SQLiteStateBackend, StateBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend_factory(request, tmp_path):
+    """Crea conexiones al mismo almacén (una por worker simulado)"""
+    if request.param == "memory":
+        shared = MemoryStateBackend()
+        yield lambda: shared
+    else:
+        backends = []
+
+        def connect():
+            backend = SQLiteStateBackend(tmp_path / "state.sqlite3")
+            backends.append(backend)
+            return backend
+
+        yield connect
+        for backend in backends:
+            backend.close()
+
+
+def worker(backend_factory, **kwargs) -> ProgressManager:
+    """Un ProgressManager que publica solo cuando la prueba llama a publish()"""
+    manager = ProgressManager(state=backend_factory(), flush_interval=3600, **kwargs)
+    manager._stopped = True
+    return manager
+
+
+def test_state_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+def test_backend_commands(backend_factory):
+    backend = backend_factory()
+    assert backend.get("k") is None
+    assert backend.set("k", "1")
+    assert not backend.set("k", "2", nx=True)
+    assert backend.get("k") == "1"
+    assert backend.mget("k", "missing") == ["1", None]
+    assert backend.mget() == []
+
+    assert backend.hset("h", {"a": "1", "b": "2"}) == 2
+    assert backend.hset("h", {"b": "3", "c": "4"}) == 1
+    assert backend.hgetall("h") == {"a": "1", "b": "3", "c": "4"}
+
+    assert backend.expire("h", 0.05)
+    assert not backend.expire("missing", 10)
+    time.sleep(0.1)
+    assert backend.hgetall("h") == {}
+    assert backend.set("h2", "x", ex=0.05)
+    time.sleep(0.1)
+    assert backend.get("h2") is None
+    assert backend.set("h2", "y", nx=True)
+
+    assert backend.delete("k", "h2", "missing") == 2
+    assert backend.get("k") is None
+
+
+def test_only_one_worker_claims_a_session(backend_factory):
+    a = worker(backend_factory, lease=0.2)
+    b = worker(backend_factory, lease=0.2)
+    a.create_session("s", 1)
+
+    # A tiene el lease: B no puede reanudar la sesión
+    assert a.claim_session("s")
+    assert not b.claim_session("s")
+    assert a.state.get(_owner_key("s")) == a.worker_id
+
+    # Si A deja de renovarlo, caduca y B la reclama
+    time.sleep(0.3)
+    assert b.claim_session("s")
+    assert not a.claim_session("s")
+
+
+def test_publish_renews_the_lease_of_running_sessions(backend_factory):
+    a = worker(backend_factory, lease=0.3)
+    b = worker(backend_factory, lease=0.3)
+    a.create_session("s", 1)
+    for _ in range(4):
+        time.sleep(0.1)
+        a._last_renewal = 0
+        a.publish()
+    assert not b.claim_session("s")
+
+    # Al apagar, A libera el lease para que otro worker reanude enseguida
+    a.close()
+    assert b.claim_session("s")
+
+
+def test_cancel_from_another_worker_reaches_the_owner(backend_factory):
+    async def main():
+        a = worker(backend_factory)
+        b = worker(backend_factory)
+        cancelled = []
+        a.add_cancel_handler(cancelled.append)
+
+        a.create_session("s", 2)
+        a.update_song_progress("s", "x", "downloading", 40, "Descargando audio...")
+        a.publish()
+        assert b.get_summary("s")["status"] == "in_progress"
+
+        b.cancel_session("s")
+        assert not a.is_cancelled("s")
+        a.publish()
+        await asyncio.sleep(0)
+
+        assert a.is_cancelled("s")
+        assert cancelled == ["s"]
+        assert a.stats()["state"]["remote_cancels"] == 1
+        # El estado final publicado lo ve cualquier worker
+        a.publish()
+        progress = b.get_progress("s")
+        assert progress["status"] == "cancelled"
+        assert progress["song_progress"]["x"]["status"] == "cancelled"
+
+    asyncio.run(main())
+
+
+def test_worker_that_lost_its_lease_stops_the_session(backend_factory):
+    async def main():
+        a = worker(backend_factory)
+        b = worker(backend_factory)
+        stopped = []
+        a.add_cancel_handler(stopped.append)
+
+        a.create_session("s", 2)
+        a.update_song_progress("s", "x", "downloading", 40, "Descargando audio...")
+        a.publish()
+
+        # A se queda parado más que el lease y B reanuda la sesión
+        a.state.delete(_owner_key("s"))
+        assert b.claim_session("s")
+        b.restore_session("s", 2, {}, "in_progress", None, "2024-01-01T00:00:00")
+        b.update_song_progress("s", "x", "completed", 100, "Completado")
+        b.publish()
+
+        a._last_renewal = 0
+        a.publish()
+        await asyncio.sleep(0)
+
+        assert stopped == ["s"]
+        assert a.is_cancelled("s")
+        assert not a.is_local("s")
+        # A ya no escribe en el estado compartido; lo que se lee es de B
+        a.update_song_progress("s", "x", "error", 0, "Error")
+        a.publish()
+        assert a.get_progress("s")["song_progress"]["x"]["status"] == "completed"
+        assert a.state.get(_owner_key("s")) == b.worker_id
+
+    asyncio.run(main())
+
+
+class CountingBackend(MemoryStateBackend):
+    """Cuenta las lecturas de hashes por clave y las consultas de valores"""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = {}
+        self.value_queries = 0
+
+    def hgetall(self, key):
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().hgetall(key)
+
+    def get(self, key):
+        self.value_queries += 1
+        return super().get(key)
+
+    def mget(self, *keys):
+        self.value_queries += 1
+        return super().mget(*keys)
+
+
+def test_publish_reads_cancel_flags_in_one_query():
+    shared = CountingBackend()
+    manager = ProgressManager(state=shared, flush_interval=3600)
+    manager._stopped = True
+    for i in range(50):
+        manager.create_session(f"s{i}", 1)
+    manager._last_renewal = 0
+    manager.publish()
+
+    shared.value_queries = 0
+    manager.publish()
+    # Sin renovar: una sola consulta para las 50 sesiones
+    assert shared.value_queries == 1
+
+    shared.value_queries = 0
+    manager._last_renewal = 0
+    manager.publish()
+    # Al renovar, una más para los dueños
+    assert shared.value_queries == 2
+    assert all(manager.is_local(f"s{i}") for i in range(50))
+
+
+def test_remote_polling_reads_songs_only_when_the_session_changed():
+    shared = CountingBackend()
+    owner = ProgressManager(state=shared, flush_interval=3600)
+    owner._stopped = True
+    reader = ProgressManager(state=shared, flush_interval=3600)
+    reader._stopped = True
+
+    owner.create_session("s", 100)
+    for i in range(100):
+        owner.update_song_progress("s", f"song{i}", "queued", 20, "En cola para descargar...")
+    owner.publish()
+
+    epoch, cursor, snapshot = reader.changes_since("s")
+    assert epoch == owner.epoch and len(snapshot["songs"]) == 100
+
+    shared.reads.clear()
+    for _ in range(10):
+        assert reader.changes_since("s", cursor, epoch) == (epoch, cursor, {})
+    assert shared.reads == {"progress:s": 10}
+
+    owner.update_song_progress("s", "song7", "downloading", 50, "Descargando audio...")
+    owner.publish()
+    epoch, cursor, delta = reader.changes_since("s", cursor, epoch)
+    assert list(delta["songs"]) == ["song7"]
+    assert shared.reads["progress:s:songs"] == 1
+
+    # Un cursor de otro worker (o de antes de un reinicio) recibe una instantánea
+    _, _, snapshot = reader.changes_since("s", cursor, "otro-epoch")
+    assert len(snapshot["songs"]) == 100
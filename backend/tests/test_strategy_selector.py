@@ -0,0 +1,121 @@
+"""Orden adaptativo de estrategias con una descarga falsa que falla en las elegidas"""
+import asyncio
+import time
+
+import pytest
+from yt_dlp.utils import DownloadError
+
+from api import routes
+from utils import retry_handler
+from utils.job_scheduler import RetryLater
+from utils.rate_limiter import CircuitBreaker
+from utils.retry_handler import RetryHandler
+from utils.strategy_selector import StrategySelector
+
+STRATEGIES = [{"name": "web"}, {"name": "android"}, {"name": "ios"}]
+
+
+class FakeDownload:
+    """Falla con un 403 en las estrategias bloqueadas y registra cada intento"""
+
+    def __init__(self, blocked=(), latency=0.0):
+        self.blocked = set(blocked)
+        self.latency = latency
+        self.attempts = []
+
+    def __call__(self, youtube_url, strategy, **kwargs):
+        self.attempts.append(strategy["name"])
+        time.sleep(self.latency)
+        if strategy["name"] in self.blocked:
+            raise DownloadError("ERROR: HTTP Error 403: Forbidden")
+        return f"{youtube_url}@{strategy['name']}"
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(retry_handler, "STRATEGY_RETRY_DELAY", 0)
+
+
+def handler(selector, **kwargs):
+    return RetryHandler(selector=selector, breaker=CircuitBreaker(1000, 30), **kwargs)
+
+
+def test_blocked_strategy_moves_down_the_order():
+    selector = StrategySelector(STRATEGIES, exploration=0.1)
+    download = FakeDownload(blocked={"web"})
+    retry = handler(selector)
+
+    for i in range(10):
+        assert retry.execute_with_retry(download, f"url{i}") == f"url{i}@android"
+
+    # Solo los primeros intentos pagan el fallo de web
+    assert download.attempts[:2] == ["web", "android"]
+    assert download.attempts[-1] == "android"
+    assert download.attempts.count("web") <= 2
+    assert [s["name"] for s in selector.ordered()][0] == "android"
+
+
+def test_faster_strategy_wins_a_tie_in_success_rate():
+    selector = StrategySelector(STRATEGIES, exploration=0.0)
+    for _ in range(5):
+        selector.record("web", True, 2.0)
+        selector.record("ios", True, 0.5)
+    assert [s["name"] for s in selector.ordered()][:2] == ["ios", "web"]
+
+
+def test_stale_failures_stop_counting():
+    selector = StrategySelector(STRATEGIES, window_seconds=0.05, half_life=0.01, exploration=0.0)
+    for _ in range(5):
+        selector.record("web", False, 0.1)
+    assert selector.ordered()[0]["name"] != "web"
+
+    time.sleep(0.1)
+    # Fuera de la ventana: vuelve al orden configurado
+    assert [s["name"] for s in selector.ordered()] == ["web", "android", "ios"]
+    assert selector.stats()[0] == {
+        "name": "web", "rank": 0, "samples": 0, "success_rate": None, "avg_latency_seconds": 0.0,
+    }
+
+
+def test_deferred_retry_continues_with_the_remaining_strategies():
+    selector = StrategySelector(STRATEGIES, exploration=0.0)
+    download = FakeDownload(blocked={"web", "android"})
+    retry = handler(selector, defer_retries=True)
+
+    with pytest.raises(RetryLater) as first:
+        retry.execute_with_retry(download, "url")
+    assert [s["name"] for s in first.value.kwargs["strategies"]] == ["android", "ios"]
+
+    later = first.value
+    with pytest.raises(RetryLater) as second:
+        later.func(*later.args, **later.kwargs)
+    later = second.value
+    assert later.func(*later.args, **later.kwargs) == "url@ios"
+    assert download.attempts == ["web", "android", "ios"]
+
+
+def test_other_errors_are_not_retried():
+    selector = StrategySelector(STRATEGIES)
+
+    def broken(youtube_url, strategy, **kwargs):
+        raise DownloadError("ERROR: Video unavailable")
+
+    with pytest.raises(DownloadError):
+        handler(selector).execute_with_retry(broken, "url")
+    assert [s["samples"] for s in selector.stats()] == [0, 0, 0]
+
+
+def test_stats_endpoint_reports_order_and_success_rate(monkeypatch):
+    selector = StrategySelector(STRATEGIES, exploration=0.0)
+    retry = handler(selector)
+    download = FakeDownload(blocked={"web"})
+    for i in range(4):
+        retry.execute_with_retry(download, f"url{i}")
+    monkeypatch.setattr(routes, "strategy_selector", selector)
+
+    stats = asyncio.run(routes.get_strategy_stats())
+    by_name = {s["name"]: s for s in stats}
+    assert stats[0]["name"] == "android"
+    assert by_name["android"]["success_rate"] == 1.0
+    assert by_name["web"]["success_rate"] == 0.0
+    assert [s["rank"] for s in stats] == [0, 1, 2]
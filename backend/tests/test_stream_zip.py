@@ -0,0 +1,54 @@
+"""ZIP en streaming de una sesión en curso"""
+import asyncio
+import io
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.zipper import iter_session_files, stream_zip
+
+
+def test_live_stream_follows_the_session_without_holding_threads(tmp_path):
+    (tmp_path / "a.mp3").write_bytes(b"first")
+    finished = threading.Event()
+
+    async def main():
+        wakeup = asyncio.Event()
+        chunks = []
+
+        async def consume():
+            files = iter_session_files(tmp_path, finished.is_set, wakeup=wakeup, poll_interval=30)
+            async for chunk in stream_zip(files, chunk_size=2):
+                chunks.append(chunk)
+
+        # Un solo hilo en el pool: si el generador lo retuviera al esperar, nada más podría usarlo
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), 1) == "free"
+        # El aviso de cambios despierta al generador sin esperar poll_interval
+        (tmp_path / "b.mp3").write_bytes(b"second")
+        finished.set()
+        started = time.monotonic()
+        wakeup.set()
+        await asyncio.wait_for(consumer, 5)
+        return b"".join(chunks), time.monotonic() - started
+
+    data, elapsed = asyncio.run(main())
+    assert elapsed < 1
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.namelist() == ["a.mp3", "b.mp3"]
+        assert zipf.read("b.mp3") == b"second"
+
+
+def test_finished_session_streams_existing_files(tmp_path):
+    for name in ("x.mp3", "y.m4a", "notes.txt"):
+        (tmp_path / name).write_bytes(name.encode())
+
+    async def main():
+        files = iter_session_files(tmp_path, lambda: True)
+        return b"".join([chunk async for chunk in stream_zip(files)])
+
+    with zipfile.ZipFile(io.BytesIO(asyncio.run(main()))) as zipf:
+        assert zipf.namelist() == ["x.mp3", "y.m4a"]
@@ -0,0 +1,57 @@
+"""Opciones base de yt-dlp: copia temporal de las cookies y valores anidados por llamada"""
+import os
+import time
+
+import pytest
+
+import config
+from config import YdlOptionsManager
+
+
+def test_cookie_refresh_overwrites_a_single_copy(tmp_path):
+    cookies = tmp_path / "cookies.txt"
+    manager = YdlOptionsManager([str(cookies)], check_interval=0)
+    copies = set()
+    try:
+        for i in range(3):
+            cookies.write_text(f"# Netscape HTTP Cookie File\n# version {i}\n")
+            stamp = time.time() + i
+            os.utime(cookies, (stamp, stamp))
+            opts = manager.get()
+            copies.add(opts["cookiefile"])
+            with open(opts["cookiefile"]) as f:
+                assert f"version {i}" in f.read()
+
+        assert manager.refreshes == 3
+        [copy] = copies
+        # Sin restos de escrituras intermedias junto a la copia
+        leftovers = [
+            name for name in os.listdir(os.path.dirname(copy))
+            if name.endswith(".part") and os.path.getmtime(os.path.join(os.path.dirname(copy), name)) >= stamp - 5
+        ]
+        assert leftovers == []
+    finally:
+        manager.cleanup()
+    assert not os.path.exists(copy)
+
+
+def test_nested_options_are_copied_for_each_caller(tmp_path, monkeypatch):
+    def base_opts():
+        return {
+            "quiet": True,
+            "http_headers": {"Accept-Language": "es"},
+            "postprocessors": [{"key": "FFmpegExtractAudio"}],
+        }
+
+    monkeypatch.setattr(config, "_build_base_ydl_opts", base_opts)
+    manager = YdlOptionsManager([str(tmp_path / "missing.txt")], check_interval=3600)
+    first = manager.get()
+    with pytest.raises(TypeError):
+        first["quiet"] = False
+    first["http_headers"]["Accept-Language"] = "en"
+    first["postprocessors"].append({"key": "FFmpegMetadata"})
+
+    second = manager.get()
+    assert second["http_headers"] == {"Accept-Language": "es"}
+    assert second["postprocessors"] == [{"key": "FFmpegExtractAudio"}]
+    assert manager.refreshes == 0 and manager.version == 1
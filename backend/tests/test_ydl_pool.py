@@ -0,0 +1,65 @@
+"""Pool de YoutubeDL: reutilización, hooks por préstamo y plantilla de salida"""
+from services.ydl_pool import YDLPool
+
+STRATEGY = {"name": "test"}
+INFO = {"id": "abc", "title": "Song", "ext": "m4a"}
+
+
+def build_opts():
+    return {"quiet": True, "no_warnings": True}
+
+
+def hook_dispatcher(ydl):
+    # El único hook registrado en la instancia (opción pública progress_hooks)
+    [dispatch] = ydl.params["progress_hooks"]
+    return dispatch
+
+
+def test_instances_are_reused_per_thread_and_purpose():
+    pool = YDLPool()
+    with pool.checkout("download", STRATEGY, build_opts) as first:
+        pass
+    with pool.checkout("download", STRATEGY, build_opts) as second:
+        pass
+    with pool.checkout("search", STRATEGY, build_opts) as other:
+        pass
+    assert first is second and other is not first
+    assert pool.stats() == {"instances": 2, "created": 2, "reused": 1, "fresh": 0}
+    pool.close_all()
+
+
+def test_progress_hooks_only_apply_to_their_checkout():
+    pool = YDLPool()
+    calls = []
+    with pool.checkout("download", STRATEGY, build_opts, progress_hooks=[calls.append]) as ydl:
+        hook_dispatcher(ydl)({"status": "downloading"})
+    with pool.checkout("download", STRATEGY, build_opts) as ydl:
+        hook_dispatcher(ydl)({"status": "finished"})
+    assert calls == [{"status": "downloading"}]
+    pool.close_all()
+
+
+def test_output_template_changes_per_checkout(tmp_path):
+    pool = YDLPool()
+    with pool.checkout("download", STRATEGY, build_opts, outtmpl=str(tmp_path / "a.%(ext)s")) as ydl:
+        assert ydl.prepare_filename(INFO) == str(tmp_path / "a.m4a")
+    with pool.checkout("download", STRATEGY, build_opts, outtmpl=str(tmp_path / "b.%(ext)s")) as ydl:
+        assert ydl.prepare_filename(INFO) == str(tmp_path / "b.m4a")
+    pool.close_all()
+
+
+def test_unknown_template_layout_falls_back_to_a_fresh_instance(tmp_path):
+    pool = YDLPool()
+    with pool.checkout("download", STRATEGY, build_opts) as pooled:
+        # Como si otra versión de yt-dlp guardara la plantilla de otra forma
+        pooled.params["outtmpl"] = "%(title)s.%(ext)s"
+
+    calls = []
+    outtmpl = str(tmp_path / "c.%(ext)s")
+    with pool.checkout("download", STRATEGY, build_opts, outtmpl, [calls.append]) as ydl:
+        assert ydl is not pooled
+        assert ydl.prepare_filename(INFO) == str(tmp_path / "c.m4a")
+        ydl.params["progress_hooks"][0]({"status": "finished"})
+    assert calls == [{"status": "finished"}]
+    assert pool.stats()["fresh"] == 1
+    pool.close_all()
@@ -0,0 +1,110 @@
+"""Búsqueda adaptativa: caché, resultados pedidos al extractor y métricas"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from config import SEARCH_RESULTS_INITIAL, SEARCH_RESULTS_MAX
+from models.song import Song
+from services import youtube_client
+from services.match_scoring import MatchTarget
+from services.search_cache import search_cache
+from utils.job_scheduler import JobScheduler
+from utils.rate_limiter import TokenBucket
+
+TARGET = MatchTarget("Numb", "Linkin Park", 185000)
+GOOD = {"id": "ok", "title": "Numb", "channel": "Linkin Park - Topic", "duration": 185}
+
+
+def unrelated(count, offset=0):
+    return [
+        {"id": f"x{i}", "title": f"Unrelated {i}", "channel": "Someone", "duration": 600}
+        for i in range(offset, offset + count)
+    ]
+
+
+class StubExtractor:
+    """
+    Responde ytsearchN:consulta con los N primeros resultados de la lista,
+    o solo con los de playlist_items ("a-b") si las opciones lo fijan
+    """
+
+    def __init__(self, results, params):
+        self.results = results
+        self.params = params
+        self.requested = []
+
+    def extract_info(self, url, download=False):
+        count = int(url[len("ytsearch"):].split(":", 1)[0])
+        start, end = 1, count
+        if self.params.get("playlist_items"):
+            start, end = map(int, self.params["playlist_items"].split("-"))
+        self.requested.append((count, start))
+        return {"entries": self.results[:count][start - 1:end]}
+
+
+@pytest.fixture
+def search(monkeypatch):
+    def run(results):
+        requested = []
+
+        @contextmanager
+        def checkout(purpose, strategy, build_opts, **kwargs):
+            stub = StubExtractor(results, build_opts())
+            stub.requested = requested
+            yield stub
+
+        metrics = youtube_client.SearchMetrics()
+        monkeypatch.setattr(youtube_client.ydl_pool, "checkout", checkout)
+        monkeypatch.setattr(youtube_client, "search_metrics", metrics)
+        video_id = youtube_client._search_video_id("Numb", "Linkin Park", TARGET)
+        return video_id, requested, metrics
+
+    return run
+
+
+def test_confident_first_page_does_not_widen(search):
+    video_id, requested, metrics = search([GOOD] + unrelated(20))
+    assert video_id == "ok"
+    assert requested == [(SEARCH_RESULTS_INITIAL, 1)]
+    assert metrics.stats() == {"searches": 1, "widened": 0, "results_per_search": SEARCH_RESULTS_INITIAL}
+
+
+def test_widening_fetches_only_the_new_results(search):
+    results = unrelated(SEARCH_RESULTS_INITIAL) + [GOOD] + unrelated(20, offset=100)
+    video_id, requested, metrics = search(results)
+    assert video_id == "ok"
+    # La búsqueda ampliada empieza detrás de la primera página
+    assert requested == [(SEARCH_RESULTS_INITIAL, 1), (SEARCH_RESULTS_MAX, SEARCH_RESULTS_INITIAL + 1)]
+    # Cada resultado se devuelve (y puntúa) una sola vez
+    assert metrics.stats() == {"searches": 1, "widened": 1, "results_per_search": SEARCH_RESULTS_MAX}
+
+
+def test_short_first_page_does_not_widen(search):
+    video_id, requested, metrics = search(unrelated(SEARCH_RESULTS_INITIAL - 1))
+    assert requested == [(SEARCH_RESULTS_INITIAL, 1)]
+    assert metrics.stats()["widened"] == 0
+
+
+def test_cached_songs_skip_the_search_rate_limiter(monkeypatch):
+    songs = [Song(id=f"track{i}", title=f"Song {i}", artist="Artist", query=f"Song {i} Artist") for i in range(40)]
+    for i, song in enumerate(songs):
+        search_cache.set(song.query, f"video{i:06d}", song.id)
+
+    def search_youtube(*args, **kwargs):
+        raise AssertionError("un acierto de la caché no debe llegar a yt-dlp")
+
+    async def main():
+        # Un token por segundo: cualquier búsqueda encolada tardaría segundos
+        scheduler = JobScheduler({"search": 1}, limiters={"search": TokenBucket(rate=1, capacity=1)})
+        monkeypatch.setattr(youtube_client, "job_scheduler", scheduler)
+        monkeypatch.setattr(youtube_client, "search_youtube", search_youtube)
+        started = time.monotonic()
+        urls = await asyncio.gather(*(youtube_client.find_youtube_url(song, "s") for song in songs))
+        return urls, time.monotonic() - started, scheduler.stats()["search"]
+
+    urls, elapsed, stats = asyncio.run(main())
+    assert urls == [youtube_client.youtube_watch_url(f"video{i:06d}") for i in range(40)]
+    assert stats["submitted"] == 0
+    assert elapsed < 1
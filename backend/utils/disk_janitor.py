@@ -0,0 +1,452 @@
+"""
+Limpieza periódica del directorio de descargas.
+
+Cada sesión deja en downloads/ un directorio con sus canciones y un ZIP. El
+conserje los borra en segundo plano:
+
+- El directorio de una sesión terminada en cuanto su ZIP existe (o, si no
+  hay ZIP porque falló o se canceló, cuando tiene más de JANITOR_MIN_AGE).
+- Los ZIP ya descargados tras JANITOR_DOWNLOADED_GRACE (margen para
+  reintentos del navegador) y los que superan JANITOR_ZIP_TTL.
+- Si aun así el total supera JANITOR_MAX_BYTES, lo que más puntúa por
+  antigüedad × tamaño.
+
+Nunca toca las sesiones en curso ni las que se están enviando al cliente.
+Cada pasada recorre el directorio en un hilo y borra de una entrada en una,
+también en un hilo, así que no bloquea el event loop.
+
+Con varios workers (uvicorn --workers N) sobre el mismo directorio, el
+estado se comparte en downloads/.janitor/ con bloqueos de archivo, que el
+sistema libera solo si el proceso muere:
+
+- Un worker que descarga o envía una sesión tiene un bloqueo compartido
+  sobre <session_id>.active; el conserje no borra lo que no puede bloquear
+  en exclusiva.
+- Un ZIP descargado por completo deja <session_id>.downloaded.
+- Solo el worker que tiene el bloqueo de "leader" hace las pasadas; si
+  muere, lo toma otro en su siguiente intento.
+
+Sin fcntl (Windows) solo se conocen las sesiones del propio proceso.
+"""
+import asyncio
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import (
+    DOWNLOADS_DIR,
+    JANITOR_MAX_BYTES,
+    JANITOR_INTERVAL,
+    JANITOR_ZIP_TTL,
+    JANITOR_DOWNLOADED_GRACE,
+    JANITOR_MIN_AGE,
+)
+from utils.progress_manager import progress_manager
+
+# Subdirectorio con los bloqueos y marcas compartidos entre workers
+STATE_DIR_NAME = ".janitor"
+# Intentos (cada 10 ms) de tomar el bloqueo compartido de una sesión
+HOLD_ATTEMPTS = 5
+
+
+class _Entry:
+    """Un ZIP (o ZIP a medias) o el directorio de una sesión"""
+
+    __slots__ = ("kind", "session_id", "path", "size", "mtime")
+
+    def __init__(self, kind: str, session_id: str, path: Path, size: int, mtime: float):
+        self.kind = kind
+        self.session_id = session_id
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+def _dir_size(path: Path) -> int:
+    """
+    Bytes propios de un directorio. Los archivos con más de un enlace son
+    hardlinks del almacén de audio: borrarlos no libera espacio, no cuentan.
+    """
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_nlink == 1:
+                            total += stat.st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class DiskJanitor:
+    """Conserje del directorio de descargas con cuota, retención y métricas"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = JANITOR_MAX_BYTES,
+        interval: float = JANITOR_INTERVAL,
+        zip_ttl: float = JANITOR_ZIP_TTL,
+        downloaded_grace: float = JANITOR_DOWNLOADED_GRACE,
+        min_age: float = JANITOR_MIN_AGE
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.zip_ttl = zip_ttl
+        self.downloaded_grace = downloaded_grace
+        self.min_age = min_age
+        self.passes = 0
+        self.reclaimed_bytes = 0
+        self.deleted: Dict[str, int] = {"zip": 0, "dir": 0}
+        self.usage_bytes = 0
+        self.last_pass_seconds = 0.0
+        self.is_leader = fcntl is None
+        self.state_dir = self.root / STATE_DIR_NAME
+        self._lock = threading.Lock()
+        # Sesiones en uso por este proceso (session_id -> usos) y su bloqueo compartido
+        self._in_use: Dict[str, int] = {}
+        self._hold_files: Dict[str, IO] = {}
+        self._leader_file: Optional[IO] = None
+        # ZIP descargados por completo (session_id -> instante)
+        self._downloaded: Dict[str, float] = {}
+        # Tamaño de los directorios por (ruta, mtime): solo se recorren si cambian
+        self._sizes: Dict[Path, Tuple[float, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _state_file(self, session_id: str, suffix: str) -> Path:
+        return self.state_dir / f"{session_id}.{suffix}"
+
+    def hold(self, session_id: str):
+        """
+        Protege los archivos de una sesión mientras se descarga o se envía.
+
+        Puede esperar a que el conserje suelte la sesión: desde el event loop,
+        usar hold_async.
+        """
+        with self._lock:
+            count = self._in_use.get(session_id, 0)
+            self._in_use[session_id] = count + 1
+            if count or fcntl is None:
+                return
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            hold_file = open(self._state_file(session_id, "active"), "a")
+        except OSError as e:
+            print(f"⚠️ No se pudo marcar la sesión {session_id} como en uso: {str(e)}")
+            return
+        # El conserje solo tiene el bloqueo exclusivo un instante al
+        # comprobarla; si dura más es que la está borrando ahora. Se espera
+        # sin _lock para no frenar los release de otras sesiones
+        for _ in range(HOLD_ATTEMPTS):
+            try:
+                fcntl.flock(hold_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                time.sleep(0.01)
+                continue
+            except OSError:
+                break
+            with self._lock:
+                # Si ya se liberó (o la volvió a tomar otro hold) sobra este bloqueo
+                if session_id in self._in_use and session_id not in self._hold_files:
+                    self._hold_files[session_id] = hold_file
+                    return
+            break
+        hold_file.close()
+
+    async def hold_async(self, session_id: str):
+        """
+        hold desde el event loop: el bloqueo de archivo se toma en un hilo.
+        Si se cancela la espera, el uso se libera en cuanto el hilo termina.
+        """
+        task = asyncio.ensure_future(asyncio.to_thread(self.hold, session_id))
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            task.add_done_callback(lambda _: self.release(session_id))
+            raise
+
+    def release(self, session_id: str, downloaded: bool = False):
+        """Termina un uso; con downloaded=True el ZIP ya se puede borrar tras el margen"""
+        with self._lock:
+            remaining = self._in_use.get(session_id, 0) - 1
+            if remaining > 0:
+                self._in_use[session_id] = remaining
+            else:
+                self._in_use.pop(session_id, None)
+                hold_file = self._hold_files.pop(session_id, None)
+                if hold_file is not None:
+                    hold_file.close()
+            if downloaded:
+                self._downloaded.setdefault(session_id, time.time())
+        if downloaded and fcntl is not None:
+            try:
+                self._state_file(session_id, "downloaded").touch(exist_ok=True)
+            except OSError:
+                pass
+
+    def _held_elsewhere(self, session_id: str) -> bool:
+        """Si algún proceso (este incluido) tiene la sesión en uso"""
+        if fcntl is None:
+            return False
+        try:
+            with open(self._state_file(session_id, "active"), "a") as hold_file:
+                fcntl.flock(hold_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def _elect(self) -> bool:
+        """Intenta ser el único conserje del directorio (se conserva hasta que el proceso muere)"""
+        if fcntl is None or self._leader_file is not None:
+            return True
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            leader_file = open(self.state_dir / "leader", "a")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        return True
+
+    def _scan(self) -> List[_Entry]:
+        """Entradas del directorio de descargas con su tamaño (en un hilo)"""
+        entries = []
+        sizes = {}
+        try:
+            scan = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return entries
+        for entry in scan:
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if entry.is_dir(follow_symlinks=False):
+                    path = Path(entry.path)
+                    cached = self._sizes.get(path)
+                    size = cached[1] if cached and cached[0] == stat.st_mtime else _dir_size(path)
+                    sizes[path] = (stat.st_mtime, size)
+                    entries.append(_Entry("dir", entry.name, path, size, stat.st_mtime))
+                elif entry.name.endswith((".zip", ".zip.part")):
+                    session_id = entry.name.split(".zip", 1)[0]
+                    entries.append(_Entry("zip", session_id, Path(entry.path), stat.st_size, stat.st_mtime))
+            except FileNotFoundError:
+                continue
+        # Olvida los directorios que ya no existen
+        self._sizes = sizes
+        return entries
+
+    def _shared_marks(self, entries: List[_Entry]) -> Dict[str, float]:
+        """
+        ZIP descargados según las marcas de todos los workers; borra las marcas
+        de sesiones que ya no tienen archivos y nadie usa.
+        """
+        downloaded = {}
+        sessions = {e.session_id for e in entries}
+        try:
+            marks = list(os.scandir(self.state_dir))
+        except FileNotFoundError:
+            return downloaded
+        for mark in marks:
+            session_id, _, kind = mark.name.rpartition(".")
+            if kind not in ("active", "downloaded"):
+                continue
+            if session_id not in sessions:
+                if not self._held_elsewhere(session_id):
+                    Path(mark.path).unlink(missing_ok=True)
+                continue
+            if kind == "downloaded":
+                try:
+                    downloaded[session_id] = mark.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+        return downloaded
+
+    def _remove(self, entry: _Entry):
+        if entry.kind == "dir":
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            entry.path.unlink(missing_ok=True)
+
+    def plan(
+        self,
+        entries: List[_Entry],
+        now: float,
+        shared_downloaded: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[_Entry, str]]:
+        """Elige qué borrar y por qué, de lo obligatorio a lo necesario para la cuota"""
+        with self._lock:
+            in_use = set(self._in_use)
+            downloaded = {**(shared_downloaded or {}), **self._downloaded}
+
+        zipped = {e.session_id for e in entries if e.kind == "zip" and e.path.suffix == ".zip"}
+        active: Dict[str, bool] = {}
+
+        def is_active(session_id: str) -> bool:
+            if session_id not in active:
+                active[session_id] = (
+                    session_id in in_use
+                    or self._held_elsewhere(session_id)
+                    or progress_manager.get_summary(session_id).get("status") == "in_progress"
+                )
+            return active[session_id]
+
+        removals = []
+        kept = []
+        for entry in entries:
+            age = now - entry.mtime
+            if is_active(entry.session_id):
+                continue
+            if entry.kind == "dir":
+                if entry.session_id in zipped:
+                    removals.append((entry, "zipped"))
+                elif age >= self.min_age:
+                    removals.append((entry, "unfinished"))
+                else:
+                    kept.append(entry)
+            elif entry.path.suffix != ".zip":
+                # .zip.part de una sesión que ya no está en curso
+                if age >= self.min_age:
+                    removals.append((entry, "unfinished"))
+                else:
+                    kept.append(entry)
+            elif entry.session_id in downloaded and now - downloaded[entry.session_id] >= self.downloaded_grace:
+                removals.append((entry, "downloaded"))
+            elif age >= self.zip_ttl:
+                removals.append((entry, "expired"))
+            else:
+                kept.append(entry)
+
+        usage = sum(e.size for e in entries) - sum(e.size for e, _ in removals)
+        if usage > self.max_bytes:
+            # Lo más antiguo y grande primero; lo recién terminado se respeta
+            candidates = sorted(
+                (e for e in kept if now - e.mtime >= self.min_age),
+                key=lambda e: (now - e.mtime) * e.size,
+                reverse=True
+            )
+            for entry in candidates:
+                if usage <= self.max_bytes:
+                    break
+                removals.append((entry, "quota"))
+                usage -= entry.size
+        return removals
+
+    def _prepare(self) -> Tuple[List[_Entry], List[Tuple[_Entry, str]]]:
+        entries = self._scan()
+        return entries, self.plan(entries, time.time(), self._shared_marks(entries))
+
+    def _remove_unless_held(self, entry: _Entry) -> bool:
+        """Borra una entrada si nadie ha empezado a usar su sesión desde que se planificó"""
+        with self._lock:
+            if entry.session_id in self._in_use:
+                return False
+        if fcntl is None:
+            self._remove(entry)
+            return True
+        try:
+            hold_file = open(self._state_file(entry.session_id, "active"), "a")
+        except OSError:
+            self._remove(entry)
+            return True
+        with hold_file:
+            try:
+                # Con el bloqueo exclusivo nadie puede empezar a usarla mientras se borra
+                fcntl.flock(hold_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            self._remove(entry)
+        return True
+
+    async def run_once(self) -> int:
+        """Una pasada de limpieza; devuelve los bytes liberados (0 si otro worker es el conserje)"""
+        self.is_leader = await asyncio.to_thread(self._elect)
+        if not self.is_leader:
+            return 0
+        started = time.monotonic()
+        # El estado de las sesiones puede venir del almacén compartido: también en el hilo
+        entries, removals = await asyncio.to_thread(self._prepare)
+
+        reclaimed = 0
+        for entry, reason in removals:
+            # Puede haber empezado un envío desde que se planificó
+            if not await asyncio.to_thread(self._remove_unless_held, entry):
+                continue
+            reclaimed += entry.size
+            self.deleted[entry.kind] += 1
+            if entry.kind == "zip":
+                with self._lock:
+                    self._downloaded.pop(entry.session_id, None)
+            print(f"🧹 Eliminado {entry.path.name} ({entry.size / 1e6:.1f} MB, {reason})")
+
+        self.reclaimed_bytes += reclaimed
+        self.usage_bytes = sum(e.size for e in entries) - reclaimed
+        self.passes += 1
+        self.last_pass_seconds = time.monotonic() - started
+        return reclaimed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"⚠️ Error limpiando el directorio de descargas: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Arranca las pasadas periódicas en el event loop actual"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Otro worker puede tomar el relevo
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_use = len(self._in_use)
+        return {
+            "usage_bytes": self.usage_bytes,
+            "max_bytes": self.max_bytes,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "deleted_zips": self.deleted["zip"],
+            "deleted_dirs": self.deleted["dir"],
+            "sessions_in_use": in_use,
+            "leader": self.is_leader,
+            "passes": self.passes,
+            "last_pass_seconds": round(self.last_pass_seconds, 3),
+        }
+
+
+# Global disk janitor instance
+disk_janitor = DiskJanitor(DOWNLOADS_DIR)
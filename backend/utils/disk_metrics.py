@@ -0,0 +1,50 @@
+"""
+Contador de bytes escritos en disco por canción.
+
+Cada conversión registra lo que escribió según el modo usado: "file"
+(yt-dlp guarda el audio original y FFmpeg lo lee y escribe el resultado) o
+"pipe" (los bytes se envían directamente a FFmpeg y solo se escribe el
+resultado). Así se puede comparar el coste en disco de ambos modos.
+"""
+import threading
+from typing import Any, Dict
+
+
+class DiskWriteMeter:
+    """Bytes escritos por canción, separados por modo de conversión"""
+
+    def __init__(self):
+        self._modes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, output_bytes: int, intermediate_bytes: int = 0):
+        """
+        Registra una canción convertida.
+
+        Args:
+            mode: "file" o "pipe"
+            output_bytes: Tamaño del archivo final
+            intermediate_bytes: Bytes de archivos temporales (audio original)
+        """
+        with self._lock:
+            totals = self._modes.setdefault(mode, {"songs": 0, "output_bytes": 0, "intermediate_bytes": 0})
+            totals["songs"] += 1
+            totals["output_bytes"] += output_bytes
+            totals["intermediate_bytes"] += intermediate_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                mode: {
+                    **totals,
+                    "bytes_written_per_song": (
+                        (totals["output_bytes"] + totals["intermediate_bytes"]) // totals["songs"]
+                        if totals["songs"] else 0
+                    ),
+                }
+                for mode, totals in self._modes.items()
+            }
+
+
+# Global disk write meter instance
+disk_writes = DiskWriteMeter()
@@ -0,0 +1,315 @@
+"""
+Diario persistente de sesiones de descarga.
+
+Registra en SQLite (modo WAL) cada sesión con su lista de canciones y las
+transiciones de estado de cada canción, para que tras un reinicio del
+servidor se pueda reconstruir el progreso y reanudar las sesiones que
+quedaron a medias.
+
+Las escrituras no se hacen en el momento: se acumulan en memoria (solo el
+último estado de cada canción) y un hilo las vuelca en una única transacción
+cada JOB_JOURNAL_FLUSH_INTERVAL segundos. Con synchronous=NORMAL, WAL solo
+sincroniza con el disco en los checkpoints, así que actualizar el progreso
+no añade latencia de fsync.
+
+Cada sesión guarda además qué proceso la descarga, con un lease que el hilo
+de volcado renueva. Los workers de un nodo comparten el archivo, así que sin
+un almacén de estado compartido es el diario el que decide quién reanuda
+cada sesión tras un reinicio (ver claim).
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    JOB_JOURNAL_PATH,
+    JOB_JOURNAL_FLUSH_INTERVAL,
+    JOB_JOURNAL_RETENTION,
+    SESSION_LEASE_SECONDS,
+)
+
+
+class JobJournal:
+    """Diario SQLite de sesiones y canciones con escrituras agrupadas"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        flush_interval: float = JOB_JOURNAL_FLUSH_INTERVAL,
+        retention: float = JOB_JOURNAL_RETENTION,
+        lease: float = SESSION_LEASE_SECONDS
+    ):
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.lease = lease
+        # Dueño de las sesiones que registra o reclama este proceso
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.flushes = 0
+        self.rows_written = 0
+        self.claims = 0
+        self._last_renewal = 0.0
+        # _lock protege los cambios pendientes; _db_lock la conexión, para que
+        # registrar un cambio nunca espere a que termine un volcado
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Cambios pendientes de volcar (el último estado gana)
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._songs: Dict[Tuple[str, str], Tuple[str, int, str, float]] = {}
+        self._forgotten: set[str] = set()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " songs TEXT NOT NULL,"
+                " output_format TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " download_url TEXT,"
+                " created_at TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " owner TEXT,"
+                " owner_expires REAL)"
+            )
+            # Diarios creados antes de guardar el dueño de cada sesión
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            for column, kind in (("owner", "TEXT"), ("owner_expires", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS songs ("
+                " session_id TEXT NOT NULL,"
+                " song_id TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " percentage INTEGER NOT NULL,"
+                " message TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, song_id))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _start(self):
+        """Arranca el hilo de volcado la primera vez que hay algo que escribir"""
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name="job-journal", daemon=True)
+            self._thread.start()
+
+    def record_session(
+        self,
+        session_id: str,
+        songs: List[Dict[str, Any]],
+        output_format: str,
+        created_at: str
+    ):
+        """Registra una sesión nueva con las canciones necesarias para reanudarla"""
+        with self._lock:
+            self._forgotten.discard(session_id)
+            self._sessions[session_id] = {
+                "songs": json.dumps(songs),
+                "output_format": output_format,
+                "status": "in_progress",
+                "download_url": None,
+                "created_at": created_at,
+            }
+            self._start()
+
+    def session_status(self, session_id: str, status: str, download_url: Optional[str] = None):
+        with self._lock:
+            pending = self._sessions.setdefault(session_id, {})
+            pending["status"] = status
+            pending["download_url"] = download_url
+            self._start()
+
+    def song_state(self, session_id: str, song_id: str, status: str, percentage: int, message: str):
+        with self._lock:
+            self._songs[(session_id, song_id)] = (status, percentage, message, time.time())
+            self._start()
+
+    def forget(self, session_id: str):
+        """Elimina una sesión del diario"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            for key in [k for k in self._songs if k[0] == session_id]:
+                del self._songs[key]
+            self._forgotten.add(session_id)
+            self._start()
+
+    def claim(self, session_id: str) -> bool:
+        """
+        Reclama una sesión del diario para reanudarla en este proceso.
+
+        Solo gana un proceso: el UPDATE condicional es atómico en SQLite y
+        únicamente prospera si la sesión no tiene dueño, ya es de este
+        proceso o el lease del anterior caducó.
+        """
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE sessions SET owner = ?, owner_expires = ? WHERE session_id = ?"
+                    " AND (owner IS NULL OR owner = ? OR owner_expires < ?)",
+                    (self.owner, now + self.lease, session_id, self.owner, now)
+                ).rowcount > 0
+        if claimed:
+            self.claims += 1
+            # El hilo de volcado renueva el lease mientras el proceso vive
+            with self._lock:
+                self._start()
+        return claimed
+
+    def _renew(self, conn: sqlite3.Connection, now: float):
+        """Renueva los leases de las sesiones en curso de este proceso"""
+        conn.execute(
+            "UPDATE sessions SET owner_expires = ? WHERE owner = ? AND status = 'in_progress'",
+            (now + self.lease, self.owner)
+        )
+        self._last_renewal = now
+
+    def flush(self):
+        """Vuelca los cambios pendientes en una sola transacción"""
+        with self._db_lock:
+            with self._lock:
+                sessions, self._sessions = self._sessions, {}
+                songs, self._songs = self._songs, {}
+                forgotten, self._forgotten = self._forgotten, set()
+
+            now = time.time()
+            renew = now - self._last_renewal >= self.lease / 3
+            if not (sessions or songs or forgotten or renew):
+                return
+
+            conn = self._connect()
+            with conn:
+                if renew:
+                    self._renew(conn, now)
+                for session_id in forgotten:
+                    conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                    conn.execute("DELETE FROM songs WHERE session_id = ?", (session_id,))
+
+                for session_id, fields in sessions.items():
+                    if "songs" in fields:
+                        # La sesión nueva es de quien la registra
+                        conn.execute(
+                            "INSERT OR REPLACE INTO sessions"
+                            " (session_id, songs, output_format, status, download_url, created_at, updated_at,"
+                            " owner, owner_expires)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (
+                                session_id, fields["songs"], fields["output_format"], fields["status"],
+                                fields["download_url"], fields["created_at"], now,
+                                self.owner, now + self.lease
+                            )
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE sessions SET status = ?, download_url = ?, updated_at = ?"
+                            " WHERE session_id = ?",
+                            (fields["status"], fields["download_url"], now, session_id)
+                        )
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO songs"
+                    " (session_id, song_id, status, percentage, message, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(sid, song_id, *state) for (sid, song_id), state in songs.items()]
+                )
+
+            if sessions or songs or forgotten:
+                self.flushes += 1
+                self.rows_written += len(sessions) + len(songs) + len(forgotten)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Error escribiendo el diario de sesiones: {str(e)}")
+
+    def close(self):
+        """
+        Vuelca lo pendiente, libera las sesiones de este proceso (para que el
+        siguiente arranque las reanude sin esperar al lease) y detiene el
+        hilo (al apagar la aplicación).
+        """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE sessions SET owner = NULL, owner_expires = NULL WHERE owner = ?", (self.owner,)
+                    )
+                self._conn.close()
+                self._conn = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        Sesiones guardadas (más recientes que la retención) con el último
+        estado de sus canciones. Las más antiguas se borran del diario.
+        """
+        self.flush()
+        cutoff = time.time() - self.retention
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+                conn.execute(
+                    "DELETE FROM songs WHERE session_id NOT IN (SELECT session_id FROM sessions)"
+                )
+
+            sessions = []
+            for session_id, songs, output_format, status, download_url, created_at in conn.execute(
+                "SELECT session_id, songs, output_format, status, download_url, created_at FROM sessions"
+            ).fetchall():
+                song_progress = {
+                    song_id: {"status": s, "percentage": p, "message": m}
+                    for song_id, s, p, m in conn.execute(
+                        "SELECT song_id, status, percentage, message FROM songs WHERE session_id = ?",
+                        (session_id,)
+                    )
+                }
+                sessions.append({
+                    "session_id": session_id,
+                    "songs": json.loads(songs),
+                    "output_format": output_format,
+                    "status": status,
+                    "download_url": download_url,
+                    "created_at": created_at,
+                    "song_progress": song_progress,
+                })
+            return sessions
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._sessions) + len(self._songs) + len(self._forgotten)
+        return {
+            "pending_rows": pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "claims": self.claims,
+            "flush_interval_seconds": self.flush_interval,
+        }
+
+
+# Global job journal instance
+job_journal = JobJournal(JOB_JOURNAL_PATH)
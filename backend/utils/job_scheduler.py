@@ -0,0 +1,280 @@
+"""
+Planificador global de trabajos con reparto equitativo entre sesiones.
+
+Cada etapa (búsqueda, descarga, conversión) tiene su propio límite de
+concurrencia y una cola por sesión. Cuando queda un hueco libre, la etapa
+atiende a las sesiones en round-robin, de modo que una playlist de 1.000
+canciones no acapara los workers mientras otros usuarios esperan.
+
+Una etapa puede tener además un limitador de ritmo y un circuit breaker: si
+alguno no deja pasar trabajos, la etapa se reprograma con un temporizador del
+event loop en lugar de bloquear un hilo con sleep. Del mismo modo, un trabajo
+que lanza RetryLater vuelve a su cola tras la espera indicada.
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+from config import SEARCH_CONCURRENCY, DOWNLOAD_CONCURRENCY, TRANSCODE_CONCURRENCY
+from utils.rate_limiter import (
+    TokenBucket,
+    CircuitBreaker,
+    search_limiter,
+    download_limiter,
+    youtube_breaker,
+)
+
+
+class JobCancelled(Exception):
+    """El trabajo se descartó antes de ejecutarse porque su sesión fue cancelada"""
+
+
+class RetryLater(Exception):
+    """
+    Lanzada por un trabajo para pedir que se reintente func(*args, **kwargs)
+    pasados `delay` segundos, sin ocupar un hilo mientras tanto.
+    """
+
+    def __init__(self, delay: float, func: Callable, *args, **kwargs):
+        super().__init__(f"Reintento en {delay}s")
+        self.delay = delay
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+class _Job:
+    __slots__ = ("future", "session_id", "func", "args", "kwargs", "enqueued_at", "probe")
+
+    def __init__(self, future: asyncio.Future, session_id: str, func: Callable, args: Tuple, kwargs: Dict):
+        self.future = future
+        self.session_id = session_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.probe = False
+
+
+class _Stage:
+    """Colas por sesión y contadores de una etapa del planificador"""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.limit = limit
+        self.limiter = limiter
+        self.breaker = breaker
+        self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"stage-{name}")
+        self.queues: Dict[str, Deque[_Job]] = {}
+        # Orden round-robin de las sesiones con trabajos pendientes
+        self.turns: Deque[str] = deque()
+        # Trabajos esperando un reintento diferido
+        self.delayed: Set[_Job] = set()
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.running = 0
+        self.submitted = 0
+        self.finished = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def enqueue(self, job: _Job):
+        if job.session_id not in self.queues:
+            self.queues[job.session_id] = deque()
+            self.turns.append(job.session_id)
+        self.queues[job.session_id].append(job)
+
+    def stats(self) -> Dict[str, Any]:
+        started = self.finished + self.running
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": self.queued(),
+            "queued_by_session": {sid: len(q) for sid, q in self.queues.items()},
+            "delayed_retries": len(self.delayed),
+            "submitted": self.submitted,
+            "finished": self.finished,
+            "retries": self.retries,
+            "avg_wait_seconds": round(self.total_wait / started, 4) if started else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
+
+
+class JobScheduler:
+    """Reparte la ejecución de trabajos bloqueantes entre sesiones de forma equitativa"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        limiters: Optional[Dict[str, TokenBucket]] = None,
+        breakers: Optional[Dict[str, CircuitBreaker]] = None
+    ):
+        limiters = limiters or {}
+        breakers = breakers or {}
+        self.stages: Dict[str, _Stage] = {
+            name: _Stage(name, max(1, limit), limiters.get(name), breakers.get(name))
+            for name, limit in limits.items()
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, stage: str, session_id: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Encola func(*args, **kwargs) en la etapa indicada y espera su resultado.
+
+        Args:
+            stage: Nombre de la etapa ("search", "download", "transcode")
+            session_id: Sesión a la que pertenece el trabajo
+            func: Función bloqueante a ejecutar en el pool de la etapa
+
+        Returns:
+            Resultado de la función
+        """
+        self._loop = asyncio.get_running_loop()
+        st = self.stages[stage]
+        job = _Job(self._loop.create_future(), session_id, func, args, kwargs)
+
+        st.enqueue(job)
+        st.submitted += 1
+
+        self._dispatch(st)
+        return await job.future
+
+    def cancel_session(self, session_id: str):
+        """Descarta los trabajos pendientes de una sesión en todas las etapas"""
+        for st in self.stages.values():
+            jobs = list(st.queues.pop(session_id, ()))
+            if session_id in st.turns:
+                st.turns.remove(session_id)
+
+            delayed = [job for job in st.delayed if job.session_id == session_id]
+            st.delayed.difference_update(delayed)
+
+            for job in jobs + delayed:
+                if not job.future.done():
+                    job.future.set_exception(JobCancelled(f"Sesión {session_id} cancelada"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: st.stats() for name, st in self.stages.items()}
+
+    def _admit(self, st: _Stage) -> Tuple[float, bool]:
+        """Consulta el circuit breaker y el limitador de la etapa"""
+        probe = False
+        if st.breaker:
+            delay, probe = st.breaker.before_request()
+            if delay:
+                return delay, False
+
+        if st.limiter:
+            delay = st.limiter.try_acquire()
+            if delay:
+                if probe:
+                    st.breaker.after_request()
+                return delay, False
+
+        return 0.0, probe
+
+    def _schedule_wakeup(self, st: _Stage, delay: float):
+        when = self._loop.time() + delay
+        if st.wakeup is not None:
+            if st.wakeup.when() <= when:
+                return
+            st.wakeup.cancel()
+
+        def wakeup():
+            st.wakeup = None
+            self._dispatch(st)
+
+        st.wakeup = self._loop.call_at(when, wakeup)
+
+    def _dispatch(self, st: _Stage):
+        while st.running < st.limit and st.turns:
+            delay, probe = self._admit(st)
+            if delay:
+                self._schedule_wakeup(st, delay)
+                return
+
+            session_id = st.turns.popleft()
+            queue = st.queues[session_id]
+            job = queue.popleft()
+
+            # La sesión vuelve al final de la ronda si le quedan trabajos
+            if queue:
+                st.turns.append(session_id)
+            else:
+                del st.queues[session_id]
+
+            if job.future.done():
+                if probe:
+                    st.breaker.after_request()
+                continue
+
+            wait = time.monotonic() - job.enqueued_at
+            st.total_wait += wait
+            st.max_wait = max(st.max_wait, wait)
+            st.running += 1
+            job.probe = probe
+
+            task = self._loop.run_in_executor(st.executor, lambda j=job: j.func(*j.args, **j.kwargs))
+            task.add_done_callback(lambda t, j=job: self._on_done(st, j, t))
+
+    def _on_done(self, st: _Stage, job: _Job, task: asyncio.Future):
+        st.running -= 1
+        st.finished += 1
+        if job.probe:
+            st.breaker.after_request()
+            job.probe = False
+
+        error = None if task.cancelled() else task.exception()
+
+        if isinstance(error, RetryLater) and not job.future.done():
+            # Reprogramar sin ocupar un hilo durante la espera
+            st.retries += 1
+            job.func, job.args, job.kwargs = error.func, error.args, error.kwargs
+            st.delayed.add(job)
+            self._loop.call_later(error.delay, self._requeue, st, job)
+        elif not job.future.done():
+            if task.cancelled():
+                job.future.cancel()
+            elif error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(task.result())
+
+        self._dispatch(st)
+
+    def _requeue(self, st: _Stage, job: _Job):
+        if job not in st.delayed:
+            # La sesión se canceló durante la espera
+            return
+        st.delayed.discard(job)
+        job.enqueued_at = time.monotonic()
+        st.enqueue(job)
+        self._dispatch(st)
+
+
+# Global scheduler instance
+job_scheduler = JobScheduler(
+    {
+        "search": SEARCH_CONCURRENCY,
+        "download": DOWNLOAD_CONCURRENCY,
+        "transcode": TRANSCODE_CONCURRENCY,
+    },
+    limiters={
+        "search": search_limiter,
+        "download": download_limiter,
+    },
+    breakers={
+        "download": youtube_breaker,
+    }
+)
@@ -1,81 +1,802 @@
 """
 Progress tracking manager using in-memory storage
-Replaces WebSocket with HTTP polling
+Served by HTTP polling and by a Server-Sent Events stream of deltas
+State transitions are also recorded in the job journal so sessions survive a restart
+
+Sessions are kept in compact slotted records (status codes instead of
+nested dicts of strings) behind a lock. Finished sessions are evicted after
+PROGRESS_SESSION_TTL seconds (checked every PROGRESS_EVICT_INTERVAL) and at
+most PROGRESS_MAX_SESSIONS are kept: running sessions are never evicted, so
+new sessions are refused while all of them are still running.
+
+With a shared state backend (STATE_BACKEND) the sessions this worker runs
+are also published there every STATE_FLUSH_INTERVAL seconds, so any worker
+or node can answer progress queries. Each running session is owned by one
+worker through a lease in the backend; cancelling from another worker sets
+a flag that the owner picks up on its next publish. A worker that finds its
+lease taken by another worker (after a stall longer than the lease) stops
+its copy of the session without touching the shared state.
 """
-from typing import Dict, Any
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
+from config import (
+    PROGRESS_UPDATES_PER_SECOND,
+    PROGRESS_SESSION_TTL,
+    PROGRESS_MAX_SESSIONS,
+    PROGRESS_EVICT_INTERVAL,
+    STATE_FLUSH_INTERVAL,
+    SESSION_LEASE_SECONDS,
+)
+from utils.job_journal import JobJournal, job_journal
+from utils.job_scheduler import JobCancelled
+from utils.state_backend import StateBackend, state_backend
+
+# Song and session statuses are stored as small integer codes
+STATUSES: Tuple[str, ...] = (
+    "started", "searching", "queued", "downloading", "converting",
+    "completed", "error", "cancelled", "in_progress", "failed",
+)
+STATUS_CODES: Dict[str, int] = {status: code for code, status in enumerate(STATUSES)}
+FINISHED_SONG_CODES = {STATUS_CODES["completed"], STATUS_CODES["error"]}
+IN_PROGRESS = STATUS_CODES["in_progress"]
+
+
+class SessionLimitReached(Exception):
+    """All PROGRESS_MAX_SESSIONS sessions are still running"""
+
+
+def _status_code(status: str) -> int:
+    try:
+        return STATUS_CODES[status]
+    except KeyError:
+        raise ValueError(f"Estado de progreso desconocido: {status}") from None
+
+
+class _Song:
+    __slots__ = ("status", "percentage", "message", "seq")
+
+    def __init__(self, status: int, percentage: int, message: str, seq: int = 0):
+        self.status = status
+        self.percentage = percentage
+        # Most messages repeat across songs ("Completado", "En cola..."), so share them
+        self.message = sys.intern(message)
+        # Sequence number of the last change (for SSE deltas)
+        self.seq = seq
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"status": STATUSES[self.status], "percentage": self.percentage, "message": self.message}
+
+
+class _Session:
+    __slots__ = (
+        "total_songs", "completed_songs", "current_song", "songs", "status",
+        "download_url", "created_at", "cancelled", "seq", "changed_at", "published",
+    )
+
+    def __init__(self, total_songs: int, created_at: str):
+        self.total_songs = total_songs
+        self.completed_songs = 0
+        self.current_song = ""
+        # Ordered by last change: every update moves its song to the end, so
+        # the dict doubles as the change index of the session
+        self.songs: Dict[str, _Song] = {}
+        self.status = IN_PROGRESS
+        self.download_url: Optional[str] = None
+        self.created_at = created_at
+        self.cancelled = False
+        # Each change gets the next sequence number; songs and the session
+        # fields keep the number of their last change, so rapid updates to a
+        # song coalesce into one and no separate change log is stored
+        self.seq = 0
+        self.changed_at = 0
+        # Sequence already published to the state backend (-1: nothing yet)
+        self.published = -1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_songs": self.total_songs,
+            "completed_songs": self.completed_songs,
+            "current_song": self.current_song,
+            "status": STATUSES[self.status],
+            "download_url": self.download_url,
+            "created_at": self.created_at,
+            "cancelled": self.cancelled,
+        }
+
+
+def _progress_key(session_id: str) -> str:
+    return f"progress:{session_id}"
+
+
+def _songs_key(session_id: str) -> str:
+    return f"progress:{session_id}:songs"
+
+
+def _owner_key(session_id: str) -> str:
+    return f"owner:{session_id}"
+
+
+def _cancel_key(session_id: str) -> str:
+    return f"cancel:{session_id}"
+
+
+def _song_dict(state: list) -> Dict[str, Any]:
+    """Song state as published in the backend: [status, percentage, message, seq]"""
+    return {"status": state[0], "percentage": state[1], "message": state[2]}
+
 
 class ProgressManager:
-    def __init__(self):
-        # Store progress data by session_id
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+    def __init__(
+        self,
+        journal: Optional[JobJournal] = None,
+        session_ttl: float = PROGRESS_SESSION_TTL,
+        max_sessions: int = PROGRESS_MAX_SESSIONS,
+        state: Optional[StateBackend] = None,
+        flush_interval: float = STATE_FLUSH_INTERVAL,
+        lease: float = SESSION_LEASE_SECONDS
+    ):
+        # Store progress data by session_id (oldest first)
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.journal = journal
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        # Finished sessions by finish time, for TTL eviction
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._subscribers: Dict[str, set] = {}
+        self._lock = threading.RLock()
+        self.evicted = 0
+        # Cursors are only valid within one process (sequences restart from 0)
+        self.epoch = os.urandom(4).hex()
+        
+        # Shared state (None: progress only lives in this process)
+        self.state = state
+        self.flush_interval = flush_interval
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{self.epoch}"
+        self.publishes = 0
+        self.remote_cancels = 0
+        self.lost_leases = 0
+        # Sessions taken over by another worker (session_id -> when), so
+        # the local downloads still see them as cancelled
+        self._disowned: Dict[str, float] = {}
+        self._dirty: set[str] = set()
+        self._removed: set[str] = set()
+        self._cancel_handlers: List[Tuple[asyncio.AbstractEventLoop, Callable[[str], None]]] = []
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._last_renewal = 0.0
+        self._eviction_task: Optional[asyncio.Task] = None
+    
+    def _touch(self, session: _Session, song_id: Optional[str] = None):
+        """Record that a song (or the session fields) changed; call with the lock held"""
+        session.seq += 1
+        if song_id is None:
+            session.changed_at = session.seq
+        else:
+            # Move the song to the end: songs stay ordered by seq
+            song = session.songs.pop(song_id)
+            song.seq = session.seq
+            session.songs[song_id] = song
+    
+    @staticmethod
+    def _songs_since(session: _Session, cursor: int) -> Iterator[Tuple[str, _Song]]:
+        """Songs changed after cursor, newest first; only walks the changed ones"""
+        for song_id, song in reversed(session.songs.items()):
+            if song.seq <= cursor:
+                break
+            yield song_id, song
+    
+    def _notify(self, session_id: str):
+        """Wake up the subscribers of a session; call without the lock"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        for loop, event in subscribers:
+            # Updates may come from worker threads
+            loop.call_soon_threadsafe(event.set)
+    
+    def _changed(self, session_id: str):
+        """Queue a session for the next publish; call with the lock held"""
+        if self.state is not None:
+            self._dirty.add(session_id)
+            self._start_publisher()
+    
+    def _start_publisher(self):
+        """Start the publisher thread the first time there is something to write"""
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name="progress-publisher", daemon=True)
+            self._thread.start()
+    
+    def _finish(self, session_id: str):
+        """Start the TTL of a finished session; call with the lock held"""
+        self._finished[session_id] = time.monotonic()
+        self._finished.move_to_end(session_id)
+    
+    def _evict(self) -> List[str]:
+        """
+        Drop finished sessions past their TTL and, above max_sessions, the
+        oldest finished ones. Running sessions are never dropped: their
+        downloads would keep going with nowhere to report. Call with the
+        lock held.
+        """
+        evicted = []
+        now = time.monotonic()
+        while self._finished:
+            session_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.session_ttl and len(self.sessions) <= self.max_sessions:
+                break
+            self._finished.popitem(last=False)
+            if self.sessions.pop(session_id, None) is not None:
+                evicted.append(session_id)
+        
+        while self._disowned:
+            session_id, disowned_at = next(iter(self._disowned.items()))
+            if now - disowned_at < self.session_ttl:
+                break
+            del self._disowned[session_id]
+        
+        self.evicted += len(evicted)
+        return evicted
+    
+    def _forget(self, session_ids: List[str]):
+        """Remove evicted sessions from the journal and the state backend, and end their streams"""
+        for session_id in session_ids:
+            if self.journal:
+                self.journal.forget(session_id)
+            if self.state is not None:
+                with self._lock:
+                    self._dirty.discard(session_id)
+                    self._removed.add(session_id)
+                    self._start_publisher()
+            self._notify(session_id)
+    
+    def publish(self):
+        """
+        Write the changes of this worker's sessions to the state backend,
+        renew the leases of the running ones and apply cancellations made
+        from other workers. Runs in the publisher thread.
+        """
+        if self.state is None:
+            return
+        
+        writes = []
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            removed, self._removed = self._removed, set()
+            for session_id in dirty:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    continue
+                fields = {k: json.dumps(v) for k, v in session.summary().items()}
+                fields.update(seq=str(session.seq), changed_at=str(session.changed_at), epoch=self.epoch)
+                songs = {
+                    song_id: json.dumps([STATUSES[song.status], song.percentage, song.message, song.seq])
+                    for song_id, song in self._songs_since(session, session.published)
+                }
+                session.published = session.seq
+                writes.append((session_id, fields, songs))
+            running = [sid for sid, session in self.sessions.items() if session.status == IN_PROGRESS]
+        
+        for session_id in removed:
+            self.state.delete(
+                _progress_key(session_id), _songs_key(session_id),
+                _owner_key(session_id), _cancel_key(session_id)
+            )
+        for session_id, fields, songs in writes:
+            self.state.hset(_progress_key(session_id), fields)
+            self.state.expire(_progress_key(session_id), self.session_ttl)
+            if songs:
+                self.state.hset(_songs_key(session_id), songs)
+                self.state.expire(_songs_key(session_id), self.session_ttl)
+        
+        renew = time.monotonic() - self._last_renewal >= self.lease / 3
+        if renew:
+            self._last_renewal = time.monotonic()
+        # One round trip for every cancel flag (and owner, when renewing)
+        cancelled = self.state.mget(*(_cancel_key(sid) for sid in running))
+        owners = self.state.mget(*(_owner_key(sid) for sid in running)) if renew else [None] * len(running)
+        for session_id, cancel, owner in zip(running, cancelled, owners):
+            if cancel:
+                self.remote_cancels += 1
+                self.cancel_session(session_id)
+                for loop, handler in self._cancel_handlers:
+                    loop.call_soon_threadsafe(handler, session_id)
+            elif renew:
+                if owner == self.worker_id:
+                    self.state.set(_owner_key(session_id), self.worker_id, ex=self.lease)
+                elif owner is not None or not self.state.set(
+                    _owner_key(session_id), self.worker_id, ex=self.lease, nx=True
+                ):
+                    print(f"⚠️ La sesión {session_id} ahora pertenece a otro worker; se detiene aquí")
+                    self._disown(session_id)
+                    continue
+                # Sessions without updates must not expire while they run
+                self.state.expire(_progress_key(session_id), self.session_ttl)
+                self.state.expire(_songs_key(session_id), self.session_ttl)
+        self.publishes += 1
+    
+    def _disown(self, session_id: str):
+        """
+        Stop a session another worker has taken over: the local downloads end
+        as if it were cancelled, but the journal and the shared state now
+        belong to the new owner and are left alone. Progress queries are
+        answered from the shared state from now on.
+        """
+        with self._lock:
+            if self.sessions.pop(session_id, None) is None:
+                return
+            self._finished.pop(session_id, None)
+            self._dirty.discard(session_id)
+            self._disowned[session_id] = time.monotonic()
+            self.lost_leases += 1
+        for loop, handler in self._cancel_handlers:
+            loop.call_soon_threadsafe(handler, session_id)
+        self._notify(session_id)
+    
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"⚠️ Error publicando el progreso en el almacén compartido: {str(e)}")
+    
+    def close(self):
+        """
+        Publish pending changes and release the leases of the running
+        sessions, so the next start can resume them without waiting for
+        the leases to expire (on application shutdown).
+        """
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.state is None:
+            return
+        self.publish()
+        with self._lock:
+            running = [sid for sid, session in self.sessions.items() if session.status == IN_PROGRESS]
+        for session_id in running:
+            if self.state.get(_owner_key(session_id)) == self.worker_id:
+                self.state.delete(_owner_key(session_id))
+        self.state.close()
+    
+    def claim_session(self, session_id: str) -> bool:
+        """
+        Take ownership of a session (to resume it after a restart). Only one
+        worker wins. Without a shared backend the claim is taken in the job
+        journal, which the workers of a node share.
+        """
+        if self.state is None:
+            return self.journal.claim(session_id) if self.journal else True
+        return (
+            self.state.set(_owner_key(session_id), self.worker_id, ex=self.lease, nx=True)
+            or self.state.get(_owner_key(session_id)) == self.worker_id
+        )
+    
+    def add_cancel_handler(self, handler: Callable[[str], None]):
+        """Call handler(session_id) on the current event loop when another worker cancels one of our sessions"""
+        self._cancel_handlers.append((asyncio.get_running_loop(), handler))
+    
+    def is_local(self, session_id: str) -> bool:
+        """Whether this worker holds the session (otherwise it is read from the state backend)"""
+        return session_id in self.sessions
+    
+    def _remote_summary(self, session_id: str) -> Optional[Tuple[Dict[str, Any], str, int, int]]:
+        """Overall fields of a session published by another worker: (summary, epoch, seq, changed_at)"""
+        if self.state is None:
+            return None
+        fields = self.state.hgetall(_progress_key(session_id))
+        if not fields:
+            return None
+        epoch = fields.pop("epoch", self.epoch)
+        seq = int(fields.pop("seq"))
+        changed_at = int(fields.pop("changed_at"))
+        return {k: json.loads(v) for k, v in fields.items()}, epoch, seq, changed_at
+    
+    def _remote_songs(self, session_id: str) -> Dict[str, list]:
+        """Songs of a session published by another worker: [status, percentage, message, seq]"""
+        return {k: json.loads(v) for k, v in self.state.hgetall(_songs_key(session_id)).items()}
+    
+    def subscribe(self, session_id: str) -> Tuple[asyncio.AbstractEventLoop, asyncio.Event]:
+        """Register an event that is set whenever the session changes"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, session_id: str, subscriber: Tuple[asyncio.AbstractEventLoop, asyncio.Event]):
+        with self._lock:
+            subscribers = self._subscribers.get(session_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[session_id]
+    
+    def changes_since(
+        self,
+        session_id: str,
+        cursor: int = 0,
+        epoch: Optional[str] = None
+    ) -> Tuple[str, int, Optional[Dict[str, Any]]]:
+        """
+        Get what changed in a session after the given sequence number.
+        
+        Sequence numbers belong to the epoch of the worker running the
+        session; a cursor from another epoch (a restart, or the session
+        moved to another worker) is treated as 0.
+        
+        Returns:
+            (epoch, sequence, delta): delta has "session" (overall fields,
+            if they changed) and "songs" (only the songs that changed). A
+            cursor of 0 returns a full snapshot. delta is None if the
+            session is gone.
+        """
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return self._remote_changes(session_id, cursor, epoch)
+            
+            if cursor <= 0 or cursor > session.seq or epoch not in (None, self.epoch):
+                return self.epoch, session.seq, {
+                    "session": session.summary(),
+                    "songs": {song_id: song.as_dict() for song_id, song in session.songs.items()},
+                }
+            
+            delta: Dict[str, Any] = {}
+            if session.changed_at > cursor:
+                delta["session"] = session.summary()
+            songs = {song_id: song.as_dict() for song_id, song in self._songs_since(session, cursor)}
+            if songs:
+                delta["songs"] = songs
+            return self.epoch, session.seq, delta
+    
+    def _remote_changes(
+        self,
+        session_id: str,
+        cursor: int,
+        epoch: Optional[str]
+    ) -> Tuple[str, int, Optional[Dict[str, Any]]]:
+        remote = self._remote_summary(session_id)
+        if remote is None:
+            return epoch or self.epoch, cursor, None
+        summary, remote_epoch, seq, changed_at = remote
+        if epoch not in (None, remote_epoch):
+            cursor = 0
+        
+        # Nothing new since the last poll: the songs are not read
+        if 0 < cursor == seq:
+            return remote_epoch, seq, {}
+        
+        songs = self._remote_songs(session_id)
+        if cursor <= 0 or cursor > seq:
+            return remote_epoch, seq, {
+                "session": summary,
+                "songs": {song_id: _song_dict(state) for song_id, state in songs.items()},
+            }
+        
+        delta: Dict[str, Any] = {}
+        if changed_at > cursor:
+            delta["session"] = summary
+        changed = {song_id: _song_dict(state) for song_id, state in songs.items() if state[3] > cursor}
+        if changed:
+            delta["songs"] = changed
+        return remote_epoch, seq, delta
     
     def create_session(self, session_id: str, total_songs: int):
-        """Initialize a new download session"""
-        self.sessions[session_id] = {
-            "total_songs": total_songs,
-            "completed_songs": 0,
-            "current_song": "",
-            "song_progress": {},
-            "status": "in_progress",
-            "download_url": None,
-            "created_at": datetime.now().isoformat(),
-            "cancelled": False
-        }
+        """
+        Initialize a new download session.
+        
+        Raises:
+            SessionLimitReached: If max_sessions sessions are still running
+        """
+        with self._lock:
+            self.sessions.pop(session_id, None)
+            self._finished.pop(session_id, None)
+            session = _Session(total_songs, datetime.now().isoformat())
+            self.sessions[session_id] = session
+            evicted = self._evict()
+            full = len(self.sessions) > self.max_sessions
+            if full:
+                del self.sessions[session_id]
+            else:
+                self._touch(session)
+                self._changed(session_id)
+        self._forget(evicted)
+        if full:
+            raise SessionLimitReached(
+                f"Hay {self.max_sessions} descargas en curso; inténtalo de nuevo en unos minutos"
+            )
+        if self.state is not None:
+            # The worker that accepted the download owns the session
+            self.state.set(_owner_key(session_id), self.worker_id, ex=self.lease)
+        self._notify(session_id)
     
-    def update_song_progress(self, session_id: str, song_id: str, status: str, percentage: int = 0, message: str = ""):
-        """Update progress for a specific song"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["song_progress"][song_id] = {
-                "status": status,
-                "percentage": percentage,
-                "message": message
+    def restore_session(
+        self,
+        session_id: str,
+        total_songs: int,
+        song_progress: Dict[str, Dict[str, Any]],
+        status: str,
+        download_url: Optional[str],
+        created_at: str
+    ):
+        """Rebuild a session from the job journal after a restart"""
+        with self._lock:
+            session = _Session(total_songs, created_at)
+            session.songs = {
+                # A status this version does not know is retried like an error
+                song_id: _Song(STATUS_CODES.get(p["status"], STATUS_CODES["error"]), p["percentage"], p["message"])
+                for song_id, p in song_progress.items()
             }
+            session.completed_songs = sum(
+                1 for song in session.songs.values() if song.status in FINISHED_SONG_CODES
+            )
+            session.status = _status_code(status)
+            session.download_url = download_url
+            session.cancelled = status == "cancelled"
+            self.sessions[session_id] = session
+            if session.status != IN_PROGRESS:
+                self._finish(session_id)
+            self._touch(session)
+            self._changed(session_id)
+            evicted = self._evict()
+        self._forget(evicted)
+    
+    def update_song_progress(self, session_id: str, song_id: str, status: str, percentage: int = 0, message: str = ""):
+        """Update progress for a specific song (ignored once the session has ended)"""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            # Late updates from transfers still winding down after a cancel
+            # must not overwrite the final state (nor reach the journal)
+            if session is None or session.status != IN_PROGRESS:
+                return
+            code = _status_code(status)
+            song = session.songs.get(song_id)
+            if song is None:
+                song = session.songs[song_id] = _Song(code, percentage, message)
+            else:
+                song.status = code
+                song.percentage = percentage
+                song.message = sys.intern(message)
+            self._touch(session, song_id)
+            self._changed(session_id)
+        if self.journal:
+            self.journal.song_state(session_id, song_id, status, percentage, message)
+        self._notify(session_id)
     
     def update_session_progress(self, session_id: str, completed_songs: int, current_song: str = ""):
-        """Update overall session progress"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["completed_songs"] = completed_songs
-            self.sessions[session_id]["current_song"] = current_song
+        """Update overall session progress (ignored once the session has ended)"""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or session.status != IN_PROGRESS:
+                return
+            session.completed_songs = completed_songs
+            session.current_song = current_song
+            self._touch(session)
+            self._changed(session_id)
+        self._notify(session_id)
+    
+    def _end_session(self, session_id: str, status: str, current_song: str, download_url: Optional[str] = None) -> bool:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            session.status = STATUS_CODES[status]
+            session.current_song = current_song
+            if download_url is not None:
+                session.download_url = download_url
+            if status == "cancelled":
+                session.cancelled = True
+                # Update individual songs
+                cancelled = STATUS_CODES["cancelled"]
+                for song_id, song in list(session.songs.items()):
+                    if song.status not in FINISHED_SONG_CODES:
+                        song.status = cancelled
+                        song.message = "Cancelado por el usuario"
+                        self._touch(session, song_id)
+            self._touch(session)
+            self._changed(session_id)
+            self._finish(session_id)
+        if self.journal:
+            self.journal.session_status(session_id, status, download_url)
+        self._notify(session_id)
+        return True
     
     def complete_session(self, session_id: str, download_url: str):
         """Mark session as complete"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["status"] = "completed"
-            self.sessions[session_id]["download_url"] = download_url
-            self.sessions[session_id]["current_song"] = ""
+        self._end_session(session_id, "completed", "", download_url)
 
     def fail_session(self, session_id: str):
         """Mark session as failed"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["status"] = "failed"
-            self.sessions[session_id]["current_song"] = "Todas las descargas fallaron"
+        self._end_session(session_id, "failed", "Todas las descargas fallaron")
+    
+    def cancel_session(self, session_id: str):
+        """Mark session as cancelled (if another worker owns it, ask it to cancel)"""
+        if not self._end_session(session_id, "cancelled", "Descarga cancelada por el usuario") and self.state is not None:
+            self.state.set(_cancel_key(session_id), "1", ex=self.session_ttl)
     
     def get_progress(self, session_id: str) -> Dict[str, Any]:
         """Get current progress for a session"""
-        return self.sessions.get(session_id, {})
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                progress = session.summary()
+                progress["song_progress"] = {song_id: song.as_dict() for song_id, song in session.songs.items()}
+                return progress
+        
+        remote = self._remote_summary(session_id)
+        if remote is None:
+            return {}
+        summary = remote[0]
+        summary["song_progress"] = {
+            song_id: _song_dict(state) for song_id, state in self._remote_songs(session_id).items()
+        }
+        return summary
     
-    def cancel_session(self, session_id: str):
-        """Mark session as cancelled"""
-        if session_id in self.sessions:
-            self.sessions[session_id]["status"] = "cancelled"
-            self.sessions[session_id]["cancelled"] = True
-            self.sessions[session_id]["current_song"] = "Descarga cancelada por el usuario"
-            
-            # Update individual songs
-            for song_id, progress in self.sessions[session_id]["song_progress"].items():
-                if progress["status"] not in ["completed", "error"]:
-                    self.sessions[session_id]["song_progress"][song_id]["status"] = "cancelled"
-                    self.sessions[session_id]["song_progress"][song_id]["message"] = "Cancelado por el usuario"
+    def get_summary(self, session_id: str) -> Dict[str, Any]:
+        """Overall session fields without song_progress (constant cost)"""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                return session.summary()
+        remote = self._remote_summary(session_id)
+        return remote[0] if remote is not None else {}
+    
+    def song_reporter(self, session_id: str, song_id: str, start: int = 30, end: int = 90) -> "SongProgressReporter":
+        """Throttled byte-level progress reporter for a song (create it on the event loop)"""
+        return SongProgressReporter(self, session_id, song_id, start, end)
     
     def is_cancelled(self, session_id: str) -> bool:
-        """Check if session is cancelled"""
-        return self.sessions.get(session_id, {}).get("cancelled", False)
+        """Check if session is cancelled (or was taken over by another worker)"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return session_id in self._disowned
+        return session.cancelled
     
     def cleanup_session(self, session_id: str):
         """Remove session data (call after download is retrieved)"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        with self._lock:
+            self.sessions.pop(session_id, None)
+            self._finished.pop(session_id, None)
+        # Also wakes up the streams so they notice the session is gone
+        self._forget([session_id])
+    
+    def evict_expired(self) -> int:
+        """Drop finished sessions past their TTL; returns how many were removed"""
+        with self._lock:
+            evicted = self._evict()
+        self._forget(evicted)
+        return len(evicted)
+    
+    async def _run_eviction(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # The journal and the state backend may block: off the loop
+                await asyncio.to_thread(self.evict_expired)
+            except Exception as e:
+                print(f"⚠️ Error descartando sesiones caducadas: {str(e)}")
+    
+    def start_eviction(self, interval: float = PROGRESS_EVICT_INTERVAL):
+        """Evict expired sessions periodically on the current event loop"""
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._run_eviction(interval))
+    
+    async def stop_eviction(self):
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "finished_sessions": len(self._finished),
+                "songs": sum(len(session.songs) for session in self.sessions.values()),
+                "evicted": self.evicted,
+                "session_ttl_seconds": self.session_ttl,
+                "max_sessions": self.max_sessions,
+                "state": {
+                    **self.state.stats(),
+                    "worker_id": self.worker_id,
+                    "publishes": self.publishes,
+                    "remote_cancels": self.remote_cancels,
+                    "lost_leases": self.lost_leases,
+                } if self.state is not None else None,
+            }
+
+class SongProgressReporter:
+    """
+    Throttled byte-level progress for one song.
+    
+    Download callbacks (yt-dlp's progress hook or the pipe transcoders) fire
+    many times per second from worker threads. The reporter drops updates
+    that arrive faster than PROGRESS_UPDATES_PER_SECOND and hands the rest
+    to the event loop with call_soon_threadsafe, so ProgressManager is only
+    ever modified from the loop thread.
+    
+    Once the session is cancelled the reporter raises JobCancelled, which
+    aborts the transfer that is calling it (async or pipe transfer, or
+    yt-dlp download).
+    """
+    
+    def __init__(
+        self,
+        manager: "ProgressManager",
+        session_id: str,
+        song_id: str,
+        start: int = 30,
+        end: int = 90,
+        updates_per_second: float = PROGRESS_UPDATES_PER_SECOND
+    ):
+        self.manager = manager
+        self.session_id = session_id
+        self.song_id = song_id
+        self.start = start
+        self.end = end
+        self.min_interval = 1 / updates_per_second if updates_per_second > 0 else 0
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._started_at = time.monotonic()
+        self._last_update = 0.0
+        self._last_percent = start
+    
+    def __call__(self, downloaded: int, total: Optional[int], speed: Optional[float] = None, eta: Optional[float] = None):
+        """Report downloaded bytes (on_progress of the pipe transcoders)"""
+        if self.manager.is_cancelled(self.session_id):
+            raise JobCancelled(f"Sesión {self.session_id} cancelada")
+        now = time.monotonic()
+        done = bool(total) and downloaded >= total
+        if not done and now - self._last_update < self.min_interval:
+            return
+        
+        if speed is None:
+            elapsed = now - self._started_at
+            speed = downloaded / elapsed if elapsed > 0 else None
+        if eta is None and speed and total:
+            eta = max(total - downloaded, 0) / speed
+        
+        percent = self._last_percent
+        if total:
+            percent = max(percent, self.start + int(min(downloaded / total, 1) * (self.end - self.start)))
+        
+        message = f"Descargando audio... {downloaded / 1e6:.1f}"
+        message += f"/{total / 1e6:.1f} MB" if total else " MB"
+        if speed:
+            message += f" ({speed / 1e6:.1f} MB/s"
+            message += f", {int(eta)} s restantes)" if eta is not None else ")"
+        
+        self._last_update = now
+        self._last_percent = percent
+        args = (self.session_id, self.song_id, "downloading", percent, message)
+        if threading.get_ident() == self._loop_thread:
+            self.manager.update_song_progress(*args)
+        else:
+            self.loop.call_soon_threadsafe(self.manager.update_song_progress, *args)
+    
+    def hook(self, update: Dict[str, Any]):
+        """Adapter for the progress_callback of services.downloader (yt-dlp hook)"""
+        if update.get("status") == "downloading":
+            self(
+                update.get("downloaded_bytes") or 0,
+                update.get("total_bytes"),
+                update.get("speed"),
+                update.get("eta")
+            )
+
 
 # Global progress manager instance
-progress_manager = ProgressManager()
+progress_manager = ProgressManager(job_journal, state=state_backend)
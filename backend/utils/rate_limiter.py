@@ -0,0 +1,150 @@
+"""
+Limitador de ritmo (token bucket) y circuit breaker para las peticiones a YouTube.
+
+Cuando YouTube empieza a devolver 403 o retos anti-bot, seguir lanzando
+peticiones desde todas las sesiones solo alarga el bloqueo. El planificador
+consulta estos objetos antes de lanzar cada trabajo: si no hay tokens o el
+circuito está abierto, el trabajo espera en su cola sin ocupar un hilo.
+"""
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from config import (
+    SEARCH_RATE_PER_SECOND,
+    SEARCH_BURST,
+    DOWNLOAD_RATE_PER_SECOND,
+    DOWNLOAD_BURST,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RECOVERY_SECONDS,
+)
+
+
+class TokenBucket:
+    """Permite `rate` operaciones por segundo con ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Consume un token si hay disponible.
+
+        Returns:
+            0 si se consumió el token; si no, segundos hasta que haya uno
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            self.throttled += 1
+            return (1 - self._tokens) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_second": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2),
+                "throttled": self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """
+    Circuito de tres estados: cerrado, abierto y semiabierto.
+
+    Se abre tras `failure_threshold` fallos seguidos. Mientras está abierto
+    no deja pasar trabajos; pasado `recovery_seconds` queda semiabierto y deja
+    pasar un único trabajo de prueba. Un éxito lo cierra y un fallo lo vuelve
+    a abrir.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    def before_request(self) -> Tuple[float, bool]:
+        """
+        Indica si puede lanzarse un trabajo ahora.
+
+        Returns:
+            (espera, es_prueba): espera es 0 si puede lanzarse o los segundos
+            antes de volver a preguntar; es_prueba indica que el trabajo es la
+            prueba del estado semiabierto y debe liberarse con after_request()
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.recovery_seconds - time.monotonic()
+                if remaining > 0:
+                    return remaining, False
+                self.state = self.HALF_OPEN
+                print("🟡 Circuito de YouTube semiabierto: probando recuperación")
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return min(1.0, self.recovery_seconds), False
+                self._probe_in_flight = True
+                return 0.0, True
+
+            return 0.0, False
+
+    def after_request(self):
+        """Libera el hueco de prueba cuando el trabajo termina sin veredicto"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                print("🟢 Circuito de YouTube cerrado")
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    print(f"🔴 Circuito de YouTube abierto durante {self.recovery_seconds}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+            "times_opened": self.times_opened,
+        }
+
+
+# Shared YouTube limiters
+search_limiter = TokenBucket(SEARCH_RATE_PER_SECOND, SEARCH_BURST)
+download_limiter = TokenBucket(DOWNLOAD_RATE_PER_SECOND, DOWNLOAD_BURST)
+youtube_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS)
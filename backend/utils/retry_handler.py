@@ -3,61 +3,110 @@ Sistema de reintentos inteligente para descargas de YouTube
 Intenta múltiples estrategias cuando encuentra errores 403
 """
 import time
-from typing import Callable, Any
+from typing import Callable, Any, List, Optional
 from yt_dlp.utils import DownloadError
-from config import YOUTUBE_STRATEGIES
+from config import STRATEGY_RETRY_DELAY
+from utils.strategy_selector import StrategySelector, strategy_selector
+from utils.rate_limiter import CircuitBreaker, youtube_breaker
+from utils.job_scheduler import RetryLater
+
+# Fragmentos de mensajes de error que indican bloqueo (403 / detección de bots)
+BLOCKED_ERROR_MARKERS = ['403', 'bot', 'forbidden', 'sign in', 'confirm', 'format is not available']
+
+
+def is_blocked_error(error_msg: str) -> bool:
+    """Indica si un error de yt-dlp se debe a un bloqueo de YouTube"""
+    error_msg = error_msg.lower()
+    return any(x in error_msg for x in BLOCKED_ERROR_MARKERS)
 
 
 class RetryHandler:
     """Manejador de reintentos con múltiples estrategias para YouTube"""
-    
-    def __init__(self, max_retries: int = 3):
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        selector: StrategySelector = None,
+        breaker: CircuitBreaker = None,
+        defer_retries: bool = False
+    ):
+        """
+        Args:
+            max_retries: Número máximo de estrategias a probar
+            selector: Selector que decide el orden de las estrategias
+            breaker: Circuit breaker al que se informa de bloqueos y éxitos
+            defer_retries: En lugar de esperar con sleep entre estrategias,
+                lanzar RetryLater para que el planificador reprograme el
+                siguiente intento sin ocupar el hilo
+        """
         self.max_retries = max_retries
-    
+        self.selector = selector or strategy_selector
+        self.breaker = breaker or youtube_breaker
+        self.defer_retries = defer_retries
+
     def execute_with_retry(
-        self, 
+        self,
         download_func: Callable,
         youtube_url: str,
+        strategies: Optional[List[dict]] = None,
         **kwargs
     ) -> Any:
         """
         Ejecuta función de descarga con reintentos usando diferentes estrategias.
-        
+
         Args:
             download_func: Función de descarga a ejecutar
             youtube_url: URL de YouTube a descargar
+            strategies: Estrategias pendientes (al reanudar un reintento diferido)
             **kwargs: Argumentos adicionales para la función de descarga
-            
+
         Returns:
             Resultado de la función de descarga
-            
+
         Raises:
+            RetryLater: Con defer_retries, para continuar con la siguiente estrategia
             Exception: Si todas las estrategias fallan
         """
         last_error = None
-        
-        # Intentar con cada estrategia
-        for strategy_idx, strategy in enumerate(YOUTUBE_STRATEGIES):
+
+        # Intentar con cada estrategia, empezando por la que mejor funciona ahora
+        if strategies is None:
+            strategies = self.selector.ordered()[:self.max_retries]
+        for strategy_idx, strategy in enumerate(strategies):
+            started = time.monotonic()
             try:
-                print(f"🔄 Intentando estrategia {strategy_idx + 1}/{len(YOUTUBE_STRATEGIES)}: {strategy['name']}")
-                
-                return download_func(
-                    youtube_url, 
+                print(f"🔄 Intentando estrategia {strategy['name']} ({len(strategies) - strategy_idx} restantes)")
+
+                result = download_func(
+                    youtube_url,
                     strategy=strategy,
                     **kwargs
                 )
-                
+                self.selector.record(strategy['name'], True, time.monotonic() - started)
+                self.breaker.record_success()
+                return result
+
             except DownloadError as e:
-                error_msg = str(e).lower()
-                
                 # Si es error 403 o bot detection, intentar siguiente estrategia
-                if any(x in error_msg for x in ['403', 'bot', 'forbidden', 'sign in', 'confirm', 'format is not available']):
+                if is_blocked_error(str(e)):
                     last_error = e
                     print(f"⚠️ Estrategia {strategy['name']} falló con error 403/bot")
-                    
-                    if strategy_idx < len(YOUTUBE_STRATEGIES) - 1:
-                        print(f"⏳ Esperando 2 segundos antes de siguiente intento...")
-                        time.sleep(2)  # Pequeña pausa entre intentos
+                    self.selector.record(strategy['name'], False, time.monotonic() - started)
+                    self.breaker.record_failure()
+
+                    if strategy_idx < len(strategies) - 1:
+                        if self.defer_retries:
+                            print(f"⏳ Reintento programado en {STRATEGY_RETRY_DELAY} segundos...")
+                            raise RetryLater(
+                                STRATEGY_RETRY_DELAY,
+                                self.execute_with_retry,
+                                download_func,
+                                youtube_url,
+                                strategies=strategies[strategy_idx + 1:],
+                                **kwargs
+                            )
+                        print(f"⏳ Esperando {STRATEGY_RETRY_DELAY} segundos antes de siguiente intento...")
+                        time.sleep(STRATEGY_RETRY_DELAY)  # Pequeña pausa entre intentos
                         continue
                     else:
                         raise Exception(
@@ -68,12 +117,12 @@ class RetryHandler:
                     # Otro tipo de error, no reintentar
                     print(f"❌ Error no relacionado con bot detection: {str(e)}")
                     raise
-            
+
             except Exception as e:
                 # Error inesperado, no reintentar
                 print(f"❌ Error inesperado: {str(e)}")
                 raise
-        
+
         # Si llegamos aquí, todas las estrategias fallaron
         if last_error:
             raise last_error
@@ -0,0 +1,355 @@
+"""
+Almacén de estado compartido entre procesos.
+
+Con `uvicorn main:app --workers N` cada worker tiene su propia memoria, así
+que el progreso de una sesión solo lo conoce el worker que la está
+descargando. El ProgressManager publica el estado de sus sesiones en este
+almacén y cualquier worker puede responder consultas de progreso; también se
+guarda qué worker es el dueño de cada sesión (con un lease que caduca si el
+proceso muere).
+
+La interfaz usa un subconjunto de comandos de Redis (get, mget, set con
+nx/ex, delete, expire, hset, hgetall) sobre cadenas, de modo que un cliente Redis
+la cumple directamente. Implementaciones:
+
+- MemoryStateBackend: en memoria del proceso (un solo worker o pruebas).
+- SQLiteStateBackend: archivo SQLite compartido (varios workers en un nodo).
+- RedisStateBackend: servidor Redis (varios nodos); requiere el paquete redis.
+"""
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import STATE_BACKEND, STATE_DB_PATH
+
+
+class StateBackend(ABC):
+    """Interfaz del almacén: claves de texto con valores de texto o hashes"""
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Valor de texto de una clave (None si no existe o caducó)"""
+
+    @abstractmethod
+    def mget(self, *keys: str) -> List[Optional[str]]:
+        """Valores de varias claves en una sola consulta, en el mismo orden"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        """Guarda un valor; con nx solo si la clave no existe. Devuelve si se guardó"""
+
+    @abstractmethod
+    def delete(self, *keys: str) -> int:
+        """Borra las claves; devuelve cuántas existían"""
+
+    @abstractmethod
+    def expire(self, key: str, seconds: float) -> bool:
+        """Fija la caducidad de una clave; False si no existe"""
+
+    @abstractmethod
+    def hset(self, key: str, mapping: Dict[str, str]) -> int:
+        """Guarda campos de un hash; devuelve cuántos campos son nuevos"""
+
+    @abstractmethod
+    def hgetall(self, key: str) -> Dict[str, str]:
+        """Todos los campos de un hash ({} si no existe o caducó)"""
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryStateBackend(StateBackend):
+    """Almacén en memoria con la misma semántica (caducidad incluida)"""
+
+    name = "memory"
+
+    def __init__(self):
+        # clave -> (valor o hash, instante de caducidad o None)
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        """Entrada vigente de una clave; llamar con el lock tomado"""
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry is not None and isinstance(entry[0], str) else None
+
+    def mget(self, *keys: str) -> List[Optional[str]]:
+        with self._lock:
+            entries = [self._live(key) for key in keys]
+        return [entry[0] if entry is not None and isinstance(entry[0], str) else None for entry in entries]
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return False
+            self._data[key] = (value, time.time() + ex if ex else None)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[key] = (entry[0], time.time() + seconds)
+            return True
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> int:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or not isinstance(entry[0], dict):
+                entry = ({}, None)
+                self._data[key] = entry
+            added = sum(1 for field in mapping if field not in entry[0])
+            entry[0].update(mapping)
+            return added
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            entry = self._live(key)
+            return dict(entry[0]) if entry is not None and isinstance(entry[0], dict) else {}
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Almacén en un archivo SQLite (modo WAL) compartido por los procesos del
+    nodo. Los valores de texto se guardan con field = '' y los hashes con una
+    fila por campo; las filas caducadas se ignoran y se borran de vez en cuando.
+    """
+
+    name = "sqlite"
+    MGET_BATCH = 500
+
+    def __init__(self, db_path: Path, purge_interval: float = 60):
+        self.db_path = Path(db_path)
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit: cada operación abre su propia transacción
+            conn = sqlite3.connect(
+                str(self.db_path), check_same_thread=False, timeout=10, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " key TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " PRIMARY KEY (key, field))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _purge(self, conn: sqlite3.Connection, now: float):
+        """Borra las filas caducadas; llamar dentro de una transacción"""
+        if now - self._last_purge >= self.purge_interval:
+            conn.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+            self._last_purge = now
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM state WHERE key = ? AND field = ''"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def mget(self, *keys: str) -> List[Optional[str]]:
+        values: Dict[str, str] = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # Por tandas, por debajo del límite de parámetros de SQLite
+            for start in range(0, len(keys), self.MGET_BATCH):
+                batch = keys[start:start + self.MGET_BATCH]
+                values.update(conn.execute(
+                    f"SELECT key, value FROM state WHERE key IN ({', '.join('?' for _ in batch)})"
+                    " AND field = '' AND (expires_at IS NULL OR expires_at > ?)",
+                    (*batch, now)
+                ).fetchall())
+        return [values.get(key) for key in keys]
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE bloquea la escritura entre procesos: nx es atómico
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._purge(conn, now)
+                if nx and conn.execute(
+                    "SELECT 1 FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?) LIMIT 1",
+                    (key, now)
+                ).fetchone():
+                    conn.execute("COMMIT")
+                    return False
+                conn.execute("DELETE FROM state WHERE key = ?", (key,))
+                conn.execute(
+                    "INSERT INTO state (key, field, value, expires_at) VALUES (?, '', ?, ?)",
+                    (key, value, now + ex if ex else None)
+                )
+                conn.execute("COMMIT")
+                return True
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            placeholders = ", ".join("?" for _ in keys)
+            deleted = conn.execute(
+                f"SELECT COUNT(DISTINCT key) FROM state WHERE key IN ({placeholders})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (*keys, now)
+            ).fetchone()[0]
+            conn.execute(f"DELETE FROM state WHERE key IN ({placeholders})", keys)
+            return deleted
+
+    def expire(self, key: str, seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE state SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (now + seconds, key, now)
+            )
+            return cursor.rowcount > 0
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> int:
+        if not mapping:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._purge(conn, now)
+                # Una clave caducada empieza de cero, como en Redis
+                conn.execute("DELETE FROM state WHERE key = ? AND expires_at <= ?", (key, now))
+                row = conn.execute(
+                    "SELECT expires_at FROM state WHERE key = ? LIMIT 1", (key,)
+                ).fetchone()
+                expires_at = row[0] if row else None
+                existing = {
+                    field for (field,) in conn.execute(
+                        f"SELECT field FROM state WHERE key = ? AND field IN ({', '.join('?' for _ in mapping)})",
+                        (key, *mapping)
+                    )
+                }
+                conn.executemany(
+                    "INSERT OR REPLACE INTO state (key, field, value, expires_at) VALUES (?, ?, ?, ?)",
+                    [(key, field, value, expires_at) for field, value in mapping.items()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(mapping) - len(existing)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT field, value FROM state WHERE key = ? AND field != ''"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "path": str(self.db_path)}
+
+
+class RedisStateBackend(StateBackend):
+    """Almacén en un servidor Redis (dependencia opcional: pip install redis)"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+
+        self.url = url
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def mget(self, *keys: str) -> List[Optional[str]]:
+        return self._client.mget(keys) if keys else []
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        return bool(self._client.set(key, value, px=int(ex * 1000) if ex else None, nx=nx))
+
+    def delete(self, *keys: str) -> int:
+        return self._client.delete(*keys) if keys else 0
+
+    def expire(self, key: str, seconds: float) -> bool:
+        return bool(self._client.pexpire(key, int(seconds * 1000)))
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> int:
+        return self._client.hset(key, mapping=mapping) if mapping else 0
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return self._client.hgetall(key)
+
+    def close(self):
+        self._client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+def create_state_backend(spec: str) -> Optional[StateBackend]:
+    """
+    Crea el almacén indicado en STATE_BACKEND: "" (ninguno, el progreso solo
+    vive en el proceso), "memory", "sqlite" o una URL redis://...
+    """
+    spec = spec.strip()
+    if not spec or spec == "local":
+        return None
+    if spec == "memory":
+        return MemoryStateBackend()
+    if spec == "sqlite":
+        return SQLiteStateBackend(STATE_DB_PATH)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(spec)
+    raise ValueError(f"STATE_BACKEND no reconocido: {spec}")
+
+
+# Global state backend instance (None: estado solo en memoria del proceso)
+state_backend = create_state_backend(STATE_BACKEND)
@@ -0,0 +1,104 @@
+"""
+Selección adaptativa del orden de estrategias de YouTube.
+
+Registra el resultado y la latencia de cada intento en una ventana
+deslizante y ordena las estrategias como un bandido multibrazo (UCB1): se
+prueba primero la que mejor está funcionando ahora, dejando un pequeño margen
+de exploración para que una estrategia que falló hace rato pueda recuperarse.
+Las muestras pierden peso con el tiempo y se descartan al salir de la ventana.
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from config import YOUTUBE_STRATEGIES, STRATEGY_STATS_WINDOW, STRATEGY_STATS_HALF_LIFE
+
+
+class StrategySelector:
+    """Ordena estrategias según su tasa de éxito reciente"""
+
+    def __init__(
+        self,
+        strategies: List[dict],
+        window_seconds: float = STRATEGY_STATS_WINDOW,
+        half_life: float = STRATEGY_STATS_HALF_LIFE,
+        max_samples: int = 500,
+        exploration: float = 0.5
+    ):
+        self.strategies = strategies
+        self.window_seconds = window_seconds
+        self.half_life = half_life
+        self.exploration = exploration
+        self._samples: Dict[str, Deque[Tuple[float, bool, float]]] = {
+            s["name"]: deque(maxlen=max_samples) for s in strategies
+        }
+        self._lock = threading.Lock()
+
+    def record(self, name: str, success: bool, latency: float):
+        """Registra el resultado de un intento con una estrategia"""
+        with self._lock:
+            if name in self._samples:
+                self._samples[name].append((time.monotonic(), success, latency))
+
+    def _summary(self, name: str, now: float) -> Dict[str, float]:
+        """Éxitos, intentos y latencia media con decaimiento exponencial"""
+        samples = self._samples[name]
+        while samples and now - samples[0][0] > self.window_seconds:
+            samples.popleft()
+
+        weight_sum = successes = latency_sum = 0.0
+        for ts, success, latency in samples:
+            weight = 0.5 ** ((now - ts) / self.half_life)
+            weight_sum += weight
+            latency_sum += weight * latency
+            if success:
+                successes += weight
+
+        return {
+            "attempts": weight_sum,
+            "successes": successes,
+            "latency": latency_sum / weight_sum if weight_sum else 0.0,
+            "samples": len(samples),
+        }
+
+    def ordered(self) -> List[dict]:
+        """Estrategias de la más a la menos prometedora"""
+        now = time.monotonic()
+        with self._lock:
+            summaries = {s["name"]: self._summary(s["name"], now) for s in self.strategies}
+
+        total = sum(x["attempts"] for x in summaries.values())
+
+        def score(item: Tuple[int, dict]):
+            index, strategy = item
+            summary = summaries[strategy["name"]]
+            n = summary["attempts"]
+            # Prior Beta(1, 1): sin datos la estrategia parte con 0.5
+            mean = (summary["successes"] + 1) / (n + 2)
+            bonus = self.exploration * math.sqrt(math.log(total + 1) / (n + 1))
+            # A igualdad de puntuación: menor latencia y después el orden configurado
+            return (-(mean + bonus), summary["latency"], index)
+
+        return [s for _, s in sorted(enumerate(self.strategies), key=score)]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            summaries = [(s["name"], self._summary(s["name"], now)) for s in self.strategies]
+        order = {s["name"]: i for i, s in enumerate(self.ordered())}
+        return [
+            {
+                "name": name,
+                "rank": order[name],
+                "samples": summary["samples"],
+                "success_rate": round(summary["successes"] / summary["attempts"], 4) if summary["attempts"] else None,
+                "avg_latency_seconds": round(summary["latency"], 3),
+            }
+            for name, summary in sorted(summaries, key=lambda x: order[x[0]])
+        ]
+
+
+# Global strategy selector instance
+strategy_selector = StrategySelector(YOUTUBE_STRATEGIES)
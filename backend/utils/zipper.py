@@ -1,12 +1,192 @@
-from zipfile import ZipFile
+import asyncio
+import io
+import os
+import threading
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
 from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Callable, Iterator, Optional, Tuple
+
+from config import AUDIO_EXTENSIONS
+
+# Tamaño de los bloques leídos de cada archivo al generar un ZIP en streaming
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def audio_files(input_dir: Path) -> Iterator[Path]:
+    """Archivos de audio terminados de una sesión (cualquier formato de salida)"""
+    return (f for f in input_dir.iterdir() if f.is_file() and f.suffix in AUDIO_EXTENSIONS)
+
 
 def zip_files(input_dir: Path, output_zip: Path) -> Path:
     """Comprime todos los archivos de input_dir en un ZIP."""
     try:
         with ZipFile(output_zip, 'w') as zipf:
-            for file in input_dir.glob("*.mp3"):
+            for file in audio_files(input_dir):
                 zipf.write(file, arcname=file.name)
         return output_zip
     except Exception as e:
         raise RuntimeError(f"Error al crear ZIP: {str(e)}")
+
+
+class IncrementalZip:
+    """
+    ZIP de una sesión que se construye a medida que terminan las canciones.
+
+    Cada canción se añade sin compresión en cuanto está lista; el CRC se calcula
+    en la misma pasada que copia los datos. Al terminar la sesión solo falta
+    escribir el directorio central, así que el ZIP está disponible casi en
+    cuanto acaba la última canción. El archivo se escribe como .part y se
+    renombra al finalizar.
+    """
+
+    def __init__(self, output_zip: Path):
+        self.output_zip = output_zip
+        self._partial = output_zip.with_name(output_zip.name + ".part")
+        self._zipf = ZipFile(self._partial, 'w', compression=ZIP_STORED, allowZip64=True)
+        # Nombres ya usados en el ZIP (sin distinguir mayúsculas) y archivo -> nombre
+        self._names: set[str] = set()
+        self._files: dict[Path, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, file: Path) -> str:
+        """
+        Añade una canción terminada (seguro para llamar desde varios hilos) y
+        devuelve su nombre en el ZIP. Si ya hay una entrada con ese nombre,
+        la nueva se guarda como "nombre (2).mp3"; el mismo archivo no se
+        añade dos veces.
+        """
+        with self._lock:
+            if file in self._files:
+                return self._files[file]
+            arcname = file.name
+            counter = 1
+            while arcname.lower() in self._names:
+                counter += 1
+                arcname = f"{file.stem} ({counter}){file.suffix}"
+            self._zipf.write(file, arcname=arcname)
+            self._names.add(arcname.lower())
+            self._files[file] = arcname
+            return arcname
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def finalize(self) -> Path:
+        """Escribe el directorio central y publica el ZIP"""
+        with self._lock:
+            self._zipf.close()
+            os.replace(self._partial, self.output_zip)
+        return self.output_zip
+
+    def discard(self):
+        """Descarta el ZIP a medio construir (sesión cancelada o fallida)"""
+        with self._lock:
+            self._zipf.close()
+            self._partial.unlink(missing_ok=True)
+
+    def abandon(self):
+        """Deja de escribir sin borrar nada (otro worker sigue con la sesión)"""
+        with self._lock:
+            self._zipf.close()
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Destino no posicionable para ZipFile que acumula lo escrito hasta que se recoge.
+
+    Al no poder hacer seek, ZipFile escribe descriptores de datos tras cada
+    entrada en lugar de volver atrás a corregir la cabecera.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(files: AsyncIterable[Path], chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Genera un ZIP en bloques a partir de los archivos indicados.
+
+    Las entradas se guardan sin compresión (el audio ya está comprimido) y
+    en formato ZIP64 cuando hace falta. La memoria usada no depende del
+    número ni del tamaño de los archivos: solo se mantiene un bloque a la vez.
+    Las lecturas del disco van a un hilo bloque a bloque; entre bloques y
+    mientras se espera a la siguiente canción no se ocupa ningún hilo.
+    """
+    sink = _StreamSink()
+    zipf = ZipFile(sink, 'w', compression=ZIP_STORED, allowZip64=True)
+    try:
+        async for path in files:
+            zinfo = await asyncio.to_thread(ZipInfo.from_file, path, arcname=path.name)
+            zinfo.compress_type = ZIP_STORED
+            src = await asyncio.to_thread(open, path, 'rb')
+            try:
+                with zipf.open(zinfo, 'w') as dst:
+                    while chunk := await asyncio.to_thread(src.read, chunk_size):
+                        dst.write(chunk)
+                        yield sink.drain()
+            finally:
+                src.close()
+            yield sink.drain()
+    finally:
+        # Escribe el directorio central
+        zipf.close()
+    yield sink.drain()
+
+
+async def iter_session_files(
+    input_dir: Path,
+    is_finished: Callable[[], bool],
+    wakeup: Optional[asyncio.Event] = None,
+    poll_interval: float = 0.5
+) -> AsyncIterator[Path]:
+    """
+    Recorre las canciones de una sesión a medida que van apareciendo.
+
+    Los archivos se publican con un rename atómico, así que cualquier archivo
+    de audio visible está completo. Termina cuando is_finished() es cierto y ya no
+    quedan archivos nuevos. Entre comprobaciones espera a wakeup (el aviso de
+    cambios de la sesión) o, como mucho, poll_interval segundos.
+    """
+    seen: set[str] = set()
+
+    def check() -> Tuple[bool, list[Path]]:
+        # is_finished puede consultar el almacén compartido: también en el hilo
+        finished = is_finished()
+        new_files = sorted(
+            (f for f in audio_files(input_dir) if f.name not in seen),
+            key=lambda f: f.name
+        )
+        return finished, new_files
+
+    while True:
+        if wakeup is not None:
+            wakeup.clear()
+        finished, new_files = await asyncio.to_thread(check)
+        for file in new_files:
+            seen.add(file.name)
+            yield file
+
+        if finished and not new_files:
+            return
+        if new_files:
+            continue
+        if wakeup is None:
+            await asyncio.sleep(poll_interval)
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
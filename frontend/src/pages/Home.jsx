@@ -23,6 +23,7 @@ export default function Home() {
     const [songProgress, setSongProgress] = useState({});
     const [toast, setToast] = useState(null);
     const pollingIntervalRef = useRef(null);
+    const eventSourceRef = useRef(null);
 
     const [currentTheme, setCurrentTheme] = useState(() => {
         return localStorage.getItem('spotidownloader-theme') || 'light-minimal';
@@ -73,6 +74,36 @@ export default function Home() {
         }
     };
 
+    const stopProgressUpdates = () => {
+        if (pollingIntervalRef.current) {
+            clearInterval(pollingIntervalRef.current);
+            pollingIntervalRef.current = null;
+        }
+        if (eventSourceRef.current) {
+            eventSourceRef.current.close();
+            eventSourceRef.current = null;
+        }
+    };
+
+    const applySessionProgress = (data) => {
+        setTotalSongs(data.total_songs || 0);
+        setCompletedSongs(data.completed_songs || 0);
+        setCurrentSong(data.current_song || "");
+
+        if (data.status === 'completed' && data.download_url) {
+            setDownloadLink(data.download_url);
+            setIsDownloading(false);
+            setCurrentSong("");
+            showToast(`¡Descarga completada! ${data.completed_songs}/${data.total_songs} canciones`, "success");
+            stopProgressUpdates();
+        } else if (data.status === 'failed') {
+            setIsDownloading(false);
+            setCurrentSong("");
+            showToast("La descarga falló. YouTube bloqueó los intentos.", "error");
+            stopProgressUpdates();
+        }
+    };
+
     const pollProgress = async (sessionId) => {
         try {
             const response = await fetch(`/api/progress/${sessionId}`);
@@ -80,31 +111,8 @@ export default function Home() {
 
             const data = await response.json();
 
-            setTotalSongs(data.total_songs || 0);
-            setCompletedSongs(data.completed_songs || 0);
-            setCurrentSong(data.current_song || "");
             setSongProgress(data.song_progress || {});
-
-            if (data.status === 'completed' && data.download_url) {
-                setDownloadLink(data.download_url);
-                setIsDownloading(false);
-                setCurrentSong("");
-                showToast(`¡Descarga completada! ${data.completed_songs}/${data.total_songs} canciones`, "success");
-
-                if (pollingIntervalRef.current) {
-                    clearInterval(pollingIntervalRef.current);
-                    pollingIntervalRef.current = null;
-                }
-            } else if (data.status === 'failed') {
-                setIsDownloading(false);
-                setCurrentSong("");
-                showToast("La descarga falló. YouTube bloqueó los intentos.", "error");
-
-                if (pollingIntervalRef.current) {
-                    clearInterval(pollingIntervalRef.current);
-                    pollingIntervalRef.current = null;
-                }
-            }
+            applySessionProgress(data);
         } catch (error) {
             console.error('Error polling progress:', error);
         }
@@ -116,6 +124,44 @@ export default function Home() {
         }, 500);
     };
 
+    // Recibe solo los cambios por Server-Sent Events; si el navegador o un
+    // proxy no lo admiten, vuelve al polling
+    const startProgressStream = (sessionId) => {
+        if (!window.EventSource) {
+            startPolling(sessionId);
+            return;
+        }
+
+        const source = new EventSource(`/api/progress/${sessionId}/events`);
+        eventSourceRef.current = source;
+        let received = false;
+
+        source.addEventListener("progress", (event) => {
+            received = true;
+            const delta = JSON.parse(event.data);
+            if (delta.songs) {
+                setSongProgress(prev => ({ ...prev, ...delta.songs }));
+            }
+            if (delta.session) {
+                applySessionProgress(delta.session);
+            }
+        });
+
+        source.addEventListener("end", () => stopProgressUpdates());
+
+        source.onerror = () => {
+            if (eventSourceRef.current !== source) return;
+            // Mientras reconecta (CONNECTING) reanuda solo con Last-Event-ID; si el
+            // navegador se rindió (CLOSED) o nunca llegó un evento, pasar al polling
+            if (received && source.readyState !== EventSource.CLOSED) return;
+            source.close();
+            eventSourceRef.current = null;
+            // Un estado completo primero: los cambios perdidos no vuelven a llegar
+            pollProgress(sessionId);
+            startPolling(sessionId);
+        };
+    };
+
     const handleDownload = async () => {
         if (selectedIndexes.length === 0) {
             showToast("Selecciona al menos una canción", "warning");
@@ -135,7 +181,7 @@ export default function Home() {
             const selectedSongs = songs.filter((_, index) => selectedIndexes.includes(index));
             await downloadPlaylist(playlistUrl, selectedSongs, newSessionId);
 
-            startPolling(newSessionId);
+            startProgressStream(newSessionId);
             showToast("Descarga iniciada. Observa el progreso abajo.", "info");
         } catch (err) {
             showToast("Error al iniciar la descarga", "error");
@@ -157,11 +203,8 @@ export default function Home() {
     const handleCancelDownload = async () => {
         if (!sessionId || !isDownloading) return;
 
-        // Detener polling inmediatamente
-        if (pollingIntervalRef.current) {
-            clearInterval(pollingIntervalRef.current);
-            pollingIntervalRef.current = null;
-        }
+        // Detener las actualizaciones de progreso inmediatamente
+        stopProgressUpdates();
 
         try {
             await cancelDownload(sessionId);
@@ -195,6 +238,9 @@ export default function Home() {
             if (pollingIntervalRef.current) {
                 clearInterval(pollingIntervalRef.current);
             }
+            if (eventSourceRef.current) {
+                eventSourceRef.current.close();
+            }
         };
     }, []);
 